@@ -1,143 +1,138 @@
-import re
-from easydict import EasyDict as edict
-from lxml import etree
+import os, re
+from pom_context import ResolverContext, file_mtime
+from pom_loader import load_pom_from_file
+from pom_struct import PomModel, PomParent, PomDependency, PomExclusion, PomProperty
 
 POM_NAMESPACE = "http://maven.apache.org/POM/4.0.0"
 POM = "{%s}" % (POM_NAMESPACE,)
 POM_NAMESPACE_LEN = len(POM)
 
-POM_PARSER = etree.XMLParser(
-    recover=True,
-    remove_comments=True,
-    remove_pis=True,
-)
+# parsed poms shared by all ArtifactPom.parse() calls without a context, with the mtime they were parsed at
+_cache_poms: dict[str, PomModel] = {}
+_cache_mtimes: dict[str, float | None] = {}
+
+
+class ArtifactInfos:
+    """
+    Read-only view of the project infos of a pom, version being inherited from the parent.
+    """
+    __slots__ = ('pom',)
+
+    def __init__(self, pom: PomModel):
+        self.pom = pom
+
+    groupId = property(lambda self: self.pom.groupId or None)
+    artifactId = property(lambda self: self.pom.artifactId or None)
+    version = property(lambda self: self.pom.version or None)
+    name = property(lambda self: self.pom.name or None)
+    packaging = property(lambda self: self.pom.packaging or 'jar')
+    fullname = property(lambda self: f"{self.groupId}:{self.artifactId}:{self.version}")
+
+
+class ArtifactParent:
+    """
+    Read-only view of the parent of a pom.
+    """
+    __slots__ = ('parent',)
+
+    def __init__(self, parent: PomParent):
+        self.parent = parent
+
+    groupId = property(lambda self: self.parent.groupId or None)
+    artifactId = property(lambda self: self.parent.artifactId or None)
+    version = property(lambda self: self.parent.version or None)
+    relativePath = property(lambda self: self.parent.relativePath or None)
+
+
+class ArtifactExclusion:
+    """
+    Read-only view of an exclusion of a dependency.
+    """
+    __slots__ = ('excl',)
+
+    def __init__(self, excl: PomExclusion):
+        self.excl = excl
+
+    groupId = property(lambda self: self.excl.groupId or None)
+    artifactId = property(lambda self: self.excl.artifactId or None)
+    key = property(lambda self: f"{self.groupId}:{self.artifactId}")
+
+
+class ArtifactDependency:
+    """
+    Read-only view of a dependency or a dependencyManagement of a pom, with maven default type and scope.
+    """
+    __slots__ = ('dep',)
+
+    def __init__(self, dep: PomDependency):
+        self.dep = dep
+
+    groupId = property(lambda self: self.dep.groupId or None)
+    artifactId = property(lambda self: self.dep.artifactId or None)
+    version = property(lambda self: self.dep.version or None)
+    relativePath = property(lambda self: None)
+    type = property(lambda self: self.dep.type or 'jar')
+    scope = property(lambda self: self.dep.scope or 'compile')
+    classifier = property(lambda self: self.dep.classifier or None)
+    key = property(lambda self: f"{self.groupId}:{self.artifactId}")
+    name = property(lambda self: f"{self.groupId}:{self.artifactId}:{self.version}")
+    fullname = name
+    exclusions = property(lambda self: [ ArtifactExclusion(excl) for excl in self.dep.exclusions ])
 
 
 class ArtifactPom(object):
-    def __init__(self, file):
+    """
+    Read-only view of a pom parsed by pom_reader, with the attributes of the former lxml based parser.
+
+    Models are shared with the loader cache, so a file is only parsed once. The xml tree
+    is only parsed again when it is used by find(), findall(), findtext() or findtags().
+    """
+    def __init__(self, file, pom: PomModel | None = None):
         self.file = file
-        self.xml = None
-        self.infos = None
+        self.pom = pom
+        self.infos = ArtifactInfos(pom) if pom is not None else None
         self.name = None
-        self.parent = None
-        self.properties = {}
-        self.dependencies = []
-        self.dependencyManagement = []
-        self.modules = []
+        self.parent = ArtifactParent(pom.parent) if pom is not None and pom.parent is not None else None
+        # builtin properties are already resolved by the reader
+        self.properties: dict[str, PomProperty] = { **pom.properties, **pom.builtins } if pom is not None else {}
+        self.dependencies = [ ArtifactDependency(dep) for dep in pom.dependencies ] if pom is not None else []
+        self.dependencyManagement = [ ArtifactDependency(dep) for dep in pom.managements ] if pom is not None else []
+        self.modules = pom.modules if pom is not None else []
+        self._xml = None
 
     def __str__(self):
         return self.file
 
     def __repr__(self):
         return self.file
-    
-    def parse(file: str) -> 'ArtifactPom':
-        self = ArtifactPom(file)
-        self.xml = etree.parse(self.file, parser=POM_PARSER)
-        # infos
-        infos = edict()
-        infos.groupId = ArtifactPom.findtext(self.xml, 'groupId')
-        infos.artifactId = ArtifactPom.findtext(self.xml, 'artifactId')
-        infos.version = ArtifactPom.findtext(self.xml, 'version')
-        infos.name = ArtifactPom.findtext(self.xml, 'name')
-        infos.packaging = ArtifactPom.findtext(self.xml, 'packaging', 'jar')
-        # set fullname although version it is not resolved yet
-        infos.fullname = f"{infos.groupId}:{infos.artifactId}:{infos.version}"
-        self.infos = infos
-        # parent
-        parent = None
-        project_parent = ArtifactPom.find(self.xml, 'parent')
-        if project_parent is not None:
-            self.unexpected_tags(project_parent, '*', ['groupId', 'artifactId', 'version', 'relativePath'])
-            parent = edict()
-            parent.groupId = ArtifactPom.findtext(project_parent, 'groupId')
-            parent.artifactId = ArtifactPom.findtext(project_parent, 'artifactId')
-            parent.version = ArtifactPom.findtext(project_parent, 'version')
-            parent.relativePath = ArtifactPom.findtext(project_parent, 'relativePath')
-            infos.groupId = parent.groupId if infos.groupId is None else infos.groupId
-            infos.version = parent.version if infos.version is None else infos.version
-            infos.fullname = f"{infos.groupId}:{infos.artifactId}:{infos.version}"
-        self.parent = parent
-        # properties
-        properties = {}
-        project_properties = ArtifactPom.find(self.xml, "properties")
-        if project_properties is not None:
-            for prop in project_properties.iterchildren():
-                if prop.tag == POM + 'property':
-                    name = prop.get('name')
-                    value = prop.get('value', '')
-                else:
-                    name = prop.tag[POM_NAMESPACE_LEN:]
-                    value = prop.text or ''
-                properties[name] = edict(value=value)
-        # immediately resolve builtin properties
-        self.builtin_properties(properties)
-        self.properties = properties
-        # dependencyManagement
-        dependencyManagement = []
-        for dependency in ArtifactPom.findall(self.xml, 'dependencyManagement/dependencies/dependency'):
-            self.unexpected_tags(dependency, '*', ['groupId', 'artifactId', 'version', 'type', 'scope', 'exclusions', 'classifier'])
-            dep = edict()
-            dep.groupId = ArtifactPom.findtext(dependency, 'groupId')
-            dep.artifactId = ArtifactPom.findtext(dependency, 'artifactId')
-            dep.version = ArtifactPom.findtext(dependency, 'version')
-            dep.relativePath = None
-            dep.type = ArtifactPom.findtext(dependency, 'type', 'jar')
-            dep.scope = ArtifactPom.findtext(dependency, 'scope', 'compile')
-            dep.classifier = ArtifactPom.findtext(dependency, 'classifier')
-            dep.key = f"{dep.groupId}:{dep.artifactId}"
-            dep.fullname = f"{dep.groupId}:{dep.artifactId}:{dep.version}"
-            # exclusions
-            dep_exclusions = ArtifactPom.findall(dependency, 'exclusions/exclusion')
-            exclusions = []
-            for exclusion in dep_exclusions:
-                self.unexpected_tags(exclusion, '*', ['groupId', 'artifactId'])
-                excl = edict()
-                excl.groupId = ArtifactPom.findtext(exclusion, 'groupId')
-                excl.artifactId = ArtifactPom.findtext(exclusion, 'artifactId')
-                excl.key = f"{excl.groupId}:{excl.artifactId}"
-                exclusions.append(excl)
-            dep.exclusions = exclusions
-            # dep.sourceFile = self.name
-            # dep.sourceVersion = self.name if infos.version else None
-            dependencyManagement.append(dep)
-        self.dependencyManagement = dependencyManagement
-        # dependencies
-        dependencies = []
-        for dependency in ArtifactPom.findall(self.xml, 'dependencies/dependency'):
-            self.unexpected_tags(dependency, '*', ['groupId', 'artifactId', 'version', 'type', 'scope', 'exclusions', 'classifier'])
-            dep = edict()
-            dep.groupId = ArtifactPom.findtext(dependency, 'groupId')
-            dep.artifactId = ArtifactPom.findtext(dependency, 'artifactId')
-            dep.version = ArtifactPom.findtext(dependency, 'version')
-            dep.relativePath = None
-            dep.type = ArtifactPom.findtext(dependency, 'type', 'jar')
-            dep.scope = ArtifactPom.findtext(dependency, 'scope', 'compile')
-            dep.classifier = ArtifactPom.findtext(dependency, 'classifier')
-            dep.key = f"{dep.groupId}:{dep.artifactId}"
-            dep.name = f"{dep.groupId}:{dep.artifactId}:{dep.version}"
-            dep_exclusions = ArtifactPom.findall(dependency, 'exclusions/exclusion')
-            # exclusions
-            exclusions = []
-            for exclusion in dep_exclusions:
-                self.unexpected_tags(exclusion, '*', ['groupId', 'artifactId'])
-                excl = edict()
-                excl.groupId = ArtifactPom.findtext(exclusion, 'groupId')
-                excl.artifactId = ArtifactPom.findtext(exclusion, 'artifactId')
-                excl.key = f"{excl.groupId}:{excl.artifactId}"
-                exclusions.append(excl)
-            dep.exclusions = exclusions
-            # dep.sourceFile = self.name
-            # dep.sourceVersion = self.name
-            dependencies.append(dep)
-        self.dependencies = dependencies
-        # modules
-        modules = []
-        for module in ArtifactPom.findall(self.xml, 'modules/module'):
-            modules.append(module.text)
-        self.modules = modules
-        #
-        return self
+
+    def parse(file: str, ctx: ResolverContext | None = None) -> 'ArtifactPom':
+        """
+        Parse a pom, relative to the current directory.
+
+        With a context, the pom is cached in this context as for a resolution. Without one, a context is
+        created for the current directory, sharing a process-wide cache of parsed poms, where a pom
+        is parsed again once its file is modified.
+        """
+        file = os.path.abspath(file)
+        if ctx is None:
+            ctx = ResolverContext(cwd = os.getcwd(), quiet = True)
+            ctx.cache_poms = _cache_poms
+            mtime = file_mtime(file)
+            if _cache_mtimes.get(file) != mtime:
+                _cache_poms.pop(file, None)
+                _cache_mtimes[file] = mtime
+        pom = load_pom_from_file(ctx, file)
+        assert pom
+        return ArtifactPom(file, pom.model)
+
+    @property
+    def xml(self):
+        if self._xml is None:
+            from pom_reader import get_parser
+            from lxml import etree
+            self._xml = etree.parse(self.file, parser=get_parser())
+        return self._xml
 
     def find(elem, tag: str):
         elem = elem.xml if isinstance(elem, ArtifactPom) else elem
@@ -151,52 +146,18 @@ class ArtifactPom(object):
         return elem.findall(POM + tag)
 
 
-    def findtext(elem, tag: str, ifNone: str = None) -> str:
+    def findtext(elem, tag: str, ifNone: str | None = None) -> str | None:
         elem = elem.xml if isinstance(elem, ArtifactPom) else elem
         tag = tag.replace("/", "/" + POM)
         value = elem.findtext(POM + tag)
         return value if value is not None else ifNone
-    
+
     def findtags(elem, tag: str) -> list:
         elem = elem.xml if isinstance(elem, ArtifactPom) else elem
         tag = tag.replace("/", "/" + POM)
         return [ e.tag.replace(POM,"") for e in elem.findall(POM + tag) ]
-    
-    def unexpected_tags(self, elem, tag: str, allowed: list):
-        # halt on non-expected tags, not groupId or artifactId
-        tags = ArtifactPom.findtags(elem, tag)
-        tags = [ t for t in tags if t not in allowed ]
-        if len(tags) > 0:
-            raise Exception(f"Unexpected tags: {tags} in pom {self.infos.fullname}\n{etree.tostring(elem)}")
-
-    def builtin_properties(self, props: dict):
-        builtins = {}
-        # add parent built-in properties
-        if self.parent is not None:
-            builtins['parent.groupId'] = self.parent.groupId
-            builtins['parent.artifactId'] = self.parent.artifactId
-            builtins['parent.version'] = self.parent.version
-            builtins['project.parent.groupId'] = self.parent.groupId
-            builtins['project.parent.artifactId'] = self.parent.artifactId
-            builtins['project.parent.version'] = self.parent.version
-        # add project built-in properties
-        builtins['artifactId'] = self.infos.artifactId
-        builtins['groupId'] = self.infos.groupId
-        builtins['version'] = self.infos.version
-        builtins['project.artifactId'] = self.infos.artifactId
-        builtins['project.groupId'] = self.infos.groupId
-        builtins['project.version'] = self.infos.version
-        builtins['pom.artifactId'] = self.infos.artifactId
-        builtins['pom.groupId'] = self.infos.groupId
-        builtins['pom.version'] = self.infos.version
-        # # resolve built-in properties
-        builtins = { k: edict(value=v) for k, v in builtins.items() }
-        # for value in props.values():
-        #     value.value = ArtifactPom.resolve(value.value, builtins)
-        # add built-in properties
-        props.update(builtins)
-    
-    def resolve(value: str, props: dict = None) -> str:
+
+    def resolve(value: str, props: dict | None = None) -> str:
         """
         Resolve properties in a string.
         Properties are defined as ${key} and are replaced by their value.
@@ -208,6 +169,42 @@ class ArtifactPom(object):
             return prop.value if prop is not None else match.group(0)
         return re.sub(r'\$\{([^}]+)\}', resolve_match, value)
 
+
 if __name__ == '__main__':
-    artifact = ArtifactPom.parse('pom.xml')
-    print(ArtifactPom.findtext(artifact, 'artifactId'))
+    ctx = ResolverContext()
+    artifact = ArtifactPom.parse('commons-configuration-1.6.pom', ctx)
+    # verify the attributes of the former parser
+    assert artifact.infos.fullname == 'commons-configuration:commons-configuration:1.6' and artifact.infos.packaging == 'jar'
+    assert artifact.parent is None and artifact.properties['project.version'].value == '1.6'
+    dep = artifact.dependencies[0]
+    assert (dep.key, dep.name, dep.type, dep.scope, dep.classifier) == ('commons-collections:commons-collections', 'commons-collections:commons-collections:3.2.1', 'jar', 'compile', None)
+    assert ArtifactPom.resolve('${project.version}-x', artifact.properties) == '1.6-x'
+    # verify that parents are inherited and poms are parsed once
+    artifact = ArtifactPom.parse('tests/pom16.xml', ctx)
+    assert artifact.infos.fullname == 'mygroup:myartifact:1.0-SNAPSHOT' and artifact.parent.relativePath == 'pom16-parent.xml'
+    assert artifact.properties['parent.artifactId'].value == 'myparent'
+    ArtifactPom.parse('tests/pom16.xml', ctx)
+    assert ctx.stats['poms parsed'] == 2
+    # verify that the xml is only parsed on demand
+    assert artifact._xml is None and ArtifactPom.findtext(artifact, 'artifactId') == 'myartifact'
+    # verify that files are relative to the current directory, and parsed again once modified
+    import shutil, tempfile
+    ArtifactPom.parse('tests/pom1.xml')
+    cwd = os.getcwd()
+    os.chdir('tests')
+    try:
+        artifact = ArtifactPom.parse('pom10.xml')
+        assert artifact.file == os.path.join(cwd, 'tests', 'pom10.xml') and artifact.xml.docinfo.URL.endswith('tests/pom10.xml')
+    finally:
+        os.chdir(cwd)
+    with tempfile.TemporaryDirectory() as tmp:
+        pom_file = shutil.copy('tests/pom1.xml', tmp)
+        assert ArtifactPom.parse(pom_file).infos.name == 'myartifact'
+        with open(pom_file) as f:
+            xml = f.read().replace('<name>myartifact</name>', '<name>renamed</name>')
+        with open(pom_file, 'w') as f:
+            f.write(xml)
+        os.utime(pom_file, (0, 0))
+        assert ArtifactPom.parse(pom_file).infos.name == 'renamed'
+    # passed
+    print("PASSED")
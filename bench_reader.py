@@ -0,0 +1,41 @@
+import argparse, os, pathlib, time
+from pom_reader import read_pom
+
+# parse argumnes
+parser = argparse.ArgumentParser(description='Benchmark pom reader over all poms of a maven repository.')
+parser.add_argument('-d', '--dir', default=os.path.join(pathlib.Path.home(), '.m2/repository'), help='Directory to scan for *.pom and pom.xml files')
+parser.add_argument('-n', '--repeat', type=int, default=1, help='Number of times each pom is read')
+parser.add_argument('-t', '--top', type=int, default=5, help='Number of slowest poms to print')
+args = parser.parse_args()
+
+# list poms
+files = []
+for root, _, names in os.walk(args.dir):
+    for name in names:
+        if name.endswith('.pom') or name == 'pom.xml':
+            files.append(os.path.join(root, name))
+
+# read poms
+timings = []
+errors = 0
+for file in files:
+    try:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            read_pom(file)
+        timings.append(((time.perf_counter() - start) / args.repeat, file))
+    except Exception:
+        errors += 1
+
+# print report
+timings.sort()
+total = sum(t for t, _ in timings)
+count = len(timings)
+print(f"Poms: {count} read, {errors} failed")
+if count > 0:
+    print(f"Total: {total * 1000:.1f} ms")
+    print(f"Per pom: mean {total / count * 1e6:.0f} us, median {timings[count // 2][0] * 1e6:.0f} us, p95 {timings[min(count - 1, count * 95 // 100)][0] * 1e6:.0f} us, max {timings[-1][0] * 1e6:.0f} us")
+    print()
+    print("Slowest:")
+    for t, file in reversed(timings[-args.top:]):
+        print(f"    {t * 1e6:8.0f} us  {file}")
@@ -0,0 +1,51 @@
+import argparse, os, statistics, subprocess, sys, time
+
+# parse argumnes
+parser = argparse.ArgumentParser(description='Benchmark cold-start latency of deps.py, using python -X importtime.')
+parser.add_argument('-f', '--file', default='tests/pom1.xml', help='pom.xml file used for the trivial resolution')
+parser.add_argument('-n', '--repeat', type=int, default=10, help='Number of runs of each command')
+parser.add_argument('-t', '--top', type=int, default=8, help='Number of slowest imports to print')
+args = parser.parse_args()
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+COMMANDS = {
+    'help': [ '--help' ],
+    'resolve': [ '-f', args.file, '-s', 'project', '-q' ],
+}
+
+
+def run(command: list[str]) -> tuple[float, dict[str, int]]:
+    """
+    Run deps.py once, returning wall time and cumulative import time of top level modules in us.
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([ sys.executable, '-X', 'importtime', os.path.join(BASE, 'deps.py') ] + command, cwd=BASE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise Exception(f"deps.py {' '.join(command)} failed:\n{proc.stderr}")
+    imports = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'): continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # only top level imports, nested ones being included in their cumulative time
+        if name.startswith('  ') or not cumulative.strip().isdigit(): continue
+        imports[name.strip()] = int(cumulative)
+    return wall, imports
+
+
+for name, command in COMMANDS.items():
+    walls = []
+    totals = []
+    imports = {}
+    for _ in range(args.repeat):
+        wall, imported = run(command)
+        walls.append(wall)
+        totals.append(sum(imported.values()))
+        for module, us in imported.items():
+            imports.setdefault(module, []).append(us)
+    print(f"deps.py {' '.join(command)}")
+    print(f"    wall:    min {min(walls) * 1000:.1f} ms, median {statistics.median(walls) * 1000:.1f} ms")
+    print(f"    imports: min {min(totals) / 1000:.1f} ms, median {statistics.median(totals) / 1000:.1f} ms")
+    for module, us in sorted(imports.items(), key=lambda i: -statistics.median(i[1]))[:args.top]:
+        print(f"    {statistics.median(us) / 1000:8.1f} ms  {module}")
+    print()
@@ -1,6 +1,6 @@
-import argparse, os
+import argparse, os, sys
 
-SECTIONS = 'project,proj,properties,props,managements,mgts,dependencies,deps,coll,collect,tree,all,none'.split(',')
+SECTIONS = 'project,proj,properties,props,managements,mgts,dependencies,deps,coll,collect,tree,conflicts,classpath,cp,all,none'.split(',')
 
 # parse argumnes
 parser = argparse.ArgumentParser(description='Process some integers.')
@@ -10,19 +10,34 @@ parser.add_argument('-D', '--define', action="append", help='Define properties i
 parser.add_argument('-f', '--file', default='pom.xml', type=str, help='pom.xml file location')
 parser.add_argument('-pl', '--projects', help="Print only projects in format 'module,module,...'")
 parser.add_argument('-q', '--quiet', action="store_true", help="Disable warnings")
-parser.add_argument('-s', '--sections', default='dependencies', help='Print only sections: project|proj, properties|props, managements|mgts, dependencies|deps, collect|coll, tree, all, none')
+parser.add_argument('-s', '--sections', default='dependencies', help='Print only sections: project|proj, properties|props, managements|mgts, dependencies|deps, collect|coll, tree, conflicts, classpath|cp (not in all), all, none')
+parser.add_argument('--scope', default='runtime', choices=['compile', 'runtime', 'test'], help='Scope of the classpath section')
 parser.add_argument('--deps', help='Trace dependencies in format "groupId:artifactId,groupId:artifactId,..."')
 parser.add_argument('--poms', action="store_true", help='Trace poms')
 parser.add_argument('--props', help='Trace properties in format "name,name,..."')
 parser.add_argument('--ranges', action="store_true", help='Trace ranges computation')
 parser.add_argument('--jdk', default='21.0.2', help='JDK version')
+parser.add_argument('--stats', action="store_true", help='Print resolution statistics on stderr')
+parser.add_argument('--hotspots', type=int, help='Print on stderr the artifacts making the resolution expensive, limited to a number of artifacts')
+parser.add_argument('--memprofile', type=int, nargs='?', const=5, help='Print on stderr the memory after each phase, with a number of top allocating call sites (default 5)')
+parser.add_argument('--index', help='Reverse dependency index file, updated with the resolved modules')
+parser.add_argument('--who', help='Query the index for modules using dependencies in format "groupId:artifactId,...", without resolving')
+parser.add_argument('--write-lock', help='Lock file written with the resolved dependencies of each module and a digest of the poms read')
+parser.add_argument('--verify-lock', help='Lock file to verify, only resolving the modules whose recorded pom digests changed')
+parser.add_argument('--matrix', action="append", help='Print dependencies differing between environments in format "jdk=17,os.name=windows,name=value,...", repeated for each environment')
+parser.add_argument('--store', help='File of parsed poms shared between runs and processes, filled with the poms read from xml')
+parser.add_argument('--max-time', type=float, help='Stop the resolution after a number of seconds, printing partial results')
+parser.add_argument('--max-poms', type=int, help='Stop the resolution after a number of resolved poms, printing partial results')
+parser.add_argument('--max-depth', type=int, help='Stop the resolution at a dependency depth, printing partial results')
+parser.add_argument('--max-memory', type=int, help='Stop the resolution over a resident memory in MB, printing partial results')
+parser.add_argument('--prefetch', type=int, default=0, help='Number of threads reading poms ahead of the solver')
 parser.add_argument('-w', '--width', type=int, default=120, help='Width of the first colomn')
 
 args = parser.parse_args()
 
 color = os.isatty(1) if args.color == 'auto' else True if args.color == 'always' else False
 sections = [ s.strip() for s in args.sections.split(',') ] if args.sections else [ 'all' ]
-sections = SECTIONS if 'all' in sections else sections
+sections = [ s for s in SECTIONS if s not in [ 'classpath', 'cp' ] ] if 'all' in sections else sections
 projects = [ m.strip() for m in args.projects.split(',') ] if args.projects else None
 width = args.width
 file = os.path.isdir(args.file) and os.path.join(args.file, 'pom.xml') or args.file
@@ -40,10 +55,31 @@ if args.deps:
         if ':' not in dependency and dependency != '*':
             raise Exception(f"Invalid dependency format: '{dependency}', expected 'groupid:artifactid'")
 
+# query the index
+if args.who:
+    if not args.index:
+        raise Exception("--who requires --index")
+    from pom_index import load_index
+    index = load_index(args.index)
+    for file in index.stale():
+        sys.stderr.write(f"Warning: {file} modified since indexed\n")
+    for ga in args.who.split(','):
+        for record in index.who(ga.strip()):
+            print(f"{ga.strip()} {record.version} {record.scope} in {record.module}")
+            for name in record.path:
+                print(f"    via {name}")
+    sys.exit(0)
+
+# memory profile, started before any pom is read
+memprofile = None
+if args.memprofile is not None:
+    from pom_memprofile import MemoryProfile
+    memprofile = MemoryProfile(args.memprofile)
+
 # tracer
-import pom_tracer
+from pom_tracer import Tracer
 trace = False
-tracer = pom_tracer.Tracer().set_debug(True).set_color(color)
+tracer = Tracer().set_debug(True).set_color(color)
 if args.poms:
     tracer.set_poms(True)
     trace = True
@@ -61,19 +97,29 @@ if args.props:
 if args.ranges:
     tracer.set_ranges(True)
     trace = True
-if trace:
-    pom_tracer.TRACER = tracer
 
-if args.quiet:
-    pom_tracer.WARN = lambda _: None
+# imports, printer is only imported when sections are printed
+from pom_session import Session, expand_sections
+
+# define properties
+initialProps = {}
+for define in defines:
+    name, value = define.split('=', 2)
+    initialProps[name] = value
 
-# imports
-from pom_loader import load_pom_from_file, register_pom_locations
-from pom_solver import resolve_pom
-from pom_printer import print_pom
-from pom_struct import PomProperties
-import pom_solver
-pom_solver.JDK = args.jdk
+# session
+session = Session(jdk = args.jdk, defines = initialProps, tracer = tracer if trace else None, quiet = args.quiet, prefetch = args.prefetch)
+ctx = session.ctx
+if args.store:
+    from pom_store import PomStore
+    ctx.store = PomStore(args.store)
+if args.max_time is not None or args.max_poms is not None or args.max_depth is not None or args.max_memory is not None:
+    from pom_budget import Budget
+    ctx.budget = Budget(args.max_time, args.max_poms, args.max_depth, args.max_memory)
+if args.hotspots:
+    from pom_hotspots import Hotspots
+    ctx.hotspots = Hotspots()
+ctx.memprofile = memprofile
 
 def separator(s):
     # print separator
@@ -82,27 +128,152 @@ def separator(s):
     print("#" * (width + 3))
 
 
-# define properties
-initialProps = PomProperties()
-for define in defines:
-    name, value = define.split('=', 2)
-    initialProps.set(name, value)
+def report(stopped):
+    # report why the resolution stopped, partial results being printed
+    sys.stderr.write(f"Error: resolution stopped, {stopped.reason}\n")
+    sys.stderr.write(f"    at {stopped.where}\n")
+    if ctx.budget is not None:
+        sys.stderr.write(f"    {ctx.budget.poms} poms resolved in {ctx.budget}\n")
+        for gav, count in ctx.budget.top():
+            sys.stderr.write(f"    {count} poms through {gav}\n")
+
+
+def print_stats():
+    # print the statistics counters of the run
+    for name, count in ctx.stats.items():
+        sys.stderr.write(f"{name}: {count}\n")
+
+
+# verify the lock from the recorded digests, registering and resolving only when inputs changed
+if args.verify_lock:
+    from pom_lock import load_lock, lock_environment
+    lock = load_lock(args.verify_lock)
+    environment = lock_environment(ctx, initialProps)
+    if not lock.modules:
+        sys.stderr.write(f"Error: no locked module in {args.verify_lock}\n")
+        sys.exit(1)
+    changed = {}
+    for name, infos in lock.modules.items():
+        if projects is None or infos['module'].split(':')[1] in projects:
+            inputs = lock.changed(ctx, name, environment)
+            if inputs: changed[name] = inputs
+    differences = 0
+    if changed:
+        session.register(file)
+        for pom in session.walk(file):
+            name = lock.name(ctx, pom.file)
+            if projects is not None and pom.artifactId not in projects: continue
+            if name in lock.modules and name not in changed: continue
+            sys.stderr.write(f"{name}: {', '.join(changed.get(name, [ 'not locked' ]))} changed\n")
+            session.resolve_pom(pom)
+            for difference in lock.differences(ctx, pom):
+                print(f"{pom.gav()} {difference}")
+                differences += 1
+    if differences:
+        sys.stderr.write(f"Error: lock {args.verify_lock} differs, {differences} dependencies changed\n")
+    else:
+        sys.stderr.write(f"Lock {args.verify_lock} verified, {len(changed)} modules resolved again\n")
+    if args.stats:
+        print_stats()
+    sys.exit(1 if differences else 0)
 
 # it is needed to manually register all pom not located in M2 repository
 # so they can be found even if their properties are not resolved
-register_pom_locations(file, initialProps=initialProps.copy())
+from pom_budget import ResolutionStopped
+try:
+    session.register(file)
+except ResolutionStopped as e:
+    report(e)
+    sys.exit(2)
+if memprofile is not None: memprofile.snapshot('discovery')
+
+# resolve each environment of the matrix, sharing parsed poms, and print differences
+if args.matrix:
+    from pom_matrix import parse_environment, resolve_matrix
+    from pom_printer import print_matrix
+    environments = [ parse_environment(spec) for spec in args.matrix ]
+    for result in resolve_matrix(session, file, environments, projects):
+        separator(result.module)
+        print_matrix(result, color = color, indent = width)
+    if ctx.store is not None:
+        ctx.store.save()
+    if args.stats:
+        print_stats()
+    sys.exit(0)
 
-# load pom and resolve it
-def print_files(file):
-    pom = load_pom_from_file(file)
-    assert pom
+# reverse index, refreshed with the resolved modules
+index = None
+if args.index:
+    from pom_index import load_index
+    index = load_index(args.index)
+
+# lock, written with the resolved modules and the poms read for each one
+lock = None
+if args.write_lock:
+    from pom_lock import Lockfile, lock_environment
+    lock = Lockfile(os.path.dirname(os.path.abspath(args.write_lock)))
+    environment = lock_environment(ctx, initialProps)
+
+# load poms and resolve them, until the budget is exceeded or a cycle is found
+stopped = None
+for pom in session.walk(file):
     if projects is None or pom.artifactId in projects:
         separator(pom.fullname())
-        resolve_pom(pom, initialProps=initialProps.copy(), load_mgts = True, load_deps = True) #, initialProps = initialProps)
-        print_pom(pom, color = color, basic = args.basic, sections = sections, indent = width)
+        # without printed sections, resolve everything for traces, statistics and index
+        if lock is not None: ctx.inputs = set()
+        try:
+            session.resolve_pom(pom, None if sections == [ 'none' ] or index is not None or lock is not None else expand_sections(sections))
+        except ResolutionStopped as e:
+            stopped = e
+        if index is not None and stopped is None:
+            index.update(pom)
+        if lock is not None and stopped is None:
+            lock.update(ctx, pom, ctx.inputs, environment)
+        if sections != [ 'none' ]:
+            from pom_printer import print_pom
+            print_pom(pom, color = color, basic = args.basic, sections = sections, indent = width)
+        if 'classpath' in expand_sections(sections) and stopped is None:
+            from pom_printer import print_classpath
+            for classpath in session.pom_classpath(pom, args.scope).values():
+                print_classpath(classpath, args.scope, color = color)
+        if memprofile is not None: memprofile.snapshot('printing', pom)
+        if stopped is not None:
+            break
+
+if stopped is not None:
+    report(stopped)
+
+# save the index
+if index is not None:
+    index.save(args.index)
+
+# save the lock, unless partial
+if lock is not None and stopped is None:
+    lock.save(args.write_lock)
+
+# save poms read from xml for next runs
+if ctx.store is not None:
+    ctx.store.save()
+
+# print statistics
+if args.stats:
+    print_stats()
+
+# print artifacts with the largest subtrees
+if ctx.hotspots is not None:
+    sys.stderr.write(f"{'artifact':<60} {'visits':>7} {'reexp':>7} {'skips':>7} {'versions':>8} {'subtree':>8}\n")
+    for spot in ctx.hotspots.top(args.hotspots):
+        sys.stderr.write(f"{spot.ga:<60} {spot.visits:>7} {spot.reexpansions():>7} {spot.skips:>7} {len(spot.versions):>8} {spot.subtree:>8}\n")
 
-    for module in pom.modules:
-        module_file = os.path.join(os.path.dirname(file), module, 'pom.xml')
-        print_files(module_file)
+# print memory after each phase, with the call sites allocating the most during it
+if memprofile is not None:
+    memprofile.stop()
+    sys.stderr.write(f"{'phase':<60} {'rss MB':>8} {'traced MB':>10} {'peak MB':>8} {'PomDependency':>14} {'PomPaths':>9} {'PomProperty':>12}\n")
+    for phase in memprofile.phases:
+        objects = phase.objects
+        sys.stderr.write(f"{phase.name:<60} {phase.rss:>8.1f} {phase.traced:>10.1f} {phase.peak:>8.1f} {objects['PomDependency']:>14} {objects['PomPaths']:>9} {objects['PomProperty']:>12}\n")
+        for site, size in phase.sites:
+            sys.stderr.write(f"    {size / 1024:>10.1f} KB  {site}\n")
 
-print_files(file)
+if stopped is not None:
+    sys.exit(2)
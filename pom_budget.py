@@ -0,0 +1,94 @@
+import sys, time
+from pom_struct import PomProject, PomPaths
+
+
+class ResolutionStopped(Exception):
+    """
+    Raised when a resolution can't go on, the poms resolved so far keeping their partial results.
+    """
+    reason: str
+    where: str
+
+    def __init__(self, reason: str, pom: PomProject, paths: PomPaths):
+        self.reason = reason
+        names = [ p.fullname() for p in paths.paths ]
+        if not paths.paths or paths.paths[-1] is not pom:
+            names.append(pom.gav())
+        self.where = ' -> '.join(names)
+        super().__init__(f"{reason} at {self.where}")
+
+
+class BudgetExceeded(ResolutionStopped):
+    """
+    Raised when a limit of the budget is reached.
+    """
+
+
+class CycleDetected(ResolutionStopped):
+    """
+    Raised when a pom is its own parent or import, directly or not.
+    """
+
+
+class Budget:
+    """
+    Represents the limits of a run, None being unlimited: wall time, resolved poms, dependency depth and memory.
+
+    Resolved poms are also counted by direct dependency of the top pom, to report where the graph exploded.
+    """
+    max_time: float | None          # seconds since the budget creation
+    max_poms: int | None            # resolved poms, including parents and imports
+    max_depth: int | None           # dependency path length
+    max_memory: int | None          # maximum resident memory in MB
+    start: float
+    poms: int
+    visits: dict[str, int]          # direct dependency -> resolved poms through it
+
+    def __init__(self, max_time: float | None = None, max_poms: int | None = None, max_depth: int | None = None, max_memory: int | None = None):
+        self.max_time = max_time
+        self.max_poms = max_poms
+        self.max_depth = max_depth
+        self.max_memory = max_memory
+        self.start = time.monotonic()
+        self.poms = 0
+        self.visits = {}
+
+    def check(self, pom: PomProject, paths: PomPaths):
+        """
+        Count a resolved pom and raise BudgetExceeded if a limit is reached.
+        """
+        self.poms += 1
+        if len(paths.paths) > 0:
+            direct = paths.paths[1] if len(paths.paths) > 1 else pom
+            self.visits[direct.gav()] = self.visits.get(direct.gav(), 0) + 1
+        if self.max_poms is not None and self.poms > self.max_poms:
+            raise BudgetExceeded(f"more than {self.max_poms} poms resolved", pom, paths)
+        if self.max_depth is not None and paths.length > self.max_depth:
+            raise BudgetExceeded(f"dependency depth over {self.max_depth}", pom, paths)
+        if self.max_time is not None and time.monotonic() - self.start > self.max_time:
+            raise BudgetExceeded(f"more than {self.max_time}s spent", pom, paths)
+        # memory is only checked every 64 poms, as it requires a system call
+        if self.max_memory is not None and self.poms % 64 == 0 and memory_mb() > self.max_memory:
+            raise BudgetExceeded(f"more than {self.max_memory} MB used", pom, paths)
+
+    def top(self, count: int = 5) -> list[tuple[str, int]]:
+        """
+        Return the direct dependencies resolving the most poms.
+        """
+        return sorted(self.visits.items(), key = lambda item: -item[1])[:count]
+
+    def __repr__(self) -> str:
+        return f"Budget({self.poms} poms, {time.monotonic() - self.start:.1f}s)"
+
+
+def memory_mb() -> float:
+    """
+    Return the maximum resident memory of the process, or 0 if it is not available.
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macos, kilobytes elsewhere
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
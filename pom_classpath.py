@@ -0,0 +1,153 @@
+import os
+from pom_context import ResolverContext, file_mtime
+from pom_struct import PomProject, PomDependency, compute_tree
+
+# Dependency scopes on the classpath of each scope
+CLASSPATH_SCOPES = {
+    'compile': [ 'compile', 'provided' ],
+    'runtime': [ 'compile', 'runtime' ],
+    'test': [ 'compile', 'provided', 'runtime', 'test' ],
+}
+
+# Artifact file extension and default classifier of each type
+TYPE_FILES = {
+    'jar': ('jar', ''),
+    'test-jar': ('jar', 'tests'),
+    'bundle': ('jar', ''),
+    'maven-plugin': ('jar', ''),
+    'ejb': ('jar', ''),
+}
+
+
+class ClasspathEntry:
+    """
+    Represents an artifact file of the classpath, missing when it is not in the repository.
+    """
+    key: str            # groupId:artifactId:type
+    version: str
+    scope: str
+    file: str
+    missing: bool
+
+    def __repr__(self) -> str:
+        return f"ClasspathEntry({self.file}{' missing' if self.missing else ''})"
+
+
+def compute_classpath(ctx: ResolverContext, pom: PomProject, scope: str = 'runtime') -> list[ClasspathEntry]:
+    """
+    Return the artifact files of the dependencies of a resolved pom in a scope, in classpath order.
+
+    As in maven, the order is a depth-first preorder walk of the dependency tree, each dependency
+    being followed by its own dependencies before its next sibling.
+    Each repository directory is listed once with scandir, instead of one stat per file,
+    and listings are cached in the context while the directory is not modified.
+    """
+    if scope not in CLASSPATH_SCOPES:
+        raise Exception(f"Unsupported classpath scope: '{scope}', expected {', '.join(CLASSPATH_SCOPES)}")
+    scopes = CLASSPATH_SCOPES[scope]
+    entries = []
+    for dep in walk_tree(pom):
+        if dep.scope not in scopes or dep.type in [ 'parent', 'pom' ]: continue
+        entry = ClasspathEntry()
+        entry.key = dep.key_gat()
+        entry.version = dep.version
+        entry.scope = dep.scope
+        entry.file = artifact_file(ctx, dep)
+        entries.append(entry)
+    check_files(ctx, entries)
+    ctx.count('classpath entries', len(entries))
+    return entries
+
+
+def check_files(ctx: ResolverContext, entries: list[ClasspathEntry]):
+    """
+    Flag the entries whose file is not in the repository, so that a cached classpath follows downloads and deletions.
+    """
+    for entry in entries:
+        entry.missing = os.path.basename(entry.file) not in list_directory(ctx, os.path.dirname(entry.file))
+
+
+def walk_tree(pom: PomProject) -> list[PomDependency]:
+    """
+    Return the dependencies of a resolved pom in depth-first preorder of its dependency tree.
+    """
+    tree = compute_tree(pom)
+    deps = []
+    stack = list(reversed(tree[pom.key_excl()][1]))
+    while stack:
+        dep = stack.pop()
+        deps.append(dep)
+        stack.extend(reversed(tree[dep.key_excl()][1]))
+    return deps
+
+
+def artifact_file(ctx: ResolverContext, dep: PomDependency) -> str:
+    """
+    Return the location of the artifact file of a dependency in the repository.
+    """
+    extension, classifier = TYPE_FILES.get(dep.type, (dep.type, ''))
+    classifier = dep.classifier or classifier
+    name = f"{dep.artifactId}-{dep.version}-{classifier}.{extension}" if classifier else f"{dep.artifactId}-{dep.version}.{extension}"
+    return os.path.join(ctx.m2_home, dep.groupId.replace(".", "/"), dep.artifactId, dep.version, name)
+
+
+def list_directory(ctx: ResolverContext, directory: str) -> frozenset[str]:
+    """
+    Return the file names of a directory, empty if it doesn't exist.
+
+    The cached listing is used while the modification time of the directory is the same.
+    """
+    mtime = file_mtime(directory)
+    cached = ctx.cache_dirs.get(directory)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        with os.scandir(directory) as it:
+            names = frozenset(entry.name for entry in it)
+    except OSError:
+        names = frozenset()
+    ctx.cache_dirs[directory] = (mtime, names)
+    ctx.count('directories listed')
+    return names
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pom_loader import load_pom_from_file
+    from pom_solver import resolve_pom
+    ctx = ResolverContext()
+    ctx.jdk = '1.8'
+    pom14 = load_pom_from_file(ctx, 'tests/pom14.xml')
+    assert pom14
+    resolve_pom(ctx, pom14, load_mgts = True, load_deps = True)
+    with tempfile.TemporaryDirectory() as tmp:
+        ctx.m2_home = tmp
+        # verify that files are found in the repository, and flagged when missing
+        os.makedirs(os.path.join(tmp, 'commons-pool/commons-pool/1.5'))
+        open(os.path.join(tmp, 'commons-pool/commons-pool/1.5/commons-pool-1.5.jar'), 'w').close()
+        classpath = compute_classpath(ctx, pom14)
+        # verify that each dependency is followed by its own dependencies, and not in resolution order
+        keys = [ entry.key for entry in classpath ]
+        assert keys == [ f"{ga}:jar" for ga in [ 'commons-pool:commons-pool', 'fake.lib:lib2', 'fake.lib:lib10', 'fake.lib:lib17', 'fake.lib:lib28', 'fake.lib:lib29',
+            'fake.lib:lib21', 'fake.lib:lib5', 'fake.lib:lib7', 'commons-io:commons-io', 'fake.lib:lib15' ] ]
+        assert keys != [ dep.key_gat() for dep in pom14.computed_dependencies.values() if dep.scope in [ 'compile', 'runtime' ] ]
+        assert classpath[0].file == os.path.join(tmp, 'commons-pool/commons-pool/1.5/commons-pool-1.5.jar') and not classpath[0].missing
+        assert all(entry.missing for entry in classpath[1:])
+        # verify that each directory is only listed once
+        directories = ctx.stats['directories listed']
+        compute_classpath(ctx, pom14, 'test')
+        assert ctx.stats['directories listed'] == directories
+        # verify that a modified directory is listed again
+        jar = os.path.join(tmp, 'fake/lib/lib2/2.0/lib2-2.0.jar')
+        os.makedirs(os.path.dirname(jar))
+        open(jar, 'w').close()
+        check_files(ctx, classpath)
+        assert not classpath[1].missing and ctx.stats['directories listed'] == directories + 1
+    # verify classifiers and types
+    dep = PomDependency()
+    dep.groupId, dep.artifactId, dep.version, dep.type, dep.classifier = 'a.b', 'c', '1.0', 'test-jar', ''
+    assert artifact_file(ctx, dep).endswith('a/b/c/1.0/c-1.0-tests.jar')
+    dep.type, dep.classifier = 'jar', 'linux'
+    assert artifact_file(ctx, dep).endswith('a/b/c/1.0/c-1.0-linux.jar')
+    # passed
+    print("PASSED")
@@ -0,0 +1,181 @@
+import os, sys
+from contextlib import contextmanager
+from typing import IO, TYPE_CHECKING, Iterator
+from pom_struct import PomModel
+from pom_tracer import Tracer
+
+if TYPE_CHECKING:
+    from pom_budget import Budget
+    from pom_classpath import ClasspathEntry
+    from pom_events import ResolveListener
+    from pom_hotspots import Hotspots
+    from pom_memprofile import MemoryProfile
+    from pom_store import PomStore
+
+M2_HOME = os.path.join(os.path.expanduser('~'), '.m2/repository')
+
+
+def platform_values() -> tuple[str, str, str]:
+    """
+    Return os name, machine and release, without importing platform when os.uname() is available.
+    """
+    if hasattr(os, 'uname'):
+        uname = os.uname()
+        return uname.sysname, uname.machine, uname.release
+    import platform
+    return platform.system(), platform.machine(), platform.release()
+
+
+def get_os_family(os_name: str) -> str:
+    """
+    Return the maven os family of an os name.
+    """
+    return "windows" if os_name.lower().startswith("windows") else "unix"
+
+
+JDK = '21.0.2'
+_OS_NAME, _OS_MACHINE, _OS_RELEASE = platform_values()
+OS_NAME = _OS_NAME.lower()
+OS_ARCH = "amd64" if _OS_MACHINE.lower() == "x86_64" else _OS_MACHINE.lower()
+OS_VERSION = _OS_RELEASE.lower()
+OS_FAMILY = get_os_family(OS_NAME)
+
+
+def warn(s: str):
+    sys.stderr.write(f"Warning: {s}\n")
+
+
+def file_mtime(file: str) -> float | None:
+    """
+    Return the modification time of a file, None if it doesn't exist.
+    """
+    try:
+        return os.stat(file).st_mtime
+    except OSError:
+        return None
+
+
+@contextmanager
+def replace_file(file: str, mode: str = 'w') -> Iterator[IO]:
+    """
+    Write a file through a temporary file of this process, replacing it once complete,
+    so that other processes never read a partial file.
+    """
+    tmp = f"{file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, mode) as f:
+            yield f
+        os.replace(tmp, file)
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+
+
+class ResolverContext:
+    """
+    Represents the state of a resolution: caches, tracer, platform values and working directory.
+
+    Nothing is shared between two contexts, so two roots can be resolved concurrently
+    by using one context per thread.
+    """
+    m2_home: str
+    cwd: str
+    jdk: str
+    os_name: str
+    os_arch: str
+    os_version: str
+    os_family: str
+    tracer: Tracer | None
+    prefetch: int                       # number of threads reading poms ahead of the solver
+    store: 'PomStore | None'            # parsed poms shared with other processes
+    listener: 'ResolveListener | None'  # called with the events of the solver
+    budget: 'Budget | None'             # limits of the resolution
+    hotspots: 'Hotspots | None'         # resolution cost by artifact
+    inputs: set[str] | None             # files and directories a resolution depends on, recorded for lock files
+    memprofile: 'MemoryProfile | None'  # memory snapshots after each phase of the top pom
+    cache_poms: dict[str, PomModel]     # file -> parsed pom, shared by all visits
+    cache_deps: dict[str, str]          # dep -> file
+    cache_aggregators: dict[str, str]   # module file -> file of the aggregator whose properties it inherits
+    cache_profiles: dict[tuple, tuple]  # activation key -> active profiles, dependencies, managements
+    cache_profile_inputs: dict[str, tuple]  # file -> properties and values used by activations
+    cache_exclusions: dict[frozenset, frozenset]  # exclusions -> interned exclusions
+    cache_dirs: dict[str, tuple[float | None, frozenset[str]]]   # repository directory -> modification time, file names
+    cache_classpaths: dict[tuple, tuple[str, 'list[ClasspathEntry]']]  # module file, scope and environment -> gav, classpath
+    stats: dict[str, int]               # counter name -> count
+
+    def __init__(self, m2_home: str | None = None, cwd: str | None = None, jdk: str = JDK, tracer: Tracer | None = None, quiet = False, prefetch = 0):
+        self.m2_home = m2_home or M2_HOME
+        self.cwd = cwd or os.getcwd()
+        self.jdk = jdk
+        self.os_name = OS_NAME
+        self.os_arch = OS_ARCH
+        self.os_version = OS_VERSION
+        self.os_family = OS_FAMILY
+        self.tracer = tracer
+        self.prefetch = prefetch
+        self.store = None
+        self.listener = None
+        self.budget = None
+        self.hotspots = None
+        self.inputs = None
+        self.memprofile = None
+        self.warn = (lambda _: None) if quiet else warn
+        self.cache_poms = {}
+        self.cache_deps = {}
+        self.cache_aggregators = {}
+        self.cache_profiles = {}
+        self.cache_profile_inputs = {}
+        self.cache_exclusions = {}
+        self.cache_dirs = {}
+        self.cache_classpaths = {}
+        self.stats = {}
+
+    def abspath(self, file: str) -> str:
+        """
+        Return the absolute path of a file, relative to the context working directory.
+        """
+        return os.path.normpath(os.path.join(self.cwd, file))
+
+    def count(self, name: str, incr: int = 1):
+        """
+        Increment a statistics counter.
+        """
+        self.stats[name] = self.stats.get(name, 0) + incr
+
+    def derive(self, jdk: str | None = None, os_name: str | None = None, os_family: str | None = None, os_arch: str | None = None) -> 'ResolverContext':
+        """
+        Return a context for another environment, sharing the caches with this context.
+
+        Parsed poms, locations and exclusions don't depend on the environment,
+        and profile activations are cached with the environment in their key.
+        """
+        ctx = ResolverContext.__new__(ResolverContext)
+        ctx.__dict__.update(self.__dict__)
+        ctx.jdk = jdk or self.jdk
+        ctx.os_name = os_name.lower() if os_name else self.os_name
+        ctx.os_family = os_family.lower() if os_family else get_os_family(ctx.os_name) if os_name else self.os_family
+        ctx.os_arch = os_arch.lower() if os_arch else self.os_arch
+        ctx.stats = {}
+        return ctx
+
+    def __repr__(self) -> str:
+        return f"ResolverContext({len(self.cache_poms)} poms)"
+
+
+if __name__ == "__main__":
+    # verify that paths are relative to the context and not to the process
+    ctx1 = ResolverContext(cwd='/tmp/a')
+    ctx2 = ResolverContext(cwd='/tmp/b')
+    assert ctx1.abspath('pom.xml') == '/tmp/a/pom.xml'
+    assert ctx2.abspath('../c/pom.xml') == '/tmp/c/pom.xml'
+    assert ctx1.abspath('/x/pom.xml') == '/x/pom.xml'
+    # verify that caches are not shared
+    ctx1.cache_deps['a:b:1'] = 'x'
+    assert 'a:b:1' not in ctx2.cache_deps
+    # verify that derived contexts share caches but not the environment
+    ctx3 = ctx1.derive(jdk='11', os_name='Windows')
+    assert ctx3.cache_deps is ctx1.cache_deps and ctx3.jdk == '11' and ctx3.os_name == 'windows' and ctx1.jdk == JDK
+    # verify that the os family follows the os name unless given
+    assert ctx3.os_family == 'windows' and ctx3.derive(os_name='Linux').os_family == 'unix'
+    assert ctx3.derive(os_family='unix').os_family == 'unix' and ctx3.derive(jdk='17').os_family == 'windows'
+    # passed
+    print("PASSED")
@@ -0,0 +1,89 @@
+from typing import Callable
+from pom_struct import PomProject, PomDependency, PomPaths
+
+
+class ResolveEvent:
+    """
+    Represents something that happened during a resolution, sent to the context listener.
+    """
+
+
+class PomLoaded(ResolveEvent):
+    """
+    A pom was loaded with its parents and properties, before its dependencies are added.
+    """
+    pom: PomProject
+    paths: PomPaths
+
+    def __init__(self, pom: PomProject, paths: PomPaths):
+        self.pom = pom
+        self.paths = paths
+
+    def __repr__(self) -> str:
+        return f"PomLoaded({self.pom.fullname()})[{self.paths.length}]"
+
+
+class DependencyAdded(ResolveEvent):
+    """
+    A dependency was added to the collected dependencies of the top pom.
+    """
+    dep: PomDependency
+    pom: PomProject
+
+    def __init__(self, dep: PomDependency, pom: PomProject):
+        self.dep = dep
+        self.pom = pom
+
+    def __repr__(self) -> str:
+        return f"DependencyAdded({self.dep.key_gat()}:{self.dep.version}:{self.dep.scope})"
+
+
+class DependencySkipped(ResolveEvent):
+    """
+    A dependency of a pom was not added: 'excluded', 'not transitive' or 'optional'.
+    """
+    dep: PomDependency
+    pom: PomProject
+    reason: str
+
+    def __init__(self, dep: PomDependency, pom: PomProject, reason: str):
+        self.dep = dep
+        self.pom = pom
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        return f"DependencySkipped({self.dep.key_gat()}, {self.reason})"
+
+
+class VersionManaged(ResolveEvent):
+    """
+    The version of a dependency was overridden by the dependencyManagement of an including pom.
+    """
+    dep: PomDependency
+    management: PomDependency
+    version: str
+
+    def __init__(self, dep: PomDependency, management: PomDependency, version: str):
+        self.dep = dep
+        self.management = management
+        self.version = version
+
+    def __repr__(self) -> str:
+        return f"VersionManaged({self.dep.key_gat()}, {self.version} -> {self.dep.version})"
+
+
+class LevelCompleted(ResolveEvent):
+    """
+    All dependency poms at a path length were expanded, as maven nearest wins never goes back to a level.
+    """
+    length: int
+
+    def __init__(self, length: int):
+        self.length = length
+
+    def __repr__(self) -> str:
+        return f"LevelCompleted({self.length})"
+
+
+# Listener called by the solver with each event
+ResolveListener = Callable[[ResolveEvent], None]
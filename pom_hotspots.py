@@ -0,0 +1,94 @@
+from pom_struct import PomProject, PomPaths, PomDependency
+
+
+class Hotspot:
+    """
+    Represents the resolution cost of an artifact, over all its versions.
+    """
+    ga: str
+    visits: int         # resolved poms, including parents and imports
+    expansions: int     # resolved poms whose dependencies were loaded
+    skips: int          # dependencies not recursed as already loaded
+    versions: set[str]
+    subtree: int        # resolved poms below it
+
+    def __init__(self, ga: str):
+        self.ga = ga
+        self.visits = 0
+        self.expansions = 0
+        self.skips = 0
+        self.versions = set()
+        self.subtree = 0
+
+    def reexpansions(self) -> int:
+        return max(self.expansions - 1, 0)
+
+    def __repr__(self) -> str:
+        return f"Hotspot({self.ga}, {self.visits} visits, {self.subtree} below)"
+
+
+class Hotspots:
+    """
+    Represents the resolution cost of each artifact, to find the BOM or parent responsible for a blow-up.
+
+    Each resolved pom is also counted in the subtree of every artifact of its path.
+    """
+    spots: dict[str, Hotspot]   # groupId:artifactId -> hotspot
+
+    def __init__(self):
+        self.spots = {}
+
+    def spot(self, ga: str) -> Hotspot:
+        spot = self.spots.get(ga)
+        if spot is None:
+            spot = self.spots[ga] = Hotspot(ga)
+        return spot
+
+    def visit(self, pom: PomProject, paths: PomPaths, expand: bool):
+        """
+        Count a resolved pom, expanded when its dependencies are loaded.
+        """
+        spot = self.spot(f"{pom.groupId}:{pom.artifactId}")
+        spot.visits += 1
+        if expand: spot.expansions += 1
+        spot.versions.add(pom.version or '')
+        for ga in { f"{p.groupId}:{p.artifactId}" for p in paths.paths }:
+            self.spot(ga).subtree += 1
+
+    def skip(self, dep: PomDependency):
+        """
+        Count a dependency not recursed as already loaded.
+        """
+        self.spot(f"{dep.groupId}:{dep.artifactId}").skips += 1
+
+    def top(self, count: int = 10) -> list[Hotspot]:
+        """
+        Return the artifacts with the largest subtrees, then the most visited.
+        """
+        return sorted(self.spots.values(), key = lambda spot: (-spot.subtree, -spot.visits, spot.ga))[:count]
+
+    def __repr__(self) -> str:
+        return f"Hotspots({len(self.spots)})"
+
+
+if __name__ == "__main__":
+    from pom_context import ResolverContext
+    from pom_loader import load_pom_from_file
+    from pom_solver import resolve_pom
+    ctx = ResolverContext()
+    ctx.jdk = '1.8'
+    ctx.hotspots = Hotspots()
+    pom14 = load_pom_from_file(ctx, 'tests/pom14.xml')
+    assert pom14
+    resolve_pom(ctx, pom14, load_mgts = True, load_deps = True)
+    # verify that the top pom is the largest subtree, containing every other visit
+    [ top, *others ] = ctx.hotspots.top(len(ctx.hotspots.spots))
+    assert top.ga == 'mygroup:myartifact' and top.visits == 1 and top.expansions == 1
+    assert top.subtree == sum(spot.visits for spot in ctx.hotspots.spots.values()) - 1
+    assert all(spot.subtree <= top.subtree for spot in others)
+    # verify that skips and expansions are counted by artifact
+    assert sum(spot.skips for spot in ctx.hotspots.spots.values()) > 0
+    assert ctx.hotspots.spot('commons-pool:commons-pool').versions == { '1.5' }
+    assert ctx.hotspots.spot('commons-pool:commons-pool').subtree > 0
+    # passed
+    print("PASSED")
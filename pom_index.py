@@ -0,0 +1,146 @@
+import json, os
+from pom_context import file_mtime, replace_file
+from pom_struct import PomProject
+
+# Version of the index file format, an index with another version is ignored
+INDEX_VERSION = 1
+
+
+class IndexRecord:
+    """
+    Represents a dependency of a module in the reverse index.
+
+    The path is the fullnames of the poms bringing the dependency, from the module (excluded),
+    it is the shortest one as maven nearest wins.
+    """
+    file: str
+    module: str
+    version: str
+    scope: str
+    path: list[str]
+
+    def __init__(self, file: str, module: str, version: str, scope: str, path: list[str]):
+        self.file = file
+        self.module = module
+        self.version = version
+        self.scope = scope
+        self.path = path
+
+    def __repr__(self) -> str:
+        return f"IndexRecord({self.module}:{self.version}:{self.scope})[{len(self.path)}]"
+
+
+class DependencyIndex:
+    """
+    Represents a reverse index of the resolved modules: groupId:artifactId -> modules using it.
+
+    Modules are replaced when resolved again, so an index can be refreshed by resolving only some modules.
+    """
+    modules: dict[str, dict]            # pom file -> module gav, mtime and dependencies
+    index: dict[str, list[IndexRecord]] # groupId:artifactId -> records
+
+    def __init__(self):
+        self.modules = {}
+        self.index = {}
+
+    def update(self, pom: PomProject):
+        """
+        Replace the records of a resolved module.
+        """
+        module = pom.gav()
+        self.remove(pom.file)
+        dependencies = []
+        for dep in pom.computed_dependencies.values():
+            if dep.type == 'parent': continue
+            path = [ p.fullname() for p in dep.paths.paths[1:] ]
+            dependencies.append([ dep.key_excl(), dep.version, dep.scope, path ])
+        self.modules[pom.file] = { 'module': module, 'mtime': file_mtime(pom.file), 'dependencies': dependencies }
+        self.add_records(pom.file, module, dependencies)
+
+    def remove(self, file: str):
+        """
+        Remove the records of a module.
+        """
+        infos = self.modules.pop(file, None)
+        if infos is None:
+            return
+        for ga, _, _, _ in infos['dependencies']:
+            records = [ record for record in self.index[ga] if record.file != file ]
+            if records:
+                self.index[ga] = records
+            else:
+                del self.index[ga]
+
+    def add_records(self, file: str, module: str, dependencies: list[list]):
+        for ga, version, scope, path in dependencies:
+            self.index.setdefault(ga, []).append(IndexRecord(file, module, version, scope, path))
+
+    def who(self, ga: str) -> list[IndexRecord]:
+        """
+        Return the modules using a dependency, sorted by module.
+        """
+        return sorted(self.index.get(ga, []), key = lambda record: record.module)
+
+    def stale(self) -> list[str]:
+        """
+        Return the pom files modified or removed since they were indexed.
+        """
+        return [ file for file, infos in self.modules.items() if file_mtime(file) != infos['mtime'] ]
+
+    def save(self, file: str):
+        with replace_file(file) as f:
+            json.dump({ 'version': INDEX_VERSION, 'modules': self.modules }, f)
+
+    def __repr__(self) -> str:
+        return f"DependencyIndex({len(self.modules)} modules, {len(self.index)} dependencies)"
+
+
+def load_index(file: str) -> DependencyIndex:
+    """
+    Load an index, returning an empty index if the file does not exist or has another format.
+    """
+    index = DependencyIndex()
+    try:
+        with open(file, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return index
+    if data.get('version') != INDEX_VERSION:
+        return index
+    index.modules = data['modules']
+    for file, infos in index.modules.items():
+        index.add_records(file, infos['module'], infos['dependencies'])
+    return index
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pom_session import Session
+    session = Session()
+    session.register('tests/pom15-a.xml')
+    session.register('tests/pom15-b.xml')
+    # verify that the index is built from resolved modules
+    index = DependencyIndex()
+    for file in [ 'tests/pom15.xml', 'tests/pom15-a.xml' ]:
+        [ result ] = session.resolve(file, sections = [ 'dependencies' ])
+        index.update(result.pom)
+    assert [ (record.module, record.version, record.scope) for record in index.who('commons-io:commons-io') ] == [
+        ('mygroup:myartifact:1.0-SNAPSHOT', '2.6', 'compile'), ('mygroup:mymodule-a:1.0-SNAPSHOT', '2.6', 'compile') ]
+    assert index.who('commons-io:commons-io')[0].path == [ 'mygroup:mymodule-a:jar:1.0-SNAPSHOT:compile', 'mygroup:myparent:pom:1.0-SNAPSHOT' ]
+    assert [ record.module for record in index.who('mygroup:mymodule-b') ] == [ 'mygroup:myartifact:1.0-SNAPSHOT' ]
+    # verify that the index is saved and loaded
+    with tempfile.TemporaryDirectory() as tmp:
+        file = os.path.join(tmp, 'index.json')
+        index.save(file)
+        loaded = load_index(file)
+        assert [ (r.module, r.version, r.path) for r in loaded.who('commons-io:commons-io') ] == [ (r.module, r.version, r.path) for r in index.who('commons-io:commons-io') ]
+        assert loaded.stale() == []
+    # verify that a module resolved again replaces its records
+    [ result ] = session.resolve('tests/pom15.xml', sections = [ 'dependencies' ])
+    index.update(result.pom)
+    assert len(index.who('commons-io:commons-io')) == 2 and len(index.modules) == 2
+    index.remove(result.pom.file)
+    assert index.who('mygroup:mymodule-b') == [] and 'mygroup:mymodule-b' not in index.index
+    assert len(index.who('commons-io:commons-io')) == 1
+    # passed
+    print("PASSED")
@@ -1,59 +1,83 @@
-import os, pathlib, re
-from pom_struct import PomProject, PomParent, PomDependency, PomProperties, PomPaths, PomInfos
+import os, re
+from typing import TYPE_CHECKING
+from pom_context import ResolverContext
+from pom_struct import PomModel, PomProject, PomParent, PomDependency, PomProperties, PomLayeredProps, PomPaths, PomInfos
 from pom_reader import read_pom
-from pom_tracer import *
-from packaging.version import Version
+from pom_budget import CycleDetected
+from pom_version import parse_range, parse_version, in_range
 
-M2_HOME = os.path.join(pathlib.Path.home(), '.m2/repository')
+if TYPE_CHECKING:
+    from concurrent.futures import Future
 
-cache_poms: dict[str, PomProject] = {} # file -> pom
-cache_deps: dict[str, str] = {}        # dep -> file
 
-def load_pom_from_file(file: str, allow_missing = False) -> PomProject | None:
+def load_pom_from_file(ctx: ResolverContext, file: str, allow_missing = False, prefetched: 'Future[tuple[PomModel, bool]] | None' = None) -> PomProject | None:
     """
-    Load a pom file from its path.
+    Load a pom file from its path, returning a new visit of its cached model.
+    A model prefetched by read_pom_file() in another thread is cached here, so that the context is only modified by the caller thread.
     """
-    file = os.path.abspath(file)
-    if file in cache_poms:
-        return cache_poms[file].copy()
+    file = ctx.abspath(file)
+    if ctx.inputs is not None: ctx.inputs.add(file)
+    model = ctx.cache_poms.get(file)
+    if model is not None:
+        return PomProject(model)
     
     # if allow_missing and not os.path.exists(file):
     #     return None
-    
-    pom = read_pom(file)
-    cache_poms[file] = pom
 
-    return pom.copy()
+    # use the pom parsed by another process if it is stored, otherwise store it for others
+    model, stored = prefetched.result() if prefetched is not None else read_pom_file(ctx, file)
+    if stored:
+        ctx.count('poms stored')
+    else:
+        ctx.count('poms parsed')
+        if ctx.store is not None: ctx.store.add(file, model)
+    ctx.cache_poms[file] = model
+
+    return PomProject(model)
 
 
-def load_pom_from_dependency(dependency: PomParent | PomDependency, base: str, allow_missing = False) -> PomProject | None:
+def read_pom_file(ctx: ResolverContext, file: str) -> tuple[PomModel, bool]:
+    """
+    Read the model of a pom file from the store or the xml, returning whether it was stored.
+    The context is not modified, so it can be called from any thread.
+    """
+    model = ctx.store.get(file) if ctx.store is not None else None
+    if model is not None:
+        return model, True
+    return read_pom(file), False
+
+
+def load_pom_from_dependency(ctx: ResolverContext, dependency: PomParent | PomDependency, base: str, allow_missing = False) -> PomProject | None:
     """
     Load a pom file from its dependency groupId, artifactId and version.
     """
-    file = find_pom_location(dependency, base)
-    pom = load_pom_from_file(file, allow_missing = allow_missing)
-    if pom: cache_deps[pom.gav()] = file
+    file = find_pom_location(ctx, dependency, base)
+    pom = load_pom_from_file(ctx, file, allow_missing = allow_missing)
+    if pom: ctx.cache_deps[pom.gav()] = file
     return pom
 
 
-def find_pom_location(dependency: PomParent | PomDependency, base: str) -> str:
+def find_pom_location(ctx: ResolverContext, dependency: PomParent | PomDependency, base: str) -> str:
     """
     Find the location of the pom file of a dependency.
     """
-    if dependency.fullname() in cache_deps:
-        return cache_deps[dependency.fullname()]
+    # the relativePath is an input even when missing or the location cached, as it is used once it exists
+    if ctx.inputs is not None and dependency.relativePath != '' and not base.startswith(ctx.m2_home):
+        ctx.inputs.add(ctx.abspath(os.path.join(os.path.dirname(base), dependency.relativePath)))
+    if dependency.fullname() in ctx.cache_deps:
+        return ctx.cache_deps[dependency.fullname()]
     # try to load relativePath, maven silently ignore missing files
-    if dependency.relativePath != '' and not base.startswith(M2_HOME):
+    if dependency.relativePath != '' and not base.startswith(ctx.m2_home):
         file = os.path.join(os.path.dirname(base), dependency.relativePath)
         if os.path.exists(file):
             return file
     if isinstance(dependency, PomDependency) and dependency.version[:1] == '[':
-        dependency.version = resolve_range_version(dependency)
-    file = os.path.join(M2_HOME, dependency.groupId.replace(".", "/"), dependency.artifactId, dependency.version, f"{dependency.artifactId}-{dependency.version}.pom")
+        dependency.version = resolve_range_version(ctx, dependency)
+    file = os.path.join(ctx.m2_home, dependency.groupId.replace(".", "/"), dependency.artifactId, dependency.version, f"{dependency.artifactId}-{dependency.version}.pom")
     return file
 
 
-def resolve_range_version(dependency: PomDependency) -> str:
+def resolve_range_version(ctx: ResolverContext, dependency: PomDependency) -> str:
     """
     Find the version of a dependency, or return original version.
     """
@@ -61,74 +85,93 @@ def resolve_range_version(dependency: PomDependency) -> str:
     last = dependency.version[-1:]
     if first not in '[(' or last not in '])':
         return dependency.version
-    # get minimal version and maximal version
-    min_version, max_version = dependency.version[1:-1].split(',')
-    min_version = min_version.strip()
-    max_version = max_version.strip()
-    min_version = Version(min_version) if min_version != '' else None
-    max_version = Version(max_version) if max_version != '' else None
+    range = parse_range(dependency.version)
     # list all folders in the repository
-    dir = os.path.join(M2_HOME, dependency.groupId.replace(".", "/"), dependency.artifactId)
+    dir = os.path.join(ctx.m2_home, dependency.groupId.replace(".", "/"), dependency.artifactId)
+    if ctx.inputs is not None: ctx.inputs.add(dir)
     if not os.path.exists(dir):
         return dependency.version
     versions = [ name for name in os.listdir(dir) if os.path.isdir(os.path.join(dir, name)) ]
     # filter versions
     highest = None
     for version in versions:
-        version = Version(version)
-        if (
-            min_version is None or
-            (first == '[' and version >= min_version) or
-            (first == '(' and version > min_version)
-        ) and (
-            max_version is None or
-            (last == ']' and version <= max_version) or
-            (last == ')' and version < max_version)
-        ):
-            if highest is None or version > highest:
-                highest = version
+        version = parse_version(version)
+        if in_range(version, range) and (highest is None or version > highest):
+            highest = version
     # return highest version
-    if TRACER and TRACER.trace_range(dependency.key_trace()): TRACER.trace("ver | range", dependency.fullname(), 'version', highest)
+    if ctx.tracer and ctx.tracer.trace_range(dependency.key_trace()): ctx.tracer.trace("ver | range", dependency.fullname(), 'version', highest)
     return str(highest) if highest is not None else dependency.version
 
 
-def register_pom_locations(file: str, initialProps: PomProperties | None = None):
+def register_pom_locations(ctx: ResolverContext, file: str, initialProps: PomProperties | None = None):
     """
     Register the location of a pom file, so that it uses this file when searched by dependency.
 
-    Modules are also registered.
+    Modules are also registered. With prefetch threads, all module poms are parsed concurrently first,
+    then registered in the same order as without threads, so that properties are inherited the same way.
+    """
+    if ctx.prefetch > 0:
+        discover_modules(ctx, ctx.abspath(file))
+    register_module(ctx, file, initialProps)
+
+
+def discover_modules(ctx: ResolverContext, file: str):
+    """
+    Parse a pom and its modules level by level with the prefetch threads, filling the pom cache.
+
+    Threads only read the poms, which are cached and counted by the caller thread.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    found = 0
+    files = [ file ]
+    with ThreadPoolExecutor(ctx.prefetch, thread_name_prefix='discover') as executor:
+        while files:
+            futures = [ executor.submit(read_pom_file, ctx, file) if file not in ctx.cache_poms else None for file in files ]
+            poms = [ load_pom_from_file(ctx, file, prefetched = future) for file, future in zip(files, futures) ]
+            found += len(files)
+            files = [ ctx.abspath(os.path.join(os.path.dirname(pom.file), module, 'pom.xml')) for pom in poms if pom for module in pom.modules ]
+    ctx.count('modules discovered', found)
+
+
+def register_module(ctx: ResolverContext, file: str, initialProps: PomProperties | None = None):
+    """
+    Register the location of a pom file and its modules, properties of a pom being initial properties of its modules.
     """
     if initialProps is None: initialProps = PomProperties()
 
-    file = os.path.abspath(file)
-    pom = load_pom_from_file(file)
+    file = ctx.abspath(file)
+    pom = load_pom_from_file(ctx, file)
     assert pom
 
     # add initial properties, allowing submodules to have parent properties
+    # properties are shared with the cached pom, so they are copied before being modified
+    pom.properties = pom.properties.copy()
     for prop in initialProps.values():
         pom.properties.set(prop.name, prop.value)
 
     # load parents to resolve properties, but not in the pom as we don't provide props = pom.computed_properties
     # the only change on the pom should be groupId, artifactId and version
-    # allowing to overwrite cache with a correct pom
-    load_pom_parents(pom)
-    cache_deps[pom.gav()] = pom.file
-    cache_poms[file] = pom
+    # allowing to replace the cached model with a resolved one
+    load_pom_parents(ctx, pom)
+    ctx.cache_deps[pom.gav()] = pom.file
+    ctx.cache_poms[file] = pom.to_model()
 
     for module in pom.modules:
         module_file = os.path.join(os.path.dirname(file), module, 'pom.xml')
-        register_pom_locations(module_file, initialProps = pom.properties)
+        ctx.cache_aggregators[ctx.abspath(module_file)] = file
+        register_module(ctx, module_file, initialProps = pom.properties)
 
 
-def load_pom_parents(pom: PomProject, xinitialProps: PomProperties | None = None, props: PomProperties | None = None, paths: PomPaths | None = None):
+def load_pom_parents(ctx: ResolverContext, pom: PomProject, xinitialProps: PomProperties | None = None, props: PomLayeredProps | None = None, paths: PomPaths | None = None, children: tuple[str, ...] = ()):
     """
     Load the properties of a pom file into props, pom parents.
     It resolves only the necessary properties to find the parents.
 
-    It returns all poms, from root to the top parent one.
+    The properties of each pom are added as a layer of props, without copying them.
+    Children are the files of the poms already loaded in this parent chain, to detect cycles.
     """
     if xinitialProps is None: xinitialProps = PomProperties()
-    if props is None: props = PomProperties()
+    if props is None: props = PomLayeredProps()
     if paths is None: paths = PomPaths()
 
     paths = paths.add(pom, 1)
@@ -138,22 +181,24 @@ def load_pom_parents(pom: PomProject, xinitialProps: PomProperties | None = None
         props.set(prop.name, prop.value, paths)
 
     # add project properties
-    for prop in pom.properties.values():
-        props.addIfMissing(prop.name, prop.value, paths)
+    props.add_layer(pom.properties, paths)
 
     # resolve properties to find parent
     if pom.parent is not None:
         resolve_artifact(pom.parent, props, pom.builtins)
-        parent_pom = load_pom_from_dependency(pom.parent, pom.file)
+        parent_pom = load_pom_from_dependency(ctx, pom.parent, pom.file)
         assert parent_pom
+        children = children + (pom.file,)
+        if parent_pom.file in children:
+            raise CycleDetected(f"parent cycle on {parent_pom.gav()}", pom, paths)
         pom.parent.pom = parent_pom
-        load_pom_parents(pom.parent.pom, props = props, paths = paths)
+        load_pom_parents(ctx, pom.parent.pom, props = props, paths = paths, children = children)
 
     # resolve properties to get fullname
     resolve_artifact(pom, props, pom.builtins)
 
 
-def resolve_artifact(infos: PomInfos, props: PomProperties, builtins: PomProperties):
+def resolve_artifact(infos: PomInfos, props: PomProperties | PomLayeredProps, builtins: PomProperties):
     """
     Resolve groupId, artifactId and version.
     """
@@ -161,7 +206,7 @@ def resolve_artifact(infos: PomInfos, props: PomProperties, builtins: PomPropert
     infos.artifactId = resolve_value(infos.artifactId, props, builtins)
     infos.version = resolve_value(infos.version, props, builtins)
 
-def resolve_value(value: str, props: PomProperties, builtins: PomProperties) -> str:
+def resolve_value(value: str, props: PomProperties | PomLayeredProps, builtins: PomProperties) -> str:
     """
     Resolve value using provided properties: ${name} -> value.
     """
@@ -183,19 +228,44 @@ def resolve_value(value: str, props: PomProperties, builtins: PomProperties) ->
 
 
 if __name__ == "__main__":
+    ctx = ResolverContext()
     # load pom
-    pom1 = load_pom_from_file('tests/pom1.xml')
+    pom1 = load_pom_from_file(ctx, 'tests/pom1.xml')
     assert pom1 and pom1.gav() == 'mygroup:myartifact:${revision}'
     # register pom
-    register_pom_locations('tests/pom1.xml')
+    register_pom_locations(ctx, 'tests/pom1.xml')
     # load pom from dependency
     dep1 = PomDependency()
     dep1.groupId = 'mygroup'
     dep1.artifactId = 'myartifact'
     dep1.version = '1.0-SNAPSHOT'
-    pom2 = load_pom_from_dependency(dep1, 'tests/pom1.xml')
+    pom2 = load_pom_from_dependency(ctx, dep1, 'tests/pom1.xml')
     # although it's found with version 1.0-SNAPSHOT, it's still unresolved
     assert pom2 and pom2.gav() == 'mygroup:myartifact:1.0-SNAPSHOT'
+    # register a workspace with threads, modules inheriting the revision of their parent module
+    import tempfile
+    def write_module(dir: str, artifactId: str, parent: str | None, modules: list[str]):
+        os.makedirs(dir, exist_ok = True)
+        with open(os.path.join(dir, 'pom.xml'), 'w') as f:
+            f.write('<project xmlns="http://maven.apache.org/POM/4.0.0"><modelVersion>4.0.0</modelVersion>')
+            if parent: f.write(f'<parent><groupId>mygroup</groupId><artifactId>{parent}</artifactId><version>${{revision}}</version><relativePath>../pom.xml</relativePath></parent>')
+            else: f.write('<groupId>mygroup</groupId><version>${revision}</version><properties><revision>2.0</revision></properties>')
+            f.write(f'<artifactId>{artifactId}</artifactId><packaging>pom</packaging><modules>')
+            f.write(''.join(f'<module>{module}</module>' for module in modules))
+            f.write('</modules></project>')
+    with tempfile.TemporaryDirectory() as tmp:
+        write_module(tmp, 'myroot', None, [ f'module{i}' for i in range(8) ])
+        for i in range(8):
+            write_module(os.path.join(tmp, f'module{i}'), f'module{i}', 'myroot', [ f'sub{j}' for j in range(4) ])
+            for j in range(4):
+                write_module(os.path.join(tmp, f'module{i}', f'sub{j}'), f'module{i}-sub{j}', f'module{i}', [])
+        serial = ResolverContext(cwd = tmp)
+        register_pom_locations(serial, 'pom.xml')
+        parallel = ResolverContext(cwd = tmp, prefetch = 4)
+        register_pom_locations(parallel, 'pom.xml')
+        assert parallel.stats['modules discovered'] == serial.stats['poms parsed'] == parallel.stats['poms parsed'] == 41
+        assert parallel.cache_deps == serial.cache_deps and 'mygroup:module7-sub3:2.0' in parallel.cache_deps
+        assert { file: model.gav() for file, model in parallel.cache_poms.items() } == { file: model.gav() for file, model in serial.cache_poms.items() }
     # passed
     print("PASSED")
 
@@ -204,24 +274,24 @@ if __name__ == "__main__":
     dep1.groupId = 'mygroup'
     dep1.artifactId = 'myartifact'
     dep1.version = '[1.0,2.0)'
-    assert "1.3" == resolve_range_version(dep1)
+    assert "1.3" == resolve_range_version(ctx, dep1)
     dep1 = PomDependency()
     dep1.groupId = 'mygroup'
     dep1.artifactId = 'myartifact'
     dep1.version = '[1.0,)'
-    assert "2.1" == resolve_range_version(dep1)
+    assert "2.1" == resolve_range_version(ctx, dep1)
     dep1 = PomDependency()
     dep1.groupId = 'mygroup'
     dep1.artifactId = 'myartifact'
     dep1.version = '[1.0,2)'
-    assert "1.3" == resolve_range_version(dep1)
+    assert "1.3" == resolve_range_version(ctx, dep1)
     dep1 = PomDependency()
     dep1.groupId = 'mygroup'
     dep1.artifactId = 'myartifact'
     dep1.version = '[1.0,2]'
-    assert "2.0" == resolve_range_version(dep1)
+    assert "2.0" == resolve_range_version(ctx, dep1)
     dep1 = PomDependency()
     dep1.groupId = 'mygroup'
     dep1.artifactId = 'myartifact'
     dep1.version = '(1.5,2]'
-    assert "2.0" == resolve_range_version(dep1)
+    assert "2.0" == resolve_range_version(ctx, dep1)
@@ -0,0 +1,195 @@
+import hashlib, json, os
+from pom_context import ResolverContext, replace_file
+from pom_struct import PomProject
+
+# Version of the lock file format, a lock with another version is ignored
+LOCK_VERSION = 1
+
+# Prefix of the lock input names located in the maven repository
+M2_PREFIX = 'm2:'
+
+
+class Lockfile:
+    """
+    Represents the resolved dependencies of each module, with a digest of every file read to resolve them.
+
+    Inputs are the poms loaded, the aggregators whose properties a module inherits, the repository
+    directories listed for version ranges, and the files checked by profile activations or as parent
+    relativePath, including missing ones, so a module whose inputs and environment are unchanged
+    is known to resolve the same way.
+    Names are relative to the lock directory, or to the repository, to be shared between machines.
+    """
+    base: str                           # lock file directory
+    modules: dict[str, dict]            # module file -> module gav, environment, dependencies, inputs
+
+    def __init__(self, base: str):
+        self.base = base
+        self.modules = {}
+
+    def update(self, ctx: ResolverContext, pom: PomProject, inputs: set[str], environment: dict):
+        """
+        Replace the dependencies and input digests of a resolved module.
+        """
+        inputs = inputs | { pom.file }
+        file = pom.file
+        while file in ctx.cache_aggregators:
+            file = ctx.cache_aggregators[file]
+            inputs.add(file)
+        self.modules[self.name(ctx, pom.file)] = {
+            'module': pom.gav(),
+            'environment': environment,
+            'dependencies': lock_dependencies(pom),
+            'inputs': { self.name(ctx, file): digest(file) for file in sorted(inputs) },
+        }
+
+    def changed(self, ctx: ResolverContext, name: str, environment: dict) -> list[str]:
+        """
+        Return why a locked module may resolve differently: another environment or the names of modified inputs.
+        """
+        infos = self.modules[name]
+        if infos['environment'] != environment:
+            return [ 'environment' ]
+        return [ input for input, value in infos['inputs'].items() if digest(self.file(ctx, input)) != value ]
+
+    def differences(self, ctx: ResolverContext, pom: PomProject) -> list[str]:
+        """
+        Return the dependencies of a resolved module which are not the locked ones, '-' removed, '+' added
+        and '~' brought by other poms.
+        """
+        infos = self.modules.get(self.name(ctx, pom.file))
+        locked = { f"{gav}:{scope}": path for gav, scope, path in infos['dependencies'] } if infos is not None else {}
+        resolved = { f"{gav}:{scope}": path for gav, scope, path in lock_dependencies(pom) }
+        return [ f"- {dep}" for dep in locked if dep not in resolved ] + [ f"+ {dep}" for dep in resolved if dep not in locked ] \
+            + [ f"~ {dep} via {dump_path(path)} instead of {dump_path(locked[dep])}" for dep, path in resolved.items() if dep in locked and path != locked[dep] ]
+
+    def name(self, ctx: ResolverContext, file: str) -> str:
+        if file.startswith(ctx.m2_home + os.sep):
+            return M2_PREFIX + os.path.relpath(file, ctx.m2_home)
+        return os.path.relpath(os.path.abspath(file), self.base)
+
+    def file(self, ctx: ResolverContext, name: str) -> str:
+        if name.startswith(M2_PREFIX):
+            return os.path.join(ctx.m2_home, name[len(M2_PREFIX):])
+        return os.path.normpath(os.path.join(self.base, name))
+
+    def save(self, file: str):
+        with replace_file(file) as f:
+            json.dump({ 'version': LOCK_VERSION, 'modules': self.modules }, f, indent = 2, sort_keys = True)
+
+    def __repr__(self) -> str:
+        return f"Lockfile({len(self.modules)} modules)"
+
+
+def load_lock(file: str) -> Lockfile:
+    """
+    Load a lock, returning an empty lock if the file does not exist or has another format.
+    """
+    lock = Lockfile(os.path.dirname(os.path.abspath(file)))
+    try:
+        with open(file, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return lock
+    if data.get('version') != LOCK_VERSION:
+        return lock
+    lock.modules = data['modules']
+    return lock
+
+
+def lock_environment(ctx: ResolverContext, defines: dict[str, str]) -> dict:
+    """
+    Return the values, other than the inputs, a resolution depends on.
+    """
+    return { 'jdk': ctx.jdk, 'os.name': ctx.os_name, 'os.family': ctx.os_family, 'os.arch': ctx.os_arch, 'defines': defines }
+
+
+def lock_dependencies(pom: PomProject) -> list[list]:
+    """
+    Return the gav, scope and path of the resolved dependencies of a module, path being the fullnames of the poms bringing it.
+    """
+    dependencies = []
+    for dep in pom.computed_dependencies.values():
+        if dep.type == 'parent': continue
+        path = [ p.fullname() for p in dep.paths.paths[1:] ]
+        dependencies.append([ f"{dep.key_gat()}:{dep.version}", dep.scope, path ])
+    return dependencies
+
+
+def dump_path(path: list[str]) -> str:
+    return ' / '.join(path) if path else '.'
+
+
+def digest(file: str) -> str | None:
+    """
+    Return the sha256 of a file, or of the sorted names of a directory, None if it doesn't exist.
+    """
+    try:
+        if os.path.isdir(file):
+            return hashlib.sha256('\n'.join(sorted(os.listdir(file))).encode()).hexdigest()
+        with open(file, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    import shutil, tempfile
+    from pom_session import Session
+    with tempfile.TemporaryDirectory() as tmp:
+        pom_file = shutil.copy('tests/pom14.xml', tmp)
+        lock_file = os.path.join(tmp, 'deps.lock')
+        # verify that a lock records the dependencies and the poms read to resolve them
+        session = Session(jdk = '1.8')
+        ctx = session.ctx
+        environment = lock_environment(ctx, {})
+        lock = Lockfile(tmp)
+        for pom in session.walk(pom_file):
+            ctx.inputs = set()
+            session.resolve_pom(pom)
+            lock.update(ctx, pom, ctx.inputs, environment)
+            ctx.inputs = None
+        lock.save(lock_file)
+        lock = load_lock(lock_file)
+        [ (name, infos) ] = lock.modules.items()
+        assert name == 'pom14.xml' and infos['dependencies'][0][:2] == [ 'commons-pool:commons-pool:jar:1.5', 'compile' ]
+        assert len(infos['inputs']) == ctx.stats['poms parsed'] and all(input.startswith(M2_PREFIX) for input in infos['inputs'] if input != name)
+        # verify that an unchanged module only needs a digest comparison
+        assert lock.changed(ctx, name, environment) == []
+        assert lock.changed(ctx, name, lock_environment(ctx, { 'a': 'b' })) == [ 'environment' ]
+        # verify that modified inputs are reported, and dependencies compared after a new resolution
+        with open(pom_file, 'a') as f:
+            f.write('\n')
+        assert lock.changed(ctx, name, environment) == [ 'pom14.xml' ]
+        pom = Session(jdk = '21').resolve(pom_file, sections = [ 'dependencies' ])[0].pom
+        assert '+ commons-pool:commons-pool:jar:1.4:compile' in lock.differences(ctx, pom) and '- commons-pool:commons-pool:jar:1.5:compile' in lock.differences(ctx, pom)
+        # verify that a dependency brought by other poms is reported
+        pom = session.resolve(pom_file, sections = [ 'dependencies' ])[0].pom
+        assert lock.differences(ctx, pom) == []
+        gav, scope, path = infos['dependencies'][1]
+        infos['dependencies'][1] = [ gav, scope, [ 'fake.lib:other:1.0' ] ]
+        assert lock.differences(ctx, pom) == [ f"~ {gav}:{scope} via {dump_path(path)} instead of fake.lib:other:1.0" ]
+    with tempfile.TemporaryDirectory() as tmp:
+        # verify that aggregators and checked files are inputs, missing files included
+        os.makedirs(os.path.join(tmp, 'a'))
+        with open(os.path.join(tmp, 'pom.xml'), 'w') as f:
+            f.write('<project><groupId>mygroup</groupId><artifactId>myroot</artifactId><version>1.0</version><packaging>pom</packaging>'
+                '<properties><x>1</x></properties><modules><module>a</module></modules></project>')
+        with open(os.path.join(tmp, 'a', 'pom.xml'), 'w') as f:
+            f.write('<project><parent><groupId>fake.parent</groupId><artifactId>parent0</artifactId><version>1</version><relativePath>../parent/pom.xml</relativePath></parent>'
+                '<groupId>mygroup</groupId><artifactId>a</artifactId><version>1.0</version><profiles><profile><id>marked</id>'
+                '<activation><file><exists>marker</exists></file></activation><properties><y>1</y></properties></profile></profiles></project>')
+        session = Session(jdk = '1.8')
+        ctx = session.ctx
+        session.register(os.path.join(tmp, 'pom.xml'))
+        lock = Lockfile(tmp)
+        for pom in session.walk(tmp):
+            ctx.inputs = set()
+            session.resolve_pom(pom)
+            lock.update(ctx, pom, ctx.inputs, environment)
+            ctx.inputs = None
+        inputs = lock.modules[os.path.join('a', 'pom.xml')]['inputs']
+        assert 'pom.xml' in inputs and inputs[os.path.join('a', 'marker')] is None and inputs[os.path.join('parent', 'pom.xml')] is None
+        open(os.path.join(tmp, 'a', 'marker'), 'w').close()
+        assert lock.changed(ctx, os.path.join('a', 'pom.xml'), environment) == [ os.path.join('a', 'marker') ]
+    # passed
+    print("PASSED")
@@ -0,0 +1,114 @@
+from pom_session import Session
+
+
+class Environment:
+    """
+    Represents an environment of the matrix: jdk, os and defined properties, None keeping the session value.
+    """
+    name: str
+    jdk: str | None
+    os_name: str | None
+    os_family: str | None
+    os_arch: str | None
+    defines: dict[str, str]
+
+    def __repr__(self) -> str:
+        return f"Environment({self.name})"
+
+
+class MatrixResult:
+    """
+    Represents the dependencies of a module in each environment of the matrix.
+
+    Dependencies are 'groupId:artifactId:type' -> one 'version:scope' per environment, None when missing.
+    """
+    module: str
+    environments: list[Environment]
+    dependencies: dict[str, list[str | None]]
+
+    def differences(self) -> dict[str, list[str | None]]:
+        """
+        Return the dependencies which are not the same in all environments.
+        """
+        return { key: values for key, values in self.dependencies.items() if len(set(values)) > 1 }
+
+    def __repr__(self) -> str:
+        return f"MatrixResult({self.module})[{len(self.differences())}]"
+
+
+def parse_environment(spec: str) -> Environment:
+    """
+    Parse an environment in format "jdk=17,os.name=windows,name=value,...".
+    Keys other than jdk, os.name, os.family and os.arch are defined as properties.
+    """
+    env = Environment()
+    env.name = spec
+    values = {}
+    for item in spec.split(','):
+        if item.strip() == '': continue
+        if '=' not in item:
+            raise Exception(f"Invalid environment format: '{item}', expected 'name=value'")
+        name, value = item.split('=', 1)
+        values[name.strip()] = value.strip()
+    env.jdk = values.pop('jdk', None)
+    env.os_name = values.pop('os.name', None)
+    env.os_family = values.pop('os.family', None)
+    env.os_arch = values.pop('os.arch', None)
+    env.defines = values
+    return env
+
+
+def resolve_matrix(session: Session, file: str, environments: list[Environment], projects: list[str] | None = None) -> list[MatrixResult]:
+    """
+    Resolve a pom and its modules in each environment.
+
+    Environments are derived from the session, so poms are read and registered once,
+    and only registered again for environments defining properties.
+    """
+    results: dict[str, MatrixResult] = {}
+    for i, env in enumerate(environments):
+        derived = session.derive(jdk = env.jdk, os_name = env.os_name, os_family = env.os_family, os_arch = env.os_arch, defines = env.defines)
+        if env.defines:
+            derived.register(file)
+        for result in derived.resolve(file, sections = [ 'dependencies' ], projects = projects):
+            matrix = results.get(result.file)
+            if matrix is None:
+                matrix = results[result.file] = MatrixResult()
+                matrix.module = result.gav()
+                matrix.environments = environments
+                matrix.dependencies = {}
+            for dep in result.dependencies or []:
+                values = matrix.dependencies.setdefault(dep.key(), [ None ] * len(environments))
+                values[i] = f"{dep.version}:{dep.scope}"
+        for name, count in derived.ctx.stats.items():
+            session.ctx.count(name, count)
+    return list(results.values())
+
+
+if __name__ == "__main__":
+    session = Session()
+    # verify environments parsing
+    env = parse_environment('jdk=1.8,os.name=Windows,revision=2.0')
+    assert env.jdk == '1.8' and env.os_name == 'Windows' and env.os_family is None and env.defines == { 'revision': '2.0' }
+    # verify that differences between environments are reported
+    environments = [ parse_environment('jdk=1.8'), parse_environment('jdk=21'), parse_environment('jdk=21.0.2') ]
+    [ result ] = resolve_matrix(session, 'tests/pom14.xml', environments)
+    differences = result.differences()
+    assert differences['commons-pool:commons-pool:jar'] == [ '1.5:compile', '1.4:compile', '1.4:compile' ]
+    assert differences['fake.lib:lib2:jar'] == [ '2.0:compile', None, None ]
+    assert 'commons-io:commons-io:jar' in differences
+    # verify that poms are only read once for all environments
+    poms = len(session.ctx.cache_poms)
+    resolve_matrix(session, 'tests/pom14.xml', environments)
+    assert len(session.ctx.cache_poms) == poms
+    # verify that the os family follows the os name, for family activated profiles
+    [ result ] = resolve_matrix(session, 'tests/pom19.xml', [ parse_environment('os.name=linux'), parse_environment('os.name=windows') ])
+    assert result.dependencies['commons-pool:commons-pool:jar'] == [ '1.4:compile', '1.5:compile' ]
+    # verify that defined properties are applied
+    [ result ] = resolve_matrix(session, 'tests/pom14.xml', [ parse_environment('jdk=21'), parse_environment('jdk=21,commons-io.version=2.5') ])
+    assert result.differences()['commons-io:commons-io:jar'] == [ '2.7:compile', '2.5:compile' ]
+    # verify that an environment resolves as a separate session would
+    [ separate ] = Session(jdk = '21', defines = { 'commons-io.version': '2.5' }).resolve('tests/pom14.xml', sections = [ 'dependencies' ])
+    assert { dep.key(): f"{dep.version}:{dep.scope}" for dep in separate.dependencies or [] } == { key: values[1] for key, values in result.dependencies.items() if values[1] }
+    # passed
+    print("PASSED")
@@ -0,0 +1,96 @@
+import gc, tracemalloc
+from pom_budget import memory_mb
+from pom_struct import PomProject
+
+# Classes whose live instances are counted at each phase
+COUNTED_CLASSES = [ 'PomDependency', 'PomPaths', 'PomProperty' ]
+
+
+class PhaseReport:
+    """
+    Represents the memory at the end of a phase, with the call sites which allocated the most during it.
+    """
+    name: str
+    rss: float                      # maximum resident memory in MB
+    traced: float                   # memory allocated by python and still alive in MB
+    peak: float                     # maximum traced memory since the start in MB
+    sites: list[tuple[str, int]]    # file:line -> bytes allocated during the phase
+    objects: dict[str, int]         # counted class -> live instances
+
+    def __repr__(self) -> str:
+        return f"PhaseReport({self.name}, {self.traced:.1f} MB)"
+
+
+class MemoryProfile:
+    """
+    Represents tracemalloc snapshots taken after each phase of a run: discovery, parents, managements, dependencies, printing.
+
+    Tracing starts with the profile, so it must be created before the poms are read.
+    """
+    top: int
+    phases: list[PhaseReport]
+
+    def __init__(self, top: int = 5):
+        self.top = top
+        self.phases = []
+        tracemalloc.start()
+        self.previous = tracemalloc.take_snapshot()
+
+    def snapshot(self, phase: str, pom: PomProject | None = None):
+        """
+        Record the memory at the end of a phase, for a pom when given.
+        """
+        # ignore the allocations of the profile itself
+        snapshot = tracemalloc.take_snapshot().filter_traces([ tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '*pom_memprofile.py') ])
+        report = PhaseReport()
+        report.name = f"{phase} {pom.gav()}" if pom is not None else phase
+        report.rss = memory_mb()
+        traced, peak = tracemalloc.get_traced_memory()
+        report.traced = traced / (1024 * 1024)
+        report.peak = peak / (1024 * 1024)
+        stats = [ stat for stat in snapshot.compare_to(self.previous, 'lineno') if stat.size_diff > 0 ]
+        report.sites = [ (f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", stat.size_diff) for stat in stats[:self.top] ]
+        report.objects = count_objects()
+        self.phases.append(report)
+        self.previous = snapshot
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def __repr__(self) -> str:
+        return f"MemoryProfile({len(self.phases)} phases)"
+
+
+def count_objects() -> dict[str, int]:
+    """
+    Return the number of live instances of the counted classes.
+    """
+    counts = { name: 0 for name in COUNTED_CLASSES }
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        if name in counts:
+            counts[name] += 1
+    return counts
+
+
+if __name__ == "__main__":
+    from pom_context import ResolverContext
+    from pom_loader import load_pom_from_file
+    from pom_solver import resolve_pom
+    profile = MemoryProfile()
+    ctx = ResolverContext()
+    ctx.jdk = '1.8'
+    ctx.memprofile = profile
+    pom14 = load_pom_from_file(ctx, 'tests/pom14.xml')
+    assert pom14
+    profile.snapshot('discovery')
+    resolve_pom(ctx, pom14, load_mgts = True, load_deps = True)
+    profile.stop()
+    # verify that the solver records its phases for the top pom only
+    assert [ phase.name for phase in profile.phases ] == [ 'discovery', 'parents mygroup:myartifact:1.0-SNAPSHOT', 'managements mygroup:myartifact:1.0-SNAPSHOT', 'dependencies mygroup:myartifact:1.0-SNAPSHOT' ]
+    # verify that objects are counted and allocations attributed to call sites
+    dependencies = profile.phases[-1]
+    assert dependencies.objects['PomDependency'] >= len(pom14.added_dependencies) and dependencies.objects['PomPaths'] > 0
+    assert dependencies.sites and all(size > 0 for _, size in dependencies.sites) and dependencies.peak >= dependencies.traced
+    # passed
+    print("PASSED")
@@ -1,10 +1,12 @@
 import os
-from pom_loader import load_pom_from_file
-from pom_solver import resolve_pom
-from pom_struct import PomProject, PomDependency, PomPaths
+from typing import TYPE_CHECKING
+from pom_session import SECTIONS, SECTIONS_ALIAS
+from pom_struct import PomProject, PomDependency, PomPaths, PomRequest, compute_tree
+
+if TYPE_CHECKING:
+    from pom_classpath import ClasspathEntry
+    from pom_matrix import MatrixResult
 
-SECTIONS = ['project', 'properties', 'managements', 'dependencies', 'collect', 'tree']
-SECTIONS_ALIAS = { 'proj': 'project', 'props': 'properties', 'mgts': 'managements', 'deps': 'dependencies', 'coll': 'collect' }
 
 
 def print_pom(pom: PomProject, indent: int = 120, color = os.isatty(1), basic = False, sections: list[str] | None = None):
@@ -78,48 +80,7 @@ def print_pom(pom: PomProject, indent: int = 120, color = os.isatty(1), basic =
             print()
 
     if 'tree' in sections:
-        dep_elems: list[PomDependency] = list(pom.computed_dependencies.values())
-        dep_pom = PomDependency()
-        dep_pom.groupId = pom.groupId
-        dep_pom.artifactId = pom.artifactId
-        dep_pom.version = pom.version
-        dep_root = (dep_pom, [])
-        dep_nodes = { pom.key_excl(): dep_root }
-        dep_parents = {}
-        for dep in sorted(dep_elems, key=lambda d: (d.groupId, d.artifactId)):
-            parent = [ p for p in dep.paths.paths if p.computed_type != 'parent' ][-1]
-            if dep.key_excl() not in dep_parents:
-                dep_parents[dep.key_excl()] = [ parent.key_excl() ]
-            else:
-                dep_parents[dep.key_excl()].append(parent.key_excl())
-
-        # create graph
-        for dep in dep_elems:
-            parents = dep_parents[dep.key_excl()]
-            found = False
-            for parent in parents:
-                if parent in dep_nodes:
-                    dep_nodes[parent][1].append(dep)
-                    dep_nodes[dep.key_excl()] = (dep, [])
-                    found = True
-                    break
-            if not found:
-                dep_elems.append(dep)
-
-        # # remove 'parent' types
-        # def remove_parents(node, parent):
-        #     dep = node[0]
-        #     childs = node[1]
-        #     if parent is not None and dep.type == 'parent':
-        #         parent[1].extend(childs)
-        #         childs = []
-        #         del dep_nodes[dep.key_excl()]
-        #     else:
-        #         parent = node
-        #     for child in childs:
-        #         node = dep_nodes[child.key_excl()]
-        #         remove_parents(node, parent)
-        # remove_parents(dep_root, None)
+        dep_nodes = compute_tree(pom)
 
         # print tree
         print(f"Tree Dependencies ({len(dep_nodes) - 1}):")
@@ -145,6 +106,63 @@ def print_pom(pom: PomProject, indent: int = 120, color = os.isatty(1), basic =
 
         print()
 
+    if 'conflicts' in sections:
+        conflicts = compute_conflicts(pom)
+        print(f"Conflicts ({len(conflicts)}):")
+        print()
+        for key, winner, requests in conflicts:
+            print(f"    {c_name(key)}:{c_val(winner.version)}:{c_sco(winner.scope)}")
+            for request in requests:
+                status = 'won' if request.version == winner.version else 'lost'
+                print_comment(indent2, f"        {c_val(request.version)}:{c_sco(request.scope)} {status} x{request.count}", dump_paths(request.paths), 'dep: ')
+            print()
+
+
+def compute_conflicts(pom: PomProject) -> list[tuple[str, PomDependency, list[PomRequest]]]:
+    """
+    Return the dependencies requested with more than one version, with the winning dependency and the requests.
+    """
+    conflicts = []
+    for key, requests in sorted(pom.computed_conflicts.items()):
+        if len({ request.version for request in requests.values() }) < 2: continue
+        conflicts.append((key, pom.computed_dependencies[key], list(requests.values())))
+    return conflicts
+
+
+def print_matrix(result: 'MatrixResult', indent: int = 120, color = os.isatty(1)):
+    """
+    Print the dependencies of a module which differ between environments.
+    """
+    nocolor = lambda x: x
+    c_name = nocolor if not color else lambda x: f"\033[1;33m{x}\033[0m"
+    c_val = nocolor if not color else lambda x: f"\033[1;32m{x}\033[0m"
+    c_indent = 11 if color else 0
+    indent2 = indent + 2 * c_indent
+
+    differences = result.differences()
+    print()
+    print(f"Environment Differences ({len(differences)}):")
+    print()
+    for key, values in sorted(differences.items()):
+        for env, value in zip(result.environments, values):
+            print_comment(indent2, f"    {c_name(key)}:{c_val(value or 'missing')}", env.name)
+        print()
+
+
+def print_classpath(classpath: 'list[ClasspathEntry]', scope: str, color = os.isatty(1)):
+    """
+    Print the artifact files of a classpath, flagging missing ones, then the classpath itself.
+    """
+    c_sco = (lambda x: x) if not color else lambda x: f"\033[1;31m{x}\033[0m"
+    missing = [ entry for entry in classpath if entry.missing ]
+    print()
+    print(f"Classpath {scope} ({len(classpath)}, {len(missing)} missing):")
+    print()
+    for entry in classpath:
+        print(f"    {entry.file}{c_sco(' missing') if entry.missing else ''}")
+    print()
+    print(os.pathsep.join(entry.file for entry in classpath))
+
 
 def cname(name: str) -> str:
     return f"${{{name}}}"
@@ -167,7 +185,11 @@ def dump_paths(paths: PomPaths):
 
 
 if __name__ == '__main__':
-    pom1 = load_pom_from_file('tests/pom1.xml')
+    from pom_context import ResolverContext
+    from pom_loader import load_pom_from_file
+    from pom_solver import resolve_pom
+    ctx = ResolverContext()
+    pom1 = load_pom_from_file(ctx, 'tests/pom1.xml')
     assert pom1
-    resolve_pom(pom1, load_mgts = True, load_deps = True)
+    resolve_pom(ctx, pom1, load_mgts = True, load_deps = True)
     print_pom(pom1)
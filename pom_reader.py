@@ -1,67 +1,117 @@
-from pom_struct import PomProject, PomParent, PomDependency, PomExclusion, PomProperties, PomProfile, PomDeps
-from lxml import etree
+from functools import lru_cache
+from pom_struct import PomModel, PomParent, PomDependency, PomExclusion, PomProperties, PomProfile, PomDeps
 
-POM_PARSER = etree.XMLParser(
-    recover = True,
-    remove_comments = True,
-    remove_pis = True,
-    ns_clean = True,
-)
+PARENT_TAGS = ['groupId', 'artifactId', 'version', 'relativePath']
+DEPENDENCY_TAGS = ['groupId', 'artifactId', 'version', 'type', 'scope', 'exclusions', 'classifier', 'optional', 'systemPath']
+EXCLUSION_TAGS = ['groupId', 'artifactId']
+PROFILE_TAGS = ['id', 'activation', 'dependencies', 'dependencyManagement', 'properties', 'build', 'repositories', 'pluginRepositories', 'modules', 'file', 'distributionManagement', 'reporting']
+ACTIVATION_TAGS = ['activeByDefault', 'jdk', 'property', 'os', 'file']
+PROPERTY_TAGS = ['name', 'value']
+OS_TAGS = ['name', 'family', 'arch', 'version']
+FILE_TAGS = ['exists', 'missing']
 
 
-def read_pom(file: str) -> PomProject:
+class PomTags:
     """
-    Read a pom.xml file and return a PomProject object.
+    Represents the qualified tags of a pom namespace, mapped to their local names.
+
+    Tags are qualified once per namespace, so reading elements is only a dict lookup per child.
+    """
+    def __init__(self, ns: str):
+        self.ns = ns
+        self.parent = self.qualify(PARENT_TAGS)
+        self.dependency = self.qualify(DEPENDENCY_TAGS)
+        self.exclusion = self.qualify(EXCLUSION_TAGS)
+        self.profile = self.qualify(PROFILE_TAGS)
+        self.activation = self.qualify(ACTIVATION_TAGS)
+        self.property = self.qualify(PROPERTY_TAGS)
+        self.os = self.qualify(OS_TAGS)
+        self.file = self.qualify(FILE_TAGS)
+        self.t_property = ns + 'property'
+        self.t_dependencies = ns + 'dependencies'
+        self.t_dependency = ns + 'dependency'
+        self.t_exclusion = ns + 'exclusion'
+        self.t_module = ns + 'module'
+        self.t_profile = ns + 'profile'
+
+    def qualify(self, tags: list[str]) -> dict[str, str]:
+        return { self.ns + tag: tag for tag in tags }
+
+    def local(self, tag: str) -> str:
+        return tag.replace(self.ns, "")
+
+    def is_element(self, tag) -> bool:
+        # like findall('*') does, skip elements from other namespaces
+        return isinstance(tag, str) and tag.startswith(self.ns)
+
+
+@lru_cache(maxsize = None)
+def get_tags(ns: str) -> PomTags:
+    return PomTags(ns)
+
+
+@lru_cache(maxsize = None)
+def get_parser():
+    """
+    Return the xml parser, importing lxml only when the first pom is read.
+    """
+    from lxml import etree
+    return etree.XMLParser(
+        recover = True,
+        remove_comments = True,
+        remove_pis = True,
+        ns_clean = True,
+    )
+
+
+def read_pom(file: str) -> PomModel:
+    """
+    Read a pom.xml file and return a PomModel object.
 
     The returned object contains all the pom information, without any external state information.
-    It can then be cloned to provide additional information, like paths[].
+    It is then visited by PomProject to provide additional information, like paths[].
     """
-    pom = PomProject()
+    pom = PomModel()
     pom.file = file
 
     # read file
     with open(file, 'rb') as f:
         xml = f.read()
-    doc = etree.fromstring(xml, parser=POM_PARSER)
+    from lxml import etree
+    doc = etree.fromstring(xml, parser=get_parser())
     ns = doc.nsmap.get(None, '')
     ns = '{%s}' % ns if ns else ''
+    tags = get_tags(ns)
+
+    # split project in a single walk, keeping the first element of single tags
+    project = get_children(doc, ns)
+    first = lambda name: project[name][0] if name in project else None
 
     # read project
-    pom.groupId = find_text(doc, 'groupId')
-    pom.artifactId = find_text(doc, 'artifactId')
-    pom.version = find_text(doc, 'version')
-    pom.name = find_text(doc, 'name')
-    pom.packaging = find_text(doc, 'packaging', 'jar')
+    pom.groupId = get_text(first('groupId'))
+    pom.artifactId = get_text(first('artifactId'))
+    pom.version = get_text(first('version'))
+    pom.name = get_text(first('name'))
+    pom.packaging = get_text(first('packaging'), 'jar')
 
     # read parent
     pom.parent = None
-    parent = find(doc, 'parent')
+    parent = first('parent')
     if parent is not None:
-        unexpected_tags(pom, parent, '*', ['groupId', 'artifactId', 'version', 'relativePath'])
+        fields = get_fields(pom, parent, tags.parent, tags)
         pom.parent = PomParent()
-        pom.parent.groupId = find_text(parent, 'groupId')
-        pom.parent.artifactId = find_text(parent, 'artifactId')
-        pom.parent.version = find_text(parent, 'version')
-        pom.parent.relativePath = find_text(parent, 'relativePath')
+        pom.parent.groupId = get_value(fields, 'groupId')
+        pom.parent.artifactId = get_value(fields, 'artifactId')
+        pom.parent.version = get_value(fields, 'version')
+        pom.parent.relativePath = get_value(fields, 'relativePath')
 
         # fix missing project properties
         if pom.groupId == '': pom.groupId = pom.parent.groupId
         if pom.version == '': pom.version = pom.parent.version
 
     # read properties
-    pom.properties = PomProperties()
-    properties = find(doc, 'properties')
-    if properties is not None:
-        for prop in properties.iterchildren():
-            if prop.tag == ns + 'property':
-                unexpected_tags(pom, prop, '*', ['name','value'])
-                name = prop.get('name')
-                value = prop.get('value', '')
-            else:
-                name = prop.tag[len(ns):]
-                value = prop.text or ''
-            pom.properties.set(name, value)
-    
+    pom.properties = get_properties(pom, first('properties'), tags)
+
     # add built-in properties
     pom.builtins = PomProperties()
 
@@ -82,145 +132,208 @@ def read_pom(file: str) -> PomProject:
         pom.builtins.set('project.parent.artifactId', pom.parent.artifactId)
         pom.builtins.set('project.parent.groupId', pom.parent.groupId)
         pom.builtins.set('project.parent.version', pom.parent.version)
-    
+
     # read dependencyManagement
-    pom.managements = []
-    managements = find_all(doc, 'dependencyManagement/dependencies/dependency')
-    for dep in managements:
-        pom.managements.append(get_dependency(pom, dep))
+    pom.managements = get_managements(pom, project.get('dependencyManagement', []), tags)
 
     # read dependencies
-    pom.dependencies = []
-    dependencies = find_all(doc, 'dependencies/dependency')
-    for dep in dependencies:
-        pom.dependencies.append(get_dependency(pom, dep))
-    
+    pom.dependencies = get_dependencies(pom, project.get('dependencies', []), tags)
+
     # read modules
-    pom.modules = []
-    modules = find_all(doc, 'modules/module')
-    for module in modules:
-        pom.modules.append(module.text)
-    
+    pom.modules = get_modules(project.get('modules', []), tags)
+
     # read profiles
     pom.profiles = []
-    profiles = find_all(doc, 'profiles/profile')
-    for profile in profiles:
-        unexpected_tags(pom, profile, '*', ['id', 'activation', 'dependencies', 'dependencyManagement', 'properties', 'build', 'repositories', 'pluginRepositories', 'modules', 'file', 'distributionManagement', 'reporting'])
-        pro = PomProfile()
-        pro.id = find_text(profile, 'id', '')
-        activation = find(profile, 'activation')
-        if activation is not None:
-            unexpected_tags(pom, activation, '*', ['activeByDefault', 'jdk', 'property', 'os', 'file'])
-            pro.active_by_default = find_text(activation, 'activeByDefault', 'false') == 'true'
-            if find(activation, 'jdk') is not None:
-                pro.jdk = find_text(activation, 'jdk')
-            if find(activation, 'property') is not None:
-                unexpected_tags(pom, activation, 'property/*', ['name', 'value'])
-                pro.property_name = find_text(activation, 'property/name')
-                pro.property_value = find_text(activation, 'property/value')
-            if find(activation, 'os') is not None:
-                unexpected_tags(pom, activation, 'os/*', ['name', 'family', 'arch', 'version'])
-                pro.os_name = find_text(activation, 'os/name')
-                pro.os_family = find_text(activation, 'os/family')
-                pro.os_arch = find_text(activation, 'os/arch')
-                pro.os_version = find_text(activation, 'os/version')
-            if find(activation, 'file') is not None:
-                unexpected_tags(pom, activation, 'file/*', ['exists', 'missing'])
-                pro.file_exists = find_text(activation, 'file/exists')
-                pro.file_missing = find_text(activation, 'file/missing')
-        
-        pro.dependencies = PomDeps()
-        dependencies = find_all(profile, 'dependencies/dependency')
-        for dep in dependencies:
-            pro.dependencies.append(get_dependency(pom, dep))
-        
-        pro.managements = PomDeps()
-        managements = find_all(profile, 'dependencyManagement/dependencies/dependency')
-        for dep in managements:
-            pro.managements.append(get_dependency(pom, dep))
-        
-        pro.properties = PomProperties()
-        properties = find(profile, 'properties')
-        if properties is not None:
-            for prop in properties.iterchildren():
-                if prop.tag == ns + 'property':
-                    unexpected_tags(pom, prop, '*', ['name','value'])
-                    name = prop.get('name')
-                    value = prop.get('value', '')
-                else:
-                    name = prop.tag[len(ns):]
-                    value = prop.text or ''
-                pro.properties.set(name, value)
-        
-        pro.modules = []
-        modules = find_all(profile, 'modules/module')
-        for module in modules:
-            pro.modules.append(module.text)
-        
-        pom.profiles.append(pro)
-
+    for profiles in project.get('profiles', []):
+        for profile in profiles:
+            if profile.tag == tags.t_profile:
+                pom.profiles.append(get_profile(pom, profile, tags))
 
     # return the pom object
     return pom
 
-def get_dependency(pom: PomProject, dep) -> PomDependency:
-    unexpected_tags(pom, dep, '*', ['groupId', 'artifactId', 'version', 'type', 'scope', 'exclusions', 'classifier', 'optional', 'systemPath'])
+def get_profile(pom: PomModel, profile, tags: PomTags) -> PomProfile:
+    children = get_elements(pom, profile, tags.profile, tags)
+    first = lambda name: children[name][0] if name in children else None
+    pro = PomProfile()
+    pro.id = get_text(first('id'))
+    activation = first('activation')
+    if activation is not None:
+        activations = get_elements(pom, activation, tags.activation, tags)
+        pro.active_by_default = get_text(activations['activeByDefault'][0], 'false') == 'true' if 'activeByDefault' in activations else False
+        if 'jdk' in activations:
+            pro.jdk = get_text(activations['jdk'][0])
+        if 'property' in activations:
+            fields = get_nested_fields(pom, activation, activations['property'], tags.property, tags)
+            pro.property_name = get_value(fields, 'name')
+            pro.property_value = get_value(fields, 'value')
+        if 'os' in activations:
+            fields = get_nested_fields(pom, activation, activations['os'], tags.os, tags)
+            pro.os_name = get_value(fields, 'name')
+            pro.os_family = get_value(fields, 'family')
+            pro.os_arch = get_value(fields, 'arch')
+            pro.os_version = get_value(fields, 'version')
+        if 'file' in activations:
+            fields = get_nested_fields(pom, activation, activations['file'], tags.file, tags)
+            pro.file_exists = get_value(fields, 'exists')
+            pro.file_missing = get_value(fields, 'missing')
+
+    pro.dependencies = get_dependencies(pom, children.get('dependencies', []), tags)
+    pro.managements = get_managements(pom, children.get('dependencyManagement', []), tags)
+    pro.properties = get_properties(pom, first('properties'), tags)
+    pro.modules = get_modules(children.get('modules', []), tags)
+    return pro
+
+def get_managements(pom: PomModel, managements: list, tags: PomTags) -> PomDeps:
+    deps = PomDeps()
+    for management in managements:
+        for dependencies in management:
+            if dependencies.tag == tags.t_dependencies:
+                deps.extend(get_dependencies(pom, [ dependencies ], tags))
+    return deps
+
+def get_dependencies(pom: PomModel, dependencies: list, tags: PomTags) -> PomDeps:
+    deps = PomDeps()
+    for elem in dependencies:
+        for dep in elem:
+            if dep.tag == tags.t_dependency:
+                deps.append(get_dependency(pom, dep, tags))
+    return deps
+
+def get_dependency(pom: PomModel, dep, tags: PomTags) -> PomDependency:
+    # walk children once, keeping the first of each tag as find() would
+    fields = {}
+    exclusions = []
+    unexpected = None
+    for child in dep:
+        name = tags.dependency.get(child.tag)
+        if name is None:
+            if not tags.is_element(child.tag): continue
+            if unexpected is None: unexpected = []
+            unexpected.append(tags.local(child.tag))
+        elif name == 'exclusions':
+            for excl in child:
+                if excl.tag == tags.t_exclusion:
+                    exclusions.append(get_exclusion(excl, tags))
+        elif name not in fields:
+            fields[name] = child.text
+    if unexpected is not None:
+        raise_unexpected_tags(pom, dep, unexpected)
     dependency = PomDependency()
-    dependency.groupId = find_text(dep, 'groupId')
-    dependency.artifactId = find_text(dep, 'artifactId')
-    dependency.version = find_text(dep, 'version')
-    dependency.scope = find_text(dep, 'scope')
-    dependency.type = find_text(dep, 'type', 'jar')
-    dependency.classifier = find_text(dep, 'classifier')
-    dependency.optional = find_text(dep, 'optional')
+    dependency.groupId = get_value(fields, 'groupId')
+    dependency.artifactId = get_value(fields, 'artifactId')
+    dependency.version = get_value(fields, 'version')
+    dependency.scope = get_value(fields, 'scope')
+    dependency.type = get_value(fields, 'type', 'jar')
+    dependency.classifier = get_value(fields, 'classifier')
+    dependency.optional = get_value(fields, 'optional')
     dependency.relativePath = ''
     dependency.not_found = False
-    dependency.exclusions = []
-    # read exclusions
-    exclusions = find_all(dep, 'exclusions/exclusion')
-    for excl in exclusions:
-        exclusion = PomExclusion()
-        exclusion.groupId = find_text(excl, 'groupId')
-        exclusion.artifactId = find_text(excl, 'artifactId')
-        dependency.exclusions.append(exclusion)
+    dependency.exclusions = exclusions
     return dependency
 
-def find(elem, tag: str):
-    ns = elem.nsmap.get(None, '')
-    ns = '{%s}' % ns if ns else ''
-    tag = tag.replace("/", "/" + ns)
-    return elem.find(ns + tag)
+def get_exclusion(excl, tags: PomTags) -> PomExclusion:
+    fields = {}
+    for child in excl:
+        name = tags.exclusion.get(child.tag)
+        if name is not None and name not in fields:
+            fields[name] = child.text
+    exclusion = PomExclusion()
+    exclusion.groupId = get_value(fields, 'groupId')
+    exclusion.artifactId = get_value(fields, 'artifactId')
+    return exclusion
 
+def get_properties(pom: PomModel, properties, tags: PomTags) -> PomProperties:
+    props = PomProperties()
+    if properties is None:
+        return props
+    ns_len = len(tags.ns)
+    for prop in properties.iterchildren():
+        if prop.tag == tags.t_property:
+            get_fields(pom, prop, tags.property, tags)
+            name = prop.get('name')
+            value = prop.get('value', '')
+        else:
+            name = prop.tag[ns_len:]
+            value = prop.text or ''
+        props.set(name, value)
+    return props
 
-def find_all(elem, tag: str):
-    ns = elem.nsmap.get(None, '')
-    ns = '{%s}' % ns if ns else ''
-    tag = tag.replace("/", "/" + ns)
-    return elem.findall(ns + tag)
+def get_modules(modules: list, tags: PomTags) -> list[str]:
+    return [ module.text for elem in modules for module in elem if module.tag == tags.t_module ]
 
+def get_children(elem, ns: str) -> dict[str, list]:
+    """
+    Group children elements by local name, in document order.
+    """
+    ns_len = len(ns)
+    children = {}
+    for child in elem:
+        tag = child.tag
+        if not isinstance(tag, str) or not tag.startswith(ns): continue
+        children.setdefault(tag[ns_len:], []).append(child)
+    return children
 
-def find_text(elem, tag: str, default = '') -> str:
-    ns = elem.nsmap.get(None, '')
-    ns = '{%s}' % ns if ns else ''
-    tag = tag.replace("/", "/" + ns)
-    elem = elem.find(ns + tag)
-    if elem is None or elem.text is None: return default
-    return elem.text
+def get_elements(pom: PomModel, elem, allowed: dict[str, str], tags: PomTags) -> dict[str, list]:
+    """
+    Group children elements by local name, in document order, halting on non-expected tags.
+    """
+    children = {}
+    unexpected = None
+    for child in elem:
+        name = allowed.get(child.tag)
+        if name is not None:
+            children.setdefault(name, []).append(child)
+        elif tags.is_element(child.tag):
+            if unexpected is None: unexpected = []
+            unexpected.append(tags.local(child.tag))
+    if unexpected is not None:
+        raise_unexpected_tags(pom, elem, unexpected)
+    return children
 
+def get_fields(pom: PomModel, elem, allowed: dict[str, str], tags: PomTags) -> dict[str, str | None]:
+    """
+    Return the text of the first child element of each tag, halting on non-expected tags.
+    """
+    return get_nested_fields(pom, elem, [ elem ], allowed, tags)
 
-def find_tags(elem, tag: str):
-    ns = elem.nsmap.get(None, '')
-    ns = '{%s}' % ns if ns else ''
-    tag = tag.replace("/", "/" + ns)
-    return [ e.tag.replace(ns,"") for e in elem.findall(ns + tag) ]
+def get_nested_fields(pom: PomModel, elem, parents: list, allowed: dict[str, str], tags: PomTags) -> dict[str, str | None]:
+    """
+    Return the text of the first child element of each tag in all parents, halting on non-expected tags.
+    """
+    fields = {}
+    unexpected = None
+    for parent in parents:
+        for child in parent:
+            name = allowed.get(child.tag)
+            if name is not None:
+                if name not in fields: fields[name] = child.text
+            elif tags.is_element(child.tag):
+                if unexpected is None: unexpected = []
+                unexpected.append(tags.local(child.tag))
+    if unexpected is not None:
+        raise_unexpected_tags(pom, elem, unexpected)
+    return fields
 
+def get_text(elem, default = '') -> str:
+    """
+    Return the text of an element, or default if missing.
+    """
+    if elem is None or elem.text is None: return default
+    return elem.text
 
-def unexpected_tags(pom: PomProject, elem, tag: str, allowed: list):
+def get_value(fields: dict[str, str | None], name: str, default = '') -> str:
+    """
+    Return the text of a field, or default if missing.
+    """
+    text = fields.get(name)
+    if text is None: return default
+    return text
+
+def raise_unexpected_tags(pom: PomModel, elem, tags: list):
     # halt on non-expected tags, not groupId or artifactId
-    tags = find_tags(elem, tag)
-    tags = [ t for t in tags if t not in allowed ]
-    if len(tags) > 0:
-        raise Exception(f"Unexpected tags: {tags} in pom {pom.gav()}\n{etree.tostring(elem)}")
+    from lxml import etree
+    raise Exception(f"Unexpected tags: {tags} in pom {pom.gav()}\n{etree.tostring(elem)}")
 
 if __name__ == "__main__":
     # verify reading pom.xml
@@ -229,5 +342,17 @@ if __name__ == "__main__":
     # read old pom format
     pom2 = read_pom('commons-configuration-1.6.pom')
     assert pom2.gav() == "commons-configuration:commons-configuration:1.6"
+    # read profiles
+    pom14 = read_pom('tests/pom14.xml')
+    assert [ (p.id, p.active_by_default, p.jdk) for p in pom14.profiles ] == [ ('test1', True, ''), ('test2', False, '[11,)') ]
+    assert pom14.profiles[0].properties['commons-io.version'].value == '2.6'
+    # halt on unexpected tags
+    from lxml import etree
+    try:
+        tags = get_tags('')
+        get_dependency(pom1, etree.fromstring('<dependency><groupId>g</groupId><unknown/></dependency>'), tags)
+        assert False
+    except Exception as e:
+        assert "Unexpected tags: ['unknown']" in str(e)
     # passed
     print("PASSED")
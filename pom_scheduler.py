@@ -0,0 +1,175 @@
+import heapq
+from typing import Any, Callable, Iterator, Protocol
+from concurrent.futures import Future
+
+
+class SchedulerEntry(Protocol):
+    """
+    Represents a unit of work of the scheduler.
+
+    key is None for entries that can't be dropped, otherwise entries with the same key
+    are dropped when another one was queued with a shorter length and a lower or equal rank.
+    """
+    key: str | None
+    length: int
+    rank: int
+
+    def prefetch(self, scheduler: 'Scheduler'): ...
+
+    def run(self) -> list['SchedulerEntry']: ...
+
+
+# Hook called with the event ('push', 'run' or 'drop'), the entry and the scheduler
+SchedulerHook = Callable[[str, SchedulerEntry, 'Scheduler'], None]
+
+
+class Scheduler:
+    """
+    Runs entries by increasing length, then in insertion order, as maven nearest wins.
+
+    Running an entry returns new entries, which are queued until the queue is empty.
+    With prefetch threads, entries can read their pom ahead while other entries run.
+    Threads only exist while steps() runs, and each key is only fetched once.
+    """
+    queue: list[tuple[int, int, SchedulerEntry]]
+    seq: int
+    claims: dict[str, list[tuple[int, int]]]  # key -> queued (length, rank)
+    hooks: list[SchedulerHook]
+    pushed: int
+    executed: int
+    dropped: int
+    max_frontier: int
+
+    def __init__(self, prefetch: int = 0):
+        self.queue = []
+        self.seq = 0
+        self.claims = {}
+        self.hooks = []
+        self.pushed = 0
+        self.executed = 0
+        self.dropped = 0
+        self.max_frontier = 0
+        self.prefetch = prefetch
+        self.executor = None
+        self.fetched: dict[str, Future] = {}
+
+    def add_hook(self, hook: SchedulerHook) -> 'Scheduler':
+        self.hooks.append(hook)
+        return self
+
+    def push(self, entry: SchedulerEntry):
+        """
+        Queue an entry, claiming its key at its length and rank.
+        """
+        heapq.heappush(self.queue, (entry.length, self.seq, entry))
+        self.seq += 1
+        self.pushed += 1
+        self.max_frontier = max(self.max_frontier, len(self.queue))
+        if entry.key is not None:
+            self.claims.setdefault(entry.key, []).append((entry.length, entry.rank))
+        if self.executor is not None:
+            entry.prefetch(self)
+        for hook in self.hooks: hook('push', entry, self)
+
+    def fetch(self, key: str, fn: Callable[..., Any], *args) -> Future:
+        """
+        Call a function in a prefetch thread, once per key, returning its future.
+        """
+        assert self.executor is not None
+        future = self.fetched.get(key)
+        if future is None:
+            future = self.fetched[key] = self.executor.submit(fn, *args)
+        return future
+
+    def frontier(self) -> int:
+        """
+        Return the number of queued entries.
+        """
+        return len(self.queue)
+
+    def is_redundant(self, entry: SchedulerEntry) -> bool:
+        """
+        Check if an entry with the same key was queued with a shorter length and a lower or equal rank.
+        """
+        if entry.key is None:
+            return False
+        return any(length < entry.length and rank <= entry.rank for length, rank in self.claims[entry.key])
+
+    def run(self):
+        """
+        Run entries until the queue is empty.
+        """
+        for _ in self.steps():
+            pass
+
+    def steps(self) -> Iterator[SchedulerEntry]:
+        """
+        Run entries until the queue is empty, yielding each entry once it is run or dropped.
+
+        Closing the generator stops running entries, the remaining ones staying queued.
+        """
+        try:
+            if self.prefetch > 0:
+                from concurrent.futures import ThreadPoolExecutor
+                self.executor = ThreadPoolExecutor(self.prefetch, thread_name_prefix='prefetch')
+                for _, _, entry in self.queue:
+                    entry.prefetch(self)
+            while self.queue:
+                _, _, entry = heapq.heappop(self.queue)
+                if self.is_redundant(entry):
+                    self.dropped += 1
+                    for hook in self.hooks: hook('drop', entry, self)
+                    yield entry
+                    continue
+                self.executed += 1
+                for hook in self.hooks: hook('run', entry, self)
+                for child in entry.run():
+                    self.push(child)
+                yield entry
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait = True, cancel_futures = True)
+                self.executor = None
+                self.fetched = {}
+
+    def __repr__(self) -> str:
+        return f"Scheduler({self.executed} executed, {self.dropped} dropped, {len(self.queue)} queued)"
+
+
+if __name__ == "__main__":
+    class Entry:
+        def __init__(self, name: str, key: str | None, length: int, rank: int, children: list['Entry'] | None = None):
+            self.name = name
+            self.key = key
+            self.length = length
+            self.rank = rank
+            self.children = children or []
+        def prefetch(self, scheduler): pass
+        def run(self) -> list['Entry']: return self.children
+    # verify that entries run by length, then insertion order, and that dominated entries are dropped
+    order = []
+    scheduler = Scheduler().add_hook(lambda event, entry, _: order.append(f"{event}:{entry.name}") if event != 'push' else None)
+    scheduler.push(Entry('a', 'g:a', 1, 1, [ Entry('c', 'g:c', 2, 1), Entry('p', None, 1, 1) ]))
+    scheduler.push(Entry('b', 'g:b', 1, 1, [ Entry('d', 'g:d', 2, 5), Entry('c2', 'g:c', 3, 1), Entry('d2', 'g:d', 3, 1) ]))
+    scheduler.run()
+    assert order == [ 'run:a', 'run:b', 'run:p', 'run:c', 'run:d', 'drop:c2', 'run:d2' ], order
+    assert scheduler.executed == 6 and scheduler.dropped == 1 and scheduler.frontier() == 0 and scheduler.max_frontier == 5
+    # verify that steps can be stopped, keeping remaining entries queued
+    scheduler = Scheduler()
+    scheduler.push(Entry('a', 'g:a', 1, 1, [ Entry('c', 'g:c', 2, 1) ]))
+    scheduler.push(Entry('b', 'g:b', 1, 1))
+    for entry in scheduler.steps():
+        if entry.name == 'a': break
+    assert scheduler.executed == 1 and scheduler.frontier() == 2
+    # verify that prefetch threads only exist while running, sharing the future of a key
+    class FetchEntry(Entry):
+        def prefetch(self, scheduler): self.future = scheduler.fetch(self.key, str.upper, self.key)
+    scheduler = Scheduler(2)
+    entries = [ FetchEntry('a', 'g:a', 1, 1), FetchEntry('a2', 'g:a', 2, 1) ]
+    for entry in entries: scheduler.push(entry)
+    assert scheduler.executor is None
+    scheduler.run()
+    assert scheduler.executor is None and not scheduler.fetched
+    assert entries[0].future is entries[1].future and entries[0].future.result() == 'G:A'
+    # passed
+    print("PASSED")
@@ -0,0 +1,345 @@
+import os
+from typing import TYPE_CHECKING, Iterator
+from pom_context import ResolverContext, JDK
+from pom_loader import load_pom_from_file, register_pom_locations
+from pom_events import ResolveEvent
+from pom_solver import resolve_pom, iter_resolve_pom
+from pom_struct import PomProject, PomDependency, PomPaths, PomProperties, compute_tree
+from pom_tracer import Tracer
+
+if TYPE_CHECKING:
+    from pom_classpath import ClasspathEntry
+
+# Printable sections, and their aliases
+SECTIONS = ['project', 'properties', 'managements', 'dependencies', 'collect', 'tree', 'conflicts']
+SECTIONS_ALIAS = { 'proj': 'project', 'props': 'properties', 'mgts': 'managements', 'deps': 'dependencies', 'coll': 'collect', 'cp': 'classpath' }
+
+# Sections needing the dependencyManagement, and sections needing the transitive dependencies
+MANAGEMENT_SECTIONS = [ 'managements' ]
+DEPENDENCY_SECTIONS = [ 'dependencies', 'collect', 'tree', 'conflicts', 'classpath' ]
+
+
+class ResolvedDependency:
+    """
+    Represents a resolved dependency, with the poms its values come from.
+
+    Paths are the fullnames of the poms from the root pom (excluded) to the pom defining the value.
+    """
+    groupId: str
+    artifactId: str
+    type: str
+    classifier: str
+    version: str
+    scope: str
+    optional: bool
+    not_found: bool
+    path: list[str]
+    path_version: list[str]
+    path_scope: list[str]
+    path_exclusions: list[str]
+    exclusions: list[str]
+
+    def gav(self) -> str:
+        return f"{self.groupId}:{self.artifactId}:{self.version}"
+
+    def key(self) -> str:
+        return f"{self.groupId}:{self.artifactId}:{self.type}"
+
+    def __repr__(self) -> str:
+        return f"ResolvedDependency({self.key()}:{self.version}:{self.scope})"
+
+
+class ResolvedProperty:
+    """
+    Represents a resolved property.
+    """
+    name: str
+    value: str
+    path: list[str]
+
+    def __repr__(self) -> str:
+        return f"ResolvedProperty({self.name}={self.value})"
+
+
+class ResolvedNode:
+    """
+    Represents a node of the dependency tree.
+    """
+    dependency: ResolvedDependency
+    children: list['ResolvedNode']
+
+    def __repr__(self) -> str:
+        return f"ResolvedNode({self.dependency.gav()})[{len(self.children)}]"
+
+
+class ResolveResult:
+    """
+    Represents the resolution of a pom, sections not requested being None.
+    """
+    file: str
+    groupId: str
+    artifactId: str
+    version: str
+    packaging: str
+    properties: dict[str, ResolvedProperty] | None
+    managements: list[ResolvedDependency] | None
+    dependencies: list[ResolvedDependency] | None
+    collected: list[ResolvedDependency] | None
+    tree: list[ResolvedNode] | None
+    pom: PomProject
+
+    def gav(self) -> str:
+        return f"{self.groupId}:{self.artifactId}:{self.version}"
+
+    def __repr__(self) -> str:
+        return f"ResolveResult({self.gav()})"
+
+
+class Session:
+    """
+    Represents a resolution session, keeping poms and locations cached between resolutions.
+
+    A session is not thread safe, use one session per thread.
+    """
+    ctx: ResolverContext
+    defines: PomProperties
+
+    def __init__(self, m2_home: str | None = None, jdk: str = JDK, defines: dict[str, str] | None = None, cwd: str | None = None, tracer: Tracer | None = None, quiet = True, prefetch = 0):
+        self.ctx = ResolverContext(m2_home = m2_home, cwd = cwd, jdk = jdk, tracer = tracer, quiet = quiet, prefetch = prefetch)
+        self.defines = PomProperties()
+        for name, value in (defines or {}).items():
+            self.defines.set(name, value)
+        self._results: list[ResolveResult] = []
+
+    def register(self, file: str):
+        """
+        Register the location of a pom and its modules, so that they are found when used as dependency.
+        """
+        register_pom_locations(self.ctx, file, initialProps = self.defines.copy())
+
+    def walk(self, file: str) -> Iterator[PomProject]:
+        """
+        Load a pom, then its modules recursively.
+        """
+        file = self.ctx.abspath(os.path.join(file, 'pom.xml') if os.path.isdir(self.ctx.abspath(file)) else file)
+        pom = load_pom_from_file(self.ctx, file)
+        assert pom
+        yield pom
+        for module in pom.modules:
+            yield from self.walk(os.path.join(os.path.dirname(file), module, 'pom.xml'))
+
+    def resolve_pom(self, pom: PomProject, sections: list[str] | None = None) -> PomProject:
+        """
+        Resolve properties, dependencyManagement and dependencies of a loaded pom.
+
+        With sections, resolution stops as soon as the requested sections are computed:
+        project and properties only need the parents, managements don't need the transitive dependencies.
+        """
+        load_mgts, load_deps = resolution_depth(sections)
+        resolve_pom(self.ctx, pom, initialProps = self.defines.copy(), load_mgts = load_mgts, load_deps = load_deps)
+        return pom
+
+    def resolve(self, file: str, sections: list[str] | None = None, projects: list[str] | None = None) -> list[ResolveResult]:
+        """
+        Resolve a pom and its modules, or only the modules whose artifactId is in projects.
+        """
+        sections = expand_sections(sections)
+        results = []
+        for pom in self.walk(file):
+            if projects is not None and pom.artifactId not in projects: continue
+            self.resolve_pom(pom, sections)
+            results.append(new_result(pom, sections))
+        self._results.extend(results)
+        return results
+
+    def classpath(self, file: str, scope: str = 'runtime', projects: list[str] | None = None) -> 'dict[str, list[ClasspathEntry]]':
+        """
+        Return the classpath of a pom and its modules, by module gav.
+
+        Classpaths are cached by module and environment, so a module is only resolved once per session.
+        """
+        classpaths = {}
+        for pom in self.walk(file):
+            if projects is not None and pom.artifactId not in projects: continue
+            if self._classpath_key(pom, scope) not in self.ctx.cache_classpaths:
+                self.resolve_pom(pom, [ 'classpath' ])
+            classpaths.update(self.pom_classpath(pom, scope))
+        return classpaths
+
+    def pom_classpath(self, pom: PomProject, scope: str = 'runtime') -> 'dict[str, list[ClasspathEntry]]':
+        """
+        Return the classpath of a resolved pom by its gav, cached as the classpaths of classpath().
+
+        The files of a cached classpath are checked again, as artifacts can be downloaded or deleted meanwhile.
+        """
+        from pom_classpath import compute_classpath, check_files
+        ctx = self.ctx
+        key = self._classpath_key(pom, scope)
+        cached = ctx.cache_classpaths.get(key)
+        if cached is None:
+            cached = ctx.cache_classpaths[key] = (pom.gav(), compute_classpath(ctx, pom, scope))
+        else:
+            ctx.count('classpath hits')
+            check_files(ctx, cached[1])
+        return { cached[0]: cached[1] }
+
+    def _classpath_key(self, pom: PomProject, scope: str) -> tuple:
+        ctx = self.ctx
+        return (pom.file, scope, ctx.jdk, ctx.os_name, ctx.os_family, ctx.os_arch)
+
+    def events(self, file: str, projects: list[str] | None = None) -> Iterator[ResolveEvent]:
+        """
+        Resolve a pom and its modules, yielding the events of the solver as they happen.
+
+        Leaving the loop over events stops the resolution.
+        """
+        for pom in self.walk(file):
+            if projects is not None and pom.artifactId not in projects: continue
+            yield from iter_resolve_pom(self.ctx, pom, initialProps = self.defines.copy())
+
+    def results(self) -> list[ResolveResult]:
+        """
+        Return the results of all resolutions of the session.
+        """
+        return list(self._results)
+
+    def derive(self, jdk: str | None = None, os_name: str | None = None, os_family: str | None = None, os_arch: str | None = None, defines: dict[str, str] | None = None) -> 'Session':
+        """
+        Return a session for another environment, sharing the parsed poms with this session.
+
+        Registered poms depend on the defines, so with new defines they are kept apart and must be registered again.
+        """
+        session = Session.__new__(Session)
+        session.ctx = self.ctx.derive(jdk = jdk, os_name = os_name, os_family = os_family, os_arch = os_arch)
+        session.defines = self.defines.copy()
+        session._results = []
+        if defines:
+            session.ctx.cache_poms = dict(self.ctx.cache_poms)
+            session.ctx.cache_deps = dict(self.ctx.cache_deps)
+            session.ctx.cache_classpaths = {}
+            for name, value in defines.items():
+                session.defines.set(name, value)
+        return session
+
+    def __repr__(self) -> str:
+        return f"Session({len(self._results)} results, {len(self.ctx.cache_poms)} poms)"
+
+
+def expand_sections(sections: list[str] | None) -> list[str]:
+    if sections is None or 'all' in sections:
+        return SECTIONS
+    return [ SECTIONS_ALIAS.get(section, section) for section in sections ]
+
+
+def resolution_depth(sections: list[str] | None) -> tuple[bool, bool]:
+    """
+    Return whether dependencyManagement and dependencies must be loaded for expanded sections, all being loaded without sections.
+    """
+    if sections is None:
+        return True, True
+    load_deps = any(section in DEPENDENCY_SECTIONS for section in sections)
+    load_mgts = load_deps or any(section in MANAGEMENT_SECTIONS for section in sections)
+    return load_mgts, load_deps
+
+
+def new_result(pom: PomProject, sections: list[str]) -> ResolveResult:
+    result = ResolveResult()
+    result.file = pom.file
+    result.groupId = pom.groupId
+    result.artifactId = pom.artifactId
+    result.version = pom.version
+    result.packaging = pom.packaging
+    result.properties = None
+    result.managements = None
+    result.dependencies = None
+    result.collected = None
+    result.tree = None
+    result.pom = pom
+    if 'properties' in sections:
+        result.properties = { prop.name: new_property(prop.name, prop.value, prop.paths) for prop in pom.computed_properties.values() }
+    if 'managements' in sections:
+        result.managements = [ new_dependency(dep) for dep in pom.computed_managements.values() ]
+    if 'dependencies' in sections:
+        result.dependencies = [ new_dependency(dep) for dep in pom.computed_dependencies.values() if dep.type != 'parent' ]
+    if 'collect' in sections:
+        result.collected = [ new_dependency(dep) for dep in pom.added_dependencies if dep.type != 'parent' ]
+    if 'tree' in sections:
+        nodes = compute_tree(pom)
+        def new_node(dep: PomDependency) -> ResolvedNode:
+            node = ResolvedNode()
+            node.dependency = new_dependency(dep)
+            node.children = [ new_node(child) for child in nodes[dep.key_excl()][1] if child.key_excl() in nodes ]
+            return node
+        result.tree = [ new_node(dep) for dep in nodes[pom.key_excl()][1] ]
+    return result
+
+
+def new_property(name: str, value: str, paths: PomPaths) -> ResolvedProperty:
+    prop = ResolvedProperty()
+    prop.name = name
+    prop.value = value
+    prop.path = path_names(paths)
+    return prop
+
+
+def new_dependency(dep: PomDependency) -> ResolvedDependency:
+    resolved = ResolvedDependency()
+    resolved.groupId = dep.groupId
+    resolved.artifactId = dep.artifactId
+    resolved.type = dep.type
+    resolved.classifier = dep.classifier
+    resolved.version = dep.version
+    resolved.scope = dep.scope
+    resolved.optional = dep.optional == 'true'
+    resolved.not_found = getattr(dep, 'not_found', False)
+    resolved.path = path_names(dep.paths)
+    resolved.path_version = path_names(dep.pathsVersion)
+    resolved.path_scope = path_names(dep.pathsScope)
+    resolved.path_exclusions = path_names(dep.pathsExclusions)
+    resolved.exclusions = [ excl.key() for excl in dep.exclusions ]
+    return resolved
+
+
+def path_names(paths: PomPaths) -> list[str]:
+    return [ pom.fullname() for pom in paths.paths[1:] ]
+
+
+if __name__ == "__main__":
+    session = Session()
+    # resolve a pom, with structured results
+    [ result1 ] = session.resolve('tests/pom2.xml')
+    assert result1.dependencies is not None and result1.managements is not None and result1.properties is not None
+    assert [ mgt.version for mgt in result1.managements ] == [ '2.6' ] and len(result1.properties) == 6
+    # resolve modules, keeping caches warm between resolutions
+    session.register('tests/pom15-a.xml')
+    session.register('tests/pom15-b.xml')
+    [ result15 ] = session.resolve('tests/pom15.xml', sections = [ 'deps', 'tree' ])
+    assert result15.managements is None and result15.dependencies is not None and result15.tree is not None
+    assert [ node.dependency.artifactId for node in result15.tree ] == [ 'mymodule-a', 'mymodule-b' ]
+    commons_io = [ dep for dep in result15.dependencies if dep.artifactId == 'commons-io' ][0]
+    assert commons_io.version == '2.6' and commons_io.path == [ 'mygroup:mymodule-a:jar:1.0-SNAPSHOT:compile', 'mygroup:myparent:pom:1.0-SNAPSHOT' ]
+    poms = len(session.ctx.cache_poms)
+    [ result15 ] = session.resolve('tests/pom15.xml', sections = [ 'deps' ])
+    assert len(session.ctx.cache_poms) == poms
+    assert len(session.results()) == 3
+    # verify that events are streamed for each module
+    from pom_events import PomLoaded, DependencyAdded
+    events = list(session.events('tests/pom15.xml'))
+    assert isinstance(events[0], PomLoaded) and [ event.dep.artifactId for event in events if isinstance(event, DependencyAdded) ][:2] == [ 'mymodule-a', 'mymodule-b' ]
+    # verify that resolution stops once requested sections are computed
+    assert resolution_depth([ 'project', 'properties' ]) == (False, False) and resolution_depth([ 'managements' ]) == (True, False)
+    assert resolution_depth(expand_sections([ 'tree' ])) == (True, True) and resolution_depth(None) == (True, True)
+    [ result15 ] = session.resolve('tests/pom15.xml', sections = [ 'props' ])
+    assert result15.properties is not None and len(result15.pom.computed_dependencies) == 0
+    # verify that defines are resolved for each pom, without modifying the session defines
+    session = Session(defines = { 'x': '${project.artifactId}' })
+    values = [ session.resolve(file, sections = [ 'props' ])[0].properties['x'].value for file in [ 'tests/pom15-a.xml', 'tests/pom15-b.xml' ] ]
+    assert values == [ 'mymodule-a', 'mymodule-b' ] and session.defines['x'].value == '${project.artifactId}'
+    # verify that classpaths are cached by module
+    session = Session(jdk = '1.8')
+    classpath = session.classpath('tests/pom14.xml')['mygroup:myartifact:1.0-SNAPSHOT']
+    assert classpath[0].key == 'commons-pool:commons-pool:jar' and classpath[0].version == '1.5'
+    assert session.classpath('tests/pom14.xml')['mygroup:myartifact:1.0-SNAPSHOT'] is classpath and session.ctx.stats['classpath hits'] == 1
+    assert session.derive(jdk = '21').classpath('tests/pom14.xml')['mygroup:myartifact:1.0-SNAPSHOT'][0].version == '1.4'
+    # passed
+    print("PASSED")
@@ -1,8 +1,12 @@
-from pom_loader import load_pom_parents, resolve_value, load_pom_from_file, resolve_artifact, load_pom_from_dependency, resolve_range_version
-from pom_struct import PomProject, PomPaths, PomMgts, PomExclusion, PomProperties, PomDeps, PomDependency, PomExclusions
-from pom_tracer import *
-from packaging.version import Version
-import platform
+import os
+from typing import Iterator
+from pom_context import ResolverContext
+from pom_events import ResolveEvent, PomLoaded, DependencyAdded, DependencySkipped, VersionManaged, LevelCompleted
+from pom_loader import load_pom_parents, resolve_value, load_pom_from_file, resolve_artifact, load_pom_from_dependency, resolve_range_version, find_pom_location, read_pom_file
+from pom_scheduler import Scheduler
+from pom_budget import CycleDetected
+from pom_version import parse_range, parse_version, in_range
+from pom_struct import PomProject, PomPaths, PomMgts, PomLayeredMgts, PomExclusion, PomProperties, PomLayeredProps, PomDeps, PomDependency, PomExclusions, PomProfile, PomRequest
 
 # Scopes dict (parent scope) -> dict (dependency scope) -> new scope = None if skip as scope is not allowed or starting with '-' if scope is not transitive
 # '?' means that the new scope is not yet defined to mimic maven behavior, and must be checked against real samples
@@ -25,28 +29,32 @@ ALL_TYPES = [ 'jar', 'parent', 'pom' ]
 SKIP_TYPES = [ 'test-jar', 'zip', 'dll', 'dylib', 'so' ]
 SKIP_TYPES2 = [ 'pom' ]
 
-JDK = '21.0.2'
-OS_NAME = platform.system().lower()
-OS_ARCH = "amd64" if platform.machine().lower() == "x86_64" else platform.machine().lower()
-OS_VERSION = platform.release().lower()
-OS_FAMILY = "windows" if OS_NAME == "windows" else "unix"
-
 Scopes = dict[str, str]
 
-def resolve_pom(pom: PomProject, paths: PomPaths | None = None, initialProps: PomProperties | None = None, initialMgts: PomMgts | None = None, computeMgts: PomMgts | None = None, excls: PomExclusions | None = None, scope = DEFAULT_SCOPE, load_mgts = False, load_deps = False):
+def resolve_pom(ctx: ResolverContext, pom: PomProject, paths: PomPaths | None = None, initialProps: PomProperties | None = None, initialMgts: PomLayeredMgts | None = None, computeMgts: PomMgts | None = None, excls: PomExclusions | None = None, scope = DEFAULT_SCOPE, load_mgts = False, load_deps = False, scheduler: Scheduler | None = None, imports: tuple[str, ...] = ()) -> 'list[SolverEntry]':
     """
     Resolve all dependencies a pom project.
+
+    For the top pom, dependencies are resolved by the scheduler, otherwise they are returned as entries to be queued.
+    When a scheduler is provided for the top pom, entries are only queued in it, and the caller runs it.
+    Imports are the files of the poms importing this one, to detect cycles.
+
+    With a budget in the context, ResolutionStopped is raised when it is exceeded, the top pom keeping
+    the dependencies added so far.
     """
     if paths is None: paths = PomPaths()
     if initialProps is None: initialProps = PomProperties()
-    if initialMgts is None: initialMgts = PomMgts()
+    if initialMgts is None: initialMgts = PomLayeredMgts()
     if computeMgts is None: computeMgts = PomMgts()
     if excls is None: excls = PomExclusions()
 
-    if TRACER: TRACER.set_ctx("==> POM", pom.gav(), 'scope', pom.computed_scope, 'paths', dump_paths(paths))
+    if ctx.tracer: ctx.tracer.set_ctx("==> POM", pom.gav(), 'scope', pom.computed_scope, 'paths', dump_paths(paths))
 
-    if TRACER and TRACER.trace_poms():
-        TRACER.trace("")
+    if ctx.tracer and ctx.tracer.trace_poms():
+        ctx.tracer.trace("")
+
+    if ctx.budget is not None: ctx.budget.check(pom, paths)
+    if ctx.hotspots is not None: ctx.hotspots.visit(pom, paths, load_deps)
 
     top_pom = paths.length == 0
 
@@ -56,7 +64,7 @@ def resolve_pom(pom: PomProject, paths: PomPaths | None = None, initialProps: Po
 
     # initial properties
     pom.computed_scope = scope
-    pom.computed_properties = initialProps
+    pom.computed_properties = PomLayeredProps(initialProps)
     pom.computed_exclusions = excls
 
     # management that override dependency properties, in opposite to computed_managements that are defaults to empty dependencies.
@@ -68,39 +76,94 @@ def resolve_pom(pom: PomProject, paths: PomPaths | None = None, initialProps: Po
     if top_pom:
         pom.added_dependencies = PomDeps()
         pom.computed_dependencies = PomMgts()
+        pom.computed_conflicts = {}
+        pom.computed_subtrees = {}
         pom.computed_type = 'pom'
-        os.chdir(os.path.dirname(pom.file))
+
+    # replay the dependencies of an identical subtree, instead of loading parents, properties and managements again
+    if load_deps and not top_pom and ctx.tracer is None and ctx.listener is None:
+        subtree = find_subtree(ctx, pom, paths)
+        if subtree is not None:
+            return replay_subtree(ctx, pom, paths, subtree)
 
     # load all pom parents to resolve all properties
-    load_pom_parents(pom, paths = paths, props = pom.computed_properties)
+    load_pom_parents(ctx, pom, paths = paths, props = pom.computed_properties)
+
+    if ctx.listener: ctx.listener(PomLoaded(pom, paths))
 
     # resolve profiles
-    resolve_profiles(pom)
+    resolve_profiles(ctx, pom, paths)
 
     # resolve all properties
     resolve_properties(pom)
-    if TRACER:
+    if ctx.tracer:
         for prop in pom.computed_properties.values():
-            if TRACER.trace_prop(prop.name):
-                TRACER.trace("prop | property", pom.gav(), prop.name, prop.value)
+            if ctx.tracer.trace_prop(prop.name):
+                ctx.tracer.trace("prop | property", pom.gav(), prop.name, prop.value)
+    if top_pom and ctx.memprofile is not None: ctx.memprofile.snapshot('parents', pom)
 
     # load all dependencyManagement
     if load_mgts:
-        load_managements(pom, paths = paths)
+        load_managements(ctx, pom, paths = paths, imports = imports + (pom.file,))
+        if top_pom and ctx.memprofile is not None: ctx.memprofile.snapshot('managements', pom)
 
     # load all dependencies
-    # by using solvers, dependencies are loaded by depth, in hope it'll
+    # by using the scheduler, dependencies are loaded by depth, in hope it'll
     # minimize the number of dependencies to reload
-    solvers = []
+    entries = []
     if load_deps:
-        solvers.extend(load_dependencies(pom, paths = paths))
+        entries = load_dependencies(ctx, pom, paths = paths)
 
     if top_pom:
-        for solver in solvers:
-            solvers.extend(solver())
-        solvers.clear()
+        run = scheduler is None
+        if scheduler is None: scheduler = Scheduler(ctx.prefetch)
+        for entry in entries:
+            scheduler.push(entry)
+        if run:
+            scheduler.run()
+            ctx.count('entries executed', scheduler.executed)
+            ctx.count('entries dropped', scheduler.dropped)
+            if load_deps and ctx.memprofile is not None: ctx.memprofile.snapshot('dependencies', pom)
+        entries = []
 
-    return solvers
+    return entries
+
+
+def iter_resolve_pom(ctx: ResolverContext, pom: PomProject, initialProps: PomProperties | None = None, load_mgts = True, load_deps = True) -> Iterator[ResolveEvent]:
+    """
+    Resolve a top pom as resolve_pom does, yielding the events of the solver as they happen.
+
+    Closing the generator, or leaving a loop over it, stops the resolution: the pom then only holds
+    the dependencies added so far.
+    """
+    events: list[ResolveEvent] = []
+    level = None
+    def on_entry(event, entry, scheduler):
+        nonlocal level
+        if level is not None and entry.length > level:
+            events.append(LevelCompleted(level))
+        level = entry.length
+    listener = ctx.listener
+    ctx.listener = events.append
+    scheduler = Scheduler(ctx.prefetch).add_hook(lambda event, entry, scheduler: on_entry(event, entry, scheduler) if event != 'push' else None)
+    try:
+        resolve_pom(ctx, pom, initialProps = initialProps, load_mgts = load_mgts, load_deps = load_deps, scheduler = scheduler)
+        yield from drain_events(events)
+        for _ in scheduler.steps():
+            yield from drain_events(events)
+        if level is not None:
+            events.append(LevelCompleted(level))
+        yield from drain_events(events)
+    finally:
+        ctx.listener = listener
+        ctx.count('entries executed', scheduler.executed)
+        ctx.count('entries dropped', scheduler.dropped)
+
+
+def drain_events(events: list[ResolveEvent]) -> list[ResolveEvent]:
+    drained = events.copy()
+    events.clear()
+    return drained
 
 
 def resolve_properties(pom: PomProject):
@@ -108,34 +171,88 @@ def resolve_properties(pom: PomProject):
     Resolve all properties from pom.
     It is assumed that all properties have already been loaded.
     """
-    for prop in pom.computed_properties.values():
+    for prop in pom.computed_properties.unresolved():
         prop.value = resolve_value(prop.value, pom.computed_properties, pom.builtins)
 
 
-def resolve_profiles(pom: PomProject):
+def resolve_profiles(ctx: ResolverContext, pom: PomProject, paths: PomPaths):
+    """
+    Merge active profiles into the pom.
+
+    Activation only depends on the pom file, a few properties, the jdk, the os and the top pom directory,
+    so the active profiles and the merged dependencies and managements are cached with these values as key.
+    """
     # skip unsupported profiles
     if len(pom.profiles) == 0: return
-    #
+    # files are relative to the top pom directory
+    basedir = os.path.dirname(paths.paths[0].file if len(paths.paths) > 0 else pom.file)
+    # files checked by activations are inputs, even when the activation is cached
+    if ctx.inputs is not None:
+        for profile in pom.profiles:
+            for name in [ profile.file_exists, profile.file_missing ]:
+                if name != '' and '$' not in name: ctx.inputs.add(ctx.abspath(os.path.join(basedir, name)))
+    # activations are cached with the resolved values they compare
+    key = profiles_key(ctx, pom, basedir)
+    active = ctx.cache_profiles.get(key)
+    if active is None:
+        active = activate_profiles(ctx, pom, basedir)
+        ctx.cache_profiles[key] = active
+    else:
+        ctx.count('profiles hits')
+    # merge profiles
+    profiles, pom.dependencies, pom.managements = active
+    for profile in profiles:
+        for prop in profile.properties.values():
+            pom.computed_properties.set(prop.name, prop.value)
+
+
+def profiles_key(ctx: ResolverContext, pom: PomProject, basedir: str) -> tuple:
+    """
+    Return the cache key of profiles activation.
+
+    Property activations compare resolved values, so the key holds the resolved values of the activation
+    properties and of the activation values referencing properties.
+    """
+    inputs = ctx.cache_profile_inputs.get(pom.file)
+    if inputs is None:
+        names = tuple({ profile.property_name.lstrip('!') for profile in pom.profiles if profile.property_name != '' })
+        templates = tuple({ profile.property_value for profile in pom.profiles if '$' in profile.property_value })
+        files = any(profile.file_exists != '' or profile.file_missing != '' for profile in pom.profiles)
+        inputs = ctx.cache_profile_inputs.setdefault(pom.file, (names, templates, files))
+    names, templates, files = inputs
+    values = []
+    for name in names:
+        prop = pom.computed_properties.get(name)
+        values.append(resolve_value(prop.value, pom.computed_properties, pom.builtins) if prop is not None else None)
+    for template in templates:
+        values.append(resolve_value(template, pom.computed_properties, pom.builtins))
+    return (pom.file, ctx.jdk, ctx.os_name, ctx.os_family, ctx.os_arch, basedir if files else '', tuple(values))
+
+
+def activate_profiles(ctx: ResolverContext, pom: PomProject, basedir: str) -> tuple[list[PomProfile], PomDeps, PomDeps]:
+    """
+    Return active profiles, and pom dependencies and managements merged with them.
+    """
     profiles = []
     for profile in pom.profiles:
         if len(profile.dependencies) == 0 and len(profile.managements) == 0 and len(profile.properties) == 0 and len(profile.modules) == 0: continue
         if profile.active_by_default: continue
         if profile.jdk != '':
-            if check_version(profile.jdk, JDK):
+            if check_version(profile.jdk, ctx.jdk):
                 profiles.append(profile)
                 continue
         if profile.os_name != '' or profile.os_family != '' or profile.os_arch != '' or profile.os_version != '':
             if profile.os_name != '':
-                if profile.os_name[0] == '!' and profile.os_name.lower() == OS_NAME: continue
-                if profile.os_name[0] != '!' and profile.os_name.lower() != OS_NAME: continue
+                if profile.os_name[0] == '!' and profile.os_name[1:].lower() == ctx.os_name: continue
+                if profile.os_name[0] != '!' and profile.os_name.lower() != ctx.os_name: continue
             if profile.os_family != '':
-                if profile.os_family[0] == '!' and profile.os_family.lower() == OS_FAMILY: continue
-                if profile.os_family[0] != '!' and profile.os_family.lower() != OS_FAMILY: continue
+                if profile.os_family[0] == '!' and profile.os_family[1:].lower() == ctx.os_family: continue
+                if profile.os_family[0] != '!' and profile.os_family.lower() != ctx.os_family: continue
             if profile.os_arch != '':
-                if profile.os_arch[0] == '!' and profile.os_arch.lower() == OS_ARCH: continue
-                if profile.os_arch[0] != '!' and profile.os_arch.lower() != OS_ARCH: continue
+                if profile.os_arch[0] == '!' and profile.os_arch[1:].lower() == ctx.os_arch: continue
+                if profile.os_arch[0] != '!' and profile.os_arch.lower() != ctx.os_arch: continue
             if profile.os_version != '':
-                WARN(f"skip profile '{profile.id}' in pom '{pom.gav()}': unsupported os.version activation '{profile.os_version}'")
+                ctx.warn(f"skip profile '{profile.id}' in pom '{pom.gav()}': unsupported os.version activation '{profile.os_version}'")
                 continue
             profiles.append(profile)
             continue
@@ -153,10 +270,10 @@ def resolve_profiles(pom: PomProject):
                     pv = resolve_value(profile.property_value, pom.computed_properties, pom.builtins)
                     cv = resolve_value(pom.computed_properties[profile.property_name].value, pom.computed_properties, pom.builtins)
                     if '$' in pv:
-                        WARN(f"skip profile '{profile.id}' in pom '{pom.gav()}': unsupported '$' in activation '{pv}'")
+                        ctx.warn(f"skip profile '{profile.id}' in pom '{pom.gav()}': unsupported '$' in activation '{pv}'")
                         continue
                     if '$' in cv:
-                        WARN(f"skip profile '{profile.id}' in pom '{pom.gav()}': unsupported '$' in activation '{cv}'")
+                        ctx.warn(f"skip profile '{profile.id}' in pom '{pom.gav()}': unsupported '$' in activation '{cv}'")
                         continue
                     if cv != pv:
                         continue
@@ -164,11 +281,11 @@ def resolve_profiles(pom: PomProject):
             continue
         if profile.file_exists != '' or profile.file_missing != '':
             if '$' in profile.file_exists or '$' in profile.file_missing:
-                WARN(f"skip profile '{profile.id}' in pom '{pom.gav()}': unsupported '$' in activation '{profile.file_exists}{profile.file_missing}'")
+                ctx.warn(f"skip profile '{profile.id}' in pom '{pom.gav()}': unsupported '$' in activation '{profile.file_exists}{profile.file_missing}'")
                 continue
-            if profile.file_exists != '' and not os.path.exists(profile.file_exists):
+            if profile.file_exists != '' and not os.path.exists(os.path.join(basedir, profile.file_exists)):
                 continue
-            if profile.file_missing != '' and os.path.exists(profile.file_missing):
+            if profile.file_missing != '' and os.path.exists(os.path.join(basedir, profile.file_missing)):
                 continue
             profiles.append(profile)
             continue
@@ -176,44 +293,20 @@ def resolve_profiles(pom: PomProject):
     if len(profiles) == 0:
         profiles = [ profile for profile in pom.profiles if profile.active_by_default ]
     # merge profiles
+    dependencies = pom.dependencies
+    managements = pom.managements
     for profile in profiles:
         # for profiles, the last wins, so we need to put them in front
-        pom.dependencies = profile.dependencies + pom.dependencies
-        pom.managements = profile.managements + pom.managements
-        for prop in profile.properties.values():
-            pom.computed_properties.set(prop.name, prop.value)
+        dependencies = profile.dependencies + dependencies
+        managements = profile.managements + managements
+    return profiles, dependencies, managements
 
 
 def check_version(version: str, target: str) -> bool:
-    first = version[:1]
-    last = version[-1:]
-    if first not in '[(':
-        version = f"[{version}"
-        first = version[:1]
-    if last not in '])':
-        version = f"{version},)"
-        last = version[-1:]
-    # get minimal version and maximal version
-    min_version, max_version = version[1:-1].split(',')
-    min_version = min_version.strip()
-    max_version = max_version.strip()
-    min_version = Version(min_version) if min_version != '' else None
-    max_version = Version(max_version) if max_version != '' else None
-    targetV = Version(target)
-    if (
-        min_version is None or
-        (first == '[' and targetV >= min_version) or
-        (first == '(' and targetV > min_version)
-    ) and (
-        max_version is None or
-        (last == ']' and targetV <= max_version) or
-        (last == ')' and targetV < max_version)
-    ):
-        return True
-    return False
+    return in_range(parse_version(target), parse_range(version))
 
 
-def load_managements(pom: PomProject, curr: PomProject | None = None, paths: PomPaths | None = None):
+def load_managements(ctx: ResolverContext, pom: PomProject, curr: PomProject | None = None, paths: PomPaths | None = None, imports: tuple[str, ...] = ()):
     """
     Load all dependencyManagement from pom.
     It is assumed that all properties have already been loaded.
@@ -230,16 +323,16 @@ def load_managements(pom: PomProject, curr: PomProject | None = None, paths: Pom
     # load dependencies from parent, without using resolve_pom as all properties are already loaded
     if curr.parent is not None:
         curr.parent.pom.computed_type = 'parent'
-        load_managements(pom, curr.parent.pom, paths = paths)
+        load_managements(ctx, pom, curr.parent.pom, paths = paths, imports = imports)
 
     # loop dependencies in pom order, as it can be manually changed
     for dep in curr.managements:
         dep = dep.copy()
-        trace = TRACER and TRACER.trace_dep(dep.key_trace()) and TRACER.trace("mgt | adding", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional, 'paths', dump_paths(paths))
+        trace = ctx.tracer and ctx.tracer.trace_dep(dep.key_trace()) and ctx.tracer.trace("mgt | adding", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional, 'paths', dump_paths(paths))
 
         # resolve artifact
         resolve_artifact(dep, pom.computed_properties, curr.builtins)
-        if trace and TRACER: TRACER.trace("mgt |   resolv", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
+        if trace and ctx.tracer: ctx.tracer.trace("mgt |   resolv", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
 
         # fail on invalid scope
         if dep.scope not in KNOWN_SCOPES:
@@ -247,14 +340,16 @@ def load_managements(pom: PomProject, curr: PomProject | None = None, paths: Pom
 
         if dep.type == 'pom' and dep.scope == 'import':
             # load dependencies from this import with new empty properties
-            dep_pom = load_pom_from_dependency(dep, curr.file)
+            dep_pom = load_pom_from_dependency(ctx, dep, curr.file)
             assert dep_pom
+            if dep_pom.file in imports:
+                raise CycleDetected(f"import cycle on {dep_pom.gav()}", curr, paths)
             dep_pom.computed_type = 'parent'
-            resolve_pom(dep_pom, paths = paths, computeMgts = pom.computed_managements, load_mgts = True)
+            resolve_pom(ctx, dep_pom, paths = paths, computeMgts = pom.computed_managements, load_mgts = True, imports = imports)
         else:
             # merge with existing dependencyManagement
             dep = resolve_management(pom, dep, paths)
-            if trace and TRACER: TRACER.trace("mgt |   merged", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
+            if trace and ctx.tracer: ctx.tracer.trace("mgt |   merged", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
 
 
 def resolve_management(pom: PomProject, mgt: PomDependency, paths: PomPaths) -> PomDependency:
@@ -278,7 +373,7 @@ def resolve_management(pom: PomProject, mgt: PomDependency, paths: PomPaths) ->
     return mgt
 
 
-def load_dependencies(pom: PomProject, paths: PomPaths | None = None):
+def load_dependencies(ctx: ResolverContext, pom: PomProject, paths: PomPaths | None = None):
     """
     Load all dependencies from pom.
     It is assumed that all properties have already been loaded.
@@ -291,9 +386,11 @@ def load_dependencies(pom: PomProject, paths: PomPaths | None = None):
     if paths is None: paths = PomPaths()
 
     deps: PomDeps = []
+    subtree = new_subtree(ctx, pom, paths)
     paths = paths.add(pom, 0 if pom.computed_type == 'parent' else 1) # pom11 => parent poms have priority over transitive dependencies, so they need to be loaded as same length as child
-    dep_inits = new_initial_managements(pom.initial_managements, pom.computed_managements)
+    dep_inits = new_initial_managements(ctx, pom.initial_managements, pom.computed_managements)
     transitive_only = paths.length > 1
+    if subtree is not None: subtree.child_paths = paths
 
     # load dependencies from parent, without using resolve_pom as all properties are already loaded
     # pom12 => even though parent is added before direct dependencies, they are in reality loaded after (as they are loaded from recursion), with the same paths length as the pom
@@ -315,18 +412,20 @@ def load_dependencies(pom: PomProject, paths: PomPaths | None = None):
         dep_pom.pathsOptional = paths
         dep_pom.pathsExclusions = paths
         deps.append(dep_pom)
+        if subtree is not None: subtree.parent = dep_pom.copy()
 
     # load dependencies in pom order, as it can be manually changed
     for dep in pom.dependencies:
         dep = dep.copy()
-        trace = TRACER and TRACER.trace_dep(dep.key_trace()) and TRACER.trace("dep | adding", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'paths', dump_paths(paths))
+        trace = ctx.tracer and ctx.tracer.trace_dep(dep.key_trace()) and ctx.tracer.trace("dep | adding", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'paths', dump_paths(paths))
         
         # resolve artifact
         resolve_artifact(dep, pom.computed_properties, pom.builtins)
-        if trace and TRACER: TRACER.trace("dep |   resolved", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
+        if trace and ctx.tracer: ctx.tracer.trace("dep |   resolved", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
 
         # skip exclusions
-        if dep.key_excl() in pom.computed_exclusions:
+        if is_excluded(pom.computed_exclusions, dep):
+            if ctx.listener: ctx.listener(DependencySkipped(dep, pom, 'excluded'))
             continue
 
         # fail on invalid scope
@@ -342,7 +441,7 @@ def load_dependencies(pom: PomProject, paths: PomPaths | None = None):
             raise Exception(f"Invalid type '{dep.type}' found in dependency {dep.fullname()} of pom {pom.gav()}")
         
         # apply default values to dependency
-        apply_default_to_dependency(pom, dep, paths)
+        apply_default_to_dependency(ctx, pom, dep, paths)
 
         # transitive check
         # pom6 => C1 -> C2 (dm->T2) : C2 is lost if transitivity is checked against T. In pom6, C2 -> T2 is done by initial and not by default
@@ -350,17 +449,20 @@ def load_dependencies(pom: PomProject, paths: PomPaths | None = None):
         transitive_scope = SCOPES[pom.computed_scope][dep.scope]
         is_transitive = transitive_scope is None
         if transitive_only and is_transitive:
-            if trace and TRACER: TRACER.trace("dep |   skip (not transitive)", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
+            if trace and ctx.tracer: ctx.tracer.trace("dep |   skip (not transitive)", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
+            if ctx.listener: ctx.listener(DependencySkipped(dep, pom, 'not transitive'))
             continue
 
         # optional check
         # it is assumed it must stay around transitivity check :-)
         if transitive_only and dep.optional == 'true':
-            if trace and TRACER: TRACER.trace("dep |   skip (is optional)", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
+            if trace and ctx.tracer: ctx.tracer.trace("dep |   skip (is optional)", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
+            if ctx.listener: ctx.listener(DependencySkipped(dep, pom, 'optional'))
             continue
 
         # apply initial values to dependency
-        apply_initial_to_dependency(pom, dep, paths)
+        if subtree is not None: subtree.inits.append((dep.key_gat(), pom.initial_managements.get(dep.key_gat())))
+        apply_initial_to_dependency(ctx, pom, dep, paths)
 
         # resolve artifact again
         resolve_artifact(dep, pom.computed_properties, pom.builtins)
@@ -372,126 +474,321 @@ def load_dependencies(pom: PomProject, paths: PomPaths | None = None):
             dep.scope = max_scope
         if PRIORITY_SCOPES.index(dep.scope) < PRIORITY_SCOPES.index(max_scope):
             dep.scope = max_scope
-        if trace and TRACER: TRACER.trace("dep |   resolved", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
+        if trace and ctx.tracer: ctx.tracer.trace("dep |   resolved", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
 
         # resolve version if it is a range
-        dep.version = resolve_range_version(dep)
+        dep.version = resolve_range_version(ctx, dep)
         if dep.optional == '': dep.optional = 'false'
         if dep.optional not in ['true', 'false']:
             raise Exception(f"Invalid optional {dep.optional} found in dependency {dep.fullname()} of pom {pom.gav()}")
-        if trace and TRACER: TRACER.trace("dep |   fixed", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
+        if trace and ctx.tracer: ctx.tracer.trace("dep |   fixed", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
+
+        # remember the dependency, to replay it for identical subtrees
+        if subtree is not None: subtree.dependencies.append(dep.copy())
+
+        # add to dependencies, unless already loaded
+        if claim_dependency(ctx, pom, dep, paths, trace):
+            deps.append(dep)
+
+    entries = []
+    for dep in deps:
+        # prepare dependency for recursion, the pom being loaded when the entry is run
+        trace = ctx.tracer and ctx.tracer.trace_dep(dep.key_trace()) and ctx.tracer.trace("dep | recurse", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'type', dep.type, 'paths', dump_paths(paths))
+        entries.append(SolverEntry(ctx, pom, dep, paths, dep_inits))
 
-        # skip already loaded dependencies
-        skip = False
+    # return
+    return entries
+
+
+def claim_dependency(ctx: ResolverContext, pom: PomProject, dep: PomDependency, paths: PomPaths, trace) -> bool:
+    """
+    Add a dependency to the computed and added dependencies, returning whether it must be recursed.
+    """
+    # skip already loaded dependencies
+    skip = False
+    if dep.key_excl() in pom.computed_dependencies:
+        loaded = pom.computed_dependencies[dep.key_excl()]
+        # can skip if same scope
+        if PRIORITY_SCOPES.index(dep.scope) == PRIORITY_SCOPES.index(loaded.scope):
+            if paths.length >= loaded.paths.length:
+                if trace and ctx.tracer: ctx.tracer.trace("dep |   no recurse (already loaded)", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
+                skip = True
+        # can skip if new scope is less important
+        elif PRIORITY_SCOPES.index(dep.scope) >= PRIORITY_SCOPES.index(loaded.scope):
+                if trace and ctx.tracer: ctx.tracer.trace("dep |   no recurse (already loaded)", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
+                skip = True
+
+    if skip and ctx.hotspots is not None: ctx.hotspots.skip(dep)
+
+    # update loaded deps
+    if not skip:
         if dep.key_excl() in pom.computed_dependencies:
+            # keep the one with the shortest path
             loaded = pom.computed_dependencies[dep.key_excl()]
-            # can skip if same scope
-            if PRIORITY_SCOPES.index(dep.scope) == PRIORITY_SCOPES.index(loaded.scope):
-                if paths.length >= loaded.paths.length:
-                    if trace and TRACER: TRACER.trace("dep |   no recurse (already loaded)", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
-                    skip = True
-            # can skip if new scope is less important
-            elif PRIORITY_SCOPES.index(dep.scope) >= PRIORITY_SCOPES.index(loaded.scope):
-                    if trace and TRACER: TRACER.trace("dep |   no recurse (already loaded)", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional)
-                    skip = True
-
-        # update loaded deps
-        if not skip:
-            if dep.key_excl() in pom.computed_dependencies:
-                # keep the one with the shortest path
-                loaded = pom.computed_dependencies[dep.key_excl()]
-                fixed = False
-                # always keep the highest scope as it is used later to skip dependencies
-                if PRIORITY_SCOPES.index(dep.scope) < PRIORITY_SCOPES.index(loaded.scope):
-                    loaded.scope = dep.scope
-                    fixed = True
-                # overwrite all other properties, just updating loadedDeps as it is a copy
-                if paths.length < loaded.paths.length:
-                    loaded.version = dep.version
-                    loaded.type = dep.type
-                    loaded.classifier = dep.classifier
-                    loaded.optional = dep.optional
-                    loaded.paths = dep.paths
-                    loaded.exclusions = dep.exclusions
-                    loaded.relativePath = dep.relativePath
-                    loaded.not_found = dep.not_found
-                    loaded.pathsVersion = dep.pathsVersion
-                    loaded.pathsScope = dep.pathsScope
-                    loaded.pathsOptional = dep.pathsOptional
-                    loaded.pathsExclusions = dep.pathsExclusions
-                    fixed = True
-                # trace change
-                if trace and TRACER and fixed: TRACER.trace("dep |   loaded updated", loaded.key_gat(), 'version', loaded.version, 'scope', loaded.scope, 'optional', loaded.optional, 'paths', dump_paths(loaded.paths))
-            else:
-                pom.computed_dependencies[dep.key_excl()] = dep.copy()
+            fixed = False
+            # always keep the highest scope as it is used later to skip dependencies
+            if PRIORITY_SCOPES.index(dep.scope) < PRIORITY_SCOPES.index(loaded.scope):
+                loaded.scope = dep.scope
+                fixed = True
+            # overwrite all other properties, just updating loadedDeps as it is a copy
+            if paths.length < loaded.paths.length:
+                loaded.version = dep.version
+                loaded.type = dep.type
+                loaded.classifier = dep.classifier
+                loaded.optional = dep.optional
+                loaded.paths = dep.paths
+                loaded.exclusions = dep.exclusions
+                loaded.relativePath = dep.relativePath
+                loaded.not_found = dep.not_found
+                loaded.pathsVersion = dep.pathsVersion
+                loaded.pathsScope = dep.pathsScope
+                loaded.pathsOptional = dep.pathsOptional
+                loaded.pathsExclusions = dep.pathsExclusions
+                fixed = True
+            # trace change
+            if trace and ctx.tracer and fixed: ctx.tracer.trace("dep |   loaded updated", loaded.key_gat(), 'version', loaded.version, 'scope', loaded.scope, 'optional', loaded.optional, 'paths', dump_paths(loaded.paths))
+        else:
+            pom.computed_dependencies[dep.key_excl()] = dep.copy()
 
-        # add to computed dependencies
-        if trace and TRACER: TRACER.trace("dep |   added", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional, 'paths', dump_paths(paths))
-        pom.added_dependencies.append(dep)
+    # add to computed dependencies
+    if trace and ctx.tracer: ctx.tracer.trace("dep |   added", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional, 'paths', dump_paths(paths))
+    pom.added_dependencies.append(dep)
+    if ctx.listener: ctx.listener(DependencyAdded(dep, pom))
 
-        # skip?
-        if skip: continue
+    # index requested versions, to report conflicts without walking added dependencies
+    requests = pom.computed_conflicts.setdefault(dep.key_excl(), {})
+    request = requests.get(f"{dep.version}:{dep.scope}")
+    if request is None:
+        requests[f"{dep.version}:{dep.scope}"] = PomRequest(dep.version, dep.scope, dep.paths)
+    else:
+        request.count += 1
 
-        # skip on non-supported types
-        if dep.type in SKIP_TYPES2: continue
+    # skip?
+    if skip: return False
 
-        # add to dependencies
-        deps.append(dep)
+    # skip on non-supported types
+    if dep.type in SKIP_TYPES2: return False
 
-    solvers = []
-    for dep in deps:
-        # prepare dependency for recursion
-        trace = TRACER and TRACER.trace_dep(dep.key_trace()) and TRACER.trace("dep | recurse", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'type', dep.type, 'paths', dump_paths(paths))
-        dep_pom = load_pom_from_dependency(dep, pom.file, allow_missing = True)
+    return True
+
+
+class SolverSubtree:
+    """
+    Represents the expansion of a dependency pom: its managements and the dependencies it adds.
+
+    It only depends on the pom, its type, scope and exclusions, and on the initial managements it looked up,
+    so it can be replayed when the same pom is reached again with the same inputs.
+    """
+    pom: PomProject
+    paths: PomPaths
+    child_paths: PomPaths
+    managements: PomMgts
+    inits: list[tuple[str, PomDependency | None]]
+    parent: PomDependency | None
+    dependencies: PomDeps
+
+    def __repr__(self) -> str:
+        return f"SolverSubtree({self.pom.gav()})[{len(self.dependencies)}]"
+
+
+def subtree_key(pom: PomProject, paths: PomPaths) -> tuple:
+    transitive_only = paths.length + (0 if pom.computed_type == 'parent' else 1) > 1
+    return (pom.file, pom.computed_type, pom.computed_scope, pom.computed_exclusions, transitive_only)
+
+
+def new_subtree(ctx: ResolverContext, pom: PomProject, paths: PomPaths) -> SolverSubtree | None:
+    """
+    Create the record of a pom expansion, or None if it can't be replayed.
+    """
+    if ctx.tracer is not None or ctx.listener is not None or paths.length == 0:
+        return None
+    subtree = SolverSubtree()
+    subtree.pom = pom
+    subtree.paths = paths
+    subtree.managements = pom.computed_managements
+    subtree.inits = [ (key, pom.initial_managements.get(key)) for key in pom.computed_managements ]
+    subtree.parent = None
+    subtree.dependencies = []
+    pom.computed_subtrees.setdefault(subtree_key(pom, paths), []).append(subtree)
+    return subtree
+
+
+def find_subtree(ctx: ResolverContext, pom: PomProject, paths: PomPaths) -> SolverSubtree | None:
+    """
+    Find an expansion of the same pom with the same inputs, initial managements being compared by identity.
+    """
+    for subtree in pom.computed_subtrees.get(subtree_key(pom, paths), []):
+        if all(pom.initial_managements.get(key) is mgt for key, mgt in subtree.inits):
+            ctx.count('subtree hits')
+            return subtree
+    ctx.count('subtree misses')
+    return None
+
+
+def replay_subtree(ctx: ResolverContext, pom: PomProject, paths: PomPaths, subtree: SolverSubtree) -> 'list[SolverEntry]':
+    """
+    Add the dependencies of an identical subtree, with paths rebased from the subtree pom onto this pom.
+    """
+    rebase = new_rebase(subtree.paths, subtree.pom, paths, pom)
+    pom.computed_managements = { key: rebase_dependency(mgt, rebase) for key, mgt in subtree.managements.items() }
+    child_paths = rebase(subtree.child_paths)
+    dep_inits = new_initial_managements(ctx, pom.initial_managements, pom.computed_managements)
+    deps = [ rebase_dependency(subtree.parent, rebase) ] if subtree.parent is not None else []
+    for dep in subtree.dependencies:
+        dep = rebase_dependency(dep, rebase)
+        if claim_dependency(ctx, pom, dep, child_paths, False):
+            deps.append(dep)
+    return [ SolverEntry(ctx, pom, dep, child_paths, dep_inits) for dep in deps ]
+
+
+def new_rebase(old_paths: PomPaths, old_pom: PomProject, paths: PomPaths, pom: PomProject):
+    """
+    Return a function rebasing the paths going through old_pom, so that they go through pom.
+    Other paths, coming from initial managements, are kept as is.
+    """
+    index = len(old_paths.paths)
+    rebased: dict[int, PomPaths] = {}
+    def rebase(old: PomPaths) -> PomPaths:
+        if len(old.paths) <= index or old.paths[index] is not old_pom:
+            return old
+        new = rebased.get(id(old))
+        if new is None:
+            new = PomPaths()
+            new.paths = paths.paths + [ pom ] + old.paths[index + 1:]
+            new.length = paths.length + old.length - old_paths.length
+            rebased[id(old)] = new
+        return new
+    return rebase
+
+
+def rebase_dependency(dep: PomDependency, rebase) -> PomDependency:
+    dep = dep.copy()
+    dep.paths = rebase(dep.paths)
+    dep.pathsVersion = rebase(dep.pathsVersion)
+    dep.pathsScope = rebase(dep.pathsScope)
+    dep.pathsOptional = rebase(dep.pathsOptional)
+    dep.pathsExclusions = rebase(dep.pathsExclusions)
+    return dep
+
+
+class SolverEntry:
+    """
+    Represents the resolution of a dependency pom, queued in the scheduler.
+
+    Parents can't be dropped, other dependencies are dropped when a shorter path with the same or a higher scope was queued.
+    """
+    key: str | None
+    length: int
+    rank: int
+
+    def __init__(self, ctx: ResolverContext, pom: PomProject, dep: PomDependency, paths: PomPaths, dep_inits: PomLayeredMgts):
+        self.ctx = ctx
+        self.pom = pom
+        self.dep = dep
+        self.paths = paths
+        self.dep_inits = dep_inits
+        self.key = None if dep.type == 'parent' else dep.key_excl()
+        self.length = paths.length
+        self.rank = PRIORITY_SCOPES.index(dep.scope)
+        self.file = None
+        self.future = None
+        # a pom whose dependencies are all excluded adds nothing, so it is never read
+        self.dep_excls = new_exclusions(ctx, pom.computed_exclusions, dep)
+        self.pruned = '*:*' in self.dep_excls
+
+    def prefetch(self, scheduler: Scheduler):
+        """
+        Read the pom in a thread, so that it is already read when the entry is run.
+        """
+        if self.pruned: return
+        file = self.ctx.abspath(find_pom_location(self.ctx, self.dep, self.pom.file))
+        if file in self.ctx.cache_poms: return
+        self.file = file
+        self.future = scheduler.fetch(file, read_pom_file, self.ctx, file)
+
+    def run(self) -> 'list[SolverEntry]':
+        ctx, pom, dep, paths = self.ctx, self.pom, self.dep, self.paths
+        if self.pruned:
+            ctx.count('subtrees pruned')
+            return []
+        # the prefetched pom is only used if the location is still the same, errors being raised by the load
+        file = ctx.abspath(find_pom_location(ctx, dep, pom.file))
+        dep_pom = load_pom_from_file(ctx, file, allow_missing = True, prefetched = self.future if file == self.file else None)
+        if dep_pom: ctx.cache_deps[dep_pom.gav()] = file
         if dep_pom is None:
-            if TRACER and TRACER.trace_poms(): TRACER.trace("dep |   missing", dep.fullname2(), 'version', dep.version, 'scope', dep.scope, 'type', dep.type, 'paths', dump_paths(paths))
+            if ctx.tracer and ctx.tracer.trace_poms(): ctx.tracer.trace("dep |   missing", dep.fullname2(), 'version', dep.version, 'scope', dep.scope, 'type', dep.type, 'paths', dump_paths(paths))
             dep.not_found = True
-            continue
+            return []
 
         # build new mgts, excls and scopes to initialize recursion
         dep_pom.added_dependencies = pom.added_dependencies
         dep_pom.computed_dependencies = pom.computed_dependencies
+        dep_pom.computed_conflicts = pom.computed_conflicts
+        dep_pom.computed_subtrees = pom.computed_subtrees
         dep_pom.computed_type = dep.type
-        dep_excls = pom.computed_exclusions | { excl.key():excl for excl in dep.exclusions }
         dep_scope = dep.scope
 
         # recursion
-        solver = new_solver(pom, dep, paths, dep_pom, dep_inits, dep_excls, dep_scope)
-        solvers.append(solver)
-
-    # return
-    return solvers
+        return resolve_pom(ctx, dep_pom, paths = paths, initialMgts = self.dep_inits, excls = self.dep_excls, scope = dep_scope, load_mgts = True, load_deps = True)
 
+    def __repr__(self) -> str:
+        return f"SolverEntry({self.dep.fullname()})[{self.length}]"
 
-def new_solver(pom: PomProject, dep: PomDependency, paths: PomPaths, dep_pom: PomProject, dep_inits: PomMgts, dep_excls: dict[str, PomExclusion], dep_scope: str):
-    def fn():
-        solvers = resolve_pom(dep_pom, paths = paths, initialMgts = dep_inits, excls = dep_excls, scope = dep_scope, load_mgts = True, load_deps = True)
-        return solvers
-    return fn
 
-
-def new_initial_managements(initials: PomMgts, computed: PomMgts) -> PomMgts:
+def new_initial_managements(ctx: ResolverContext, initials: PomLayeredMgts, computed: PomMgts) -> PomLayeredMgts:
     """
     Create a new initial dependencyManagement from an initial and computed one.
     It is not needed to copy computed mgt as it is not modified later because it becomes an initial dependencyMangement.
+
+    Initial values are forced onto computed ones, and the result is a layer above the initial one, which is shared.
     """
-    new = computed.copy()
-    for ini in initials.values():
-        if ini.key_gat() in computed:
-            mgt = computed[ini.key_gat()].copy()
-            trace = TRACER and TRACER.trace_dep(mgt.key_trace())
-            if trace and TRACER:
-                TRACER.trace("ini | merging", ini.key_gat(), 'version', ini.version, 'scope', ini.scope, 'optional', ini.optional)
-                TRACER.trace("ini |   applying forced from", ini.key_gat(), 'version', ini.version, 'scope', ini.scope, 'optional', ini.optional, 'paths', dump_paths(ini.paths))
-            apply_forced_management(ini, mgt)
-            if trace and TRACER:
-                TRACER.trace("ini |   merged", mgt.key_gat(), 'version', mgt.version, 'scope', mgt.scope, 'optional', mgt.optional, 'paths', dump_paths(mgt.paths))
-            new[ini.key_gat()] = mgt
-        else:
-            new[ini.key_gat()] = ini
-    return new
+    own = computed
+    for key, mgt in computed.items():
+        ini = initials.get(key)
+        if ini is None:
+            continue
+        if own is computed:
+            own = computed.copy()
+        mgt = mgt.copy()
+        trace = ctx.tracer and ctx.tracer.trace_dep(mgt.key_trace())
+        if trace and ctx.tracer:
+            ctx.tracer.trace("ini | merging", ini.key_gat(), 'version', ini.version, 'scope', ini.scope, 'optional', ini.optional)
+            ctx.tracer.trace("ini |   applying forced from", ini.key_gat(), 'version', ini.version, 'scope', ini.scope, 'optional', ini.optional, 'paths', dump_paths(ini.paths))
+        apply_forced_management(ini, mgt)
+        if trace and ctx.tracer:
+            ctx.tracer.trace("ini |   merged", mgt.key_gat(), 'version', mgt.version, 'scope', mgt.scope, 'optional', mgt.optional, 'paths', dump_paths(mgt.paths))
+        own[key] = mgt
+    if len(own) == 0:
+        return initials
+    return PomLayeredMgts(own, initials)
+
+
+def new_exclusions(ctx: ResolverContext, excls: PomExclusions, dep: PomDependency) -> PomExclusions:
+    """
+    Add the exclusions of a dependency to the inherited ones.
+    Exclusions are interned in the context, so equal exclusions are the same object and unchanged ones are shared.
+    """
+    if len(dep.exclusions) == 0:
+        return excls
+    new = excls.union(excl.key() for excl in dep.exclusions)
+    if len(new) == len(excls):
+        return excls
+    return ctx.cache_exclusions.setdefault(new, new)
+
+
+def is_excluded(excls: PomExclusions, dep: PomDependency) -> bool:
+    """
+    Return whether a dependency matches an exclusion, groupId and artifactId being either exact or the '*' wildcard.
+    Exclusions are keyed by groupId:artifactId, so matching costs at most four set lookups.
+    """
+    if len(excls) == 0:
+        return False
+    if dep.key_excl() in excls or '*:*' in excls:
+        return True
+    return f"{dep.groupId}:*" in excls or f"*:{dep.artifactId}" in excls
+
 
-def apply_default_to_dependency(pom: PomProject, dep: PomDependency, paths: PomPaths):
+def apply_default_to_dependency(ctx: ResolverContext, pom: PomProject, dep: PomDependency, paths: PomPaths):
     """
     Update dependency with default values from dependencyManagement.
     """
@@ -503,21 +800,23 @@ def apply_default_to_dependency(pom: PomProject, dep: PomDependency, paths: PomP
     # apply computed_management which contains default values
     if dep.key_gat() in pom.computed_managements:
         mgt = pom.computed_managements[dep.key_gat()]
-        if TRACER and TRACER.trace_dep(mgt.key_trace()): TRACER.trace("dep |     applying default from", mgt.key_gat(), 'version', mgt.version, 'scope', mgt.scope, 'optional', mgt.optional, 'paths', dump_paths(mgt.paths))
+        if ctx.tracer and ctx.tracer.trace_dep(mgt.key_trace()): ctx.tracer.trace("dep |     applying default from", mgt.key_gat(), 'version', mgt.version, 'scope', mgt.scope, 'optional', mgt.optional, 'paths', dump_paths(mgt.paths))
         apply_default_management(mgt, dep)
-        if TRACER and TRACER.trace_dep(mgt.key_trace()): TRACER.trace("dep |     applied default", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional, 'paths', dump_paths(dep.paths))
+        if ctx.tracer and ctx.tracer.trace_dep(mgt.key_trace()): ctx.tracer.trace("dep |     applied default", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional, 'paths', dump_paths(dep.paths))
 
 
-def apply_initial_to_dependency(pom: PomProject, dep: PomDependency, paths: PomPaths):
+def apply_initial_to_dependency(ctx: ResolverContext, pom: PomProject, dep: PomDependency, paths: PomPaths):
     """
     Update dependency with initial values from dependencyManagement.
     """
     # apply initial_managements which contains imposed values
     if dep.key_gat() in pom.initial_managements:
         mgt = pom.initial_managements[dep.key_gat()]
-        if TRACER and TRACER.trace_dep(mgt.key_trace()): TRACER.trace("dep |     applying initial from", mgt.key_gat(), 'version', mgt.version, 'scope', mgt.scope, 'optional', mgt.optional, 'paths', dump_paths(mgt.paths))
+        if ctx.tracer and ctx.tracer.trace_dep(mgt.key_trace()): ctx.tracer.trace("dep |     applying initial from", mgt.key_gat(), 'version', mgt.version, 'scope', mgt.scope, 'optional', mgt.optional, 'paths', dump_paths(mgt.paths))
+        version = dep.version
         apply_forced_management(mgt, dep)
-        if TRACER and TRACER.trace_dep(mgt.key_trace()): TRACER.trace("dep |     applied initial", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional, 'paths', dump_paths(dep.paths))
+        if ctx.listener and dep.version != version: ctx.listener(VersionManaged(dep, mgt, version))
+        if ctx.tracer and ctx.tracer.trace_dep(mgt.key_trace()): ctx.tracer.trace("dep |     applied initial", dep.key_gat(), 'version', dep.version, 'scope', dep.scope, 'optional', dep.optional, 'paths', dump_paths(dep.paths))
 
 
 def merge_management(old: PomDependency, new: PomDependency) -> PomDependency:
@@ -577,10 +876,135 @@ def dump_paths(paths: PomPaths):
 
 
 if __name__ == "__main__":
-    pom1 = load_pom_from_file('tests/pom1.xml')
+    ctx = ResolverContext()
+    pom1 = load_pom_from_file(ctx, 'tests/pom1.xml')
     assert pom1
-    resolve_pom(pom1)
+    resolve_pom(ctx, pom1)
     for dep1 in pom1.computed_managements.values():
         print(dep1.fullname())
+    # activate profiles from jdk, once per jdk
+    for jdk, version in [ ('21.0.2', '1.4'), ('1.8', '1.5'), ('21.0.2', '1.4') ]:
+        ctx.jdk = jdk
+        pom14 = load_pom_from_file(ctx, 'tests/pom14.xml')
+        assert pom14
+        resolve_pom(ctx, pom14)
+        assert pom14.dependencies[0].version == version
+    assert len(ctx.cache_profiles) == 2
+    # activations comparing properties are cached with their resolved values
+    hits = ctx.stats.get('profiles hits', 0)
+    for base_mode, expected_mode, active in [ ('fast', 'fast', True), ('fast', 'fast', True), ('slow', 'fast', False), ('slow', 'slow', True), ('slow', 'slow', True) ]:
+        pom21 = load_pom_from_file(ctx, 'tests/pom21.xml')
+        assert pom21
+        initialProps = PomProperties()
+        initialProps.set('base.mode', base_mode)
+        initialProps.set('expected.mode', expected_mode)
+        resolve_pom(ctx, pom21, initialProps = initialProps)
+        assert (len(pom21.dependencies) == 1) == active, (base_mode, expected_mode)
+    assert ctx.stats['profiles hits'] == hits + 2
+    # exclusions are shared when unchanged and interned otherwise
+    dep1 = PomDependency()
+    dep1.exclusions = []
+    excls1 = frozenset([ 'a:b' ])
+    assert new_exclusions(ctx, excls1, dep1) is excls1
+    excl1 = PomExclusion()
+    excl1.groupId, excl1.artifactId = 'a', 'c'
+    dep1.exclusions = [ excl1 ]
+    assert new_exclusions(ctx, excls1, dep1) is new_exclusions(ctx, frozenset([ 'a:b' ]), dep1) == { 'a:b', 'a:c' }
+    # wildcard exclusions match any groupId or artifactId
+    dep1.groupId, dep1.artifactId = 'a', 'd'
+    assert not is_excluded(excls1, dep1) and not is_excluded(frozenset(), dep1)
+    assert all(is_excluded(frozenset([ excl ]), dep1) for excl in [ 'a:d', 'a:*', '*:d', '*:*' ])
+    assert not is_excluded(frozenset([ 'b:*', '*:b' ]), dep1)
+    # a dependency excluding everything is added without reading its pom
+    ctx = ResolverContext()
+    pom18 = load_pom_from_file(ctx, 'tests/pom18.xml')
+    assert pom18
+    resolve_pom(ctx, pom18, load_mgts = True, load_deps = True)
+    assert 'commons-pool:commons-pool' in pom18.computed_dependencies and ctx.stats['subtrees pruned'] == 1
+    assert not any('commons-pool' in file for file in ctx.cache_poms)
+    assert all(p.artifactId != 'commons-pool' for dep in pom18.added_dependencies for p in dep.paths.paths)
+    # modules with the same parent replay its expansion, with the same result as without replay
+    from pom_loader import register_pom_locations
+    from pom_tracer import Tracer
+    def resolve_deps(ctx):
+        for file in [ 'tests/pom15-a.xml', 'tests/pom15-b.xml' ]:
+            register_pom_locations(ctx, file)
+        pom = load_pom_from_file(ctx, 'tests/pom15.xml')
+        assert pom
+        resolve_pom(ctx, pom, load_mgts = True, load_deps = True)
+        return [ (dep.fullname(), dep.scope, dump_paths(dep.paths), dump_paths(dep.pathsVersion)) for dep in pom.added_dependencies ]
+    ctx = ResolverContext()
+    assert resolve_deps(ctx) == resolve_deps(ResolverContext(tracer = Tracer())) # tracing disables replay
+    assert ctx.stats['subtree hits'] == 1
+    # events are streamed as the solver goes, with the same result as resolve_pom
+    ctx = ResolverContext()
+    ctx.jdk = '1.8'
+    pom14 = load_pom_from_file(ctx, 'tests/pom14.xml')
+    assert pom14
+    events = list(iter_resolve_pom(ctx, pom14))
+    added = [ event.dep.fullname() for event in events if isinstance(event, DependencyAdded) ]
+    assert added == [ dep.fullname() for dep in pom14.added_dependencies ] and len(added) == 13
+    assert isinstance(events[0], PomLoaded) and events[0].pom is pom14 and isinstance(events[-1], LevelCompleted)
+    levels = [ event.length for event in events if isinstance(event, LevelCompleted) ]
+    assert levels == sorted(levels) and len(levels) == len(set(levels)) > 1
+    # leaving the stream stops the resolution early
+    pom14 = load_pom_from_file(ctx, 'tests/pom14.xml')
+    assert pom14
+    for event in iter_resolve_pom(ctx, pom14):
+        if isinstance(event, DependencyAdded) and event.dep.key_excl() == 'fake.lib:lib2':
+            break
+    assert len(pom14.added_dependencies) < len(added) and ctx.listener is None
+    # resolve two roots concurrently, each one with its own context
+    from concurrent.futures import ThreadPoolExecutor
+    def resolve_mgts(file):
+        ctx = ResolverContext()
+        pom = load_pom_from_file(ctx, file)
+        assert pom
+        resolve_pom(ctx, pom, load_mgts = True)
+        return pom.computed_managements['commons-io:commons-io:jar'].version
+    with ThreadPoolExecutor(2) as executor:
+        assert list(executor.map(resolve_mgts, ['tests/pom2.xml', 'tests/pom4.xml'])) == ['2.6', '2.7']
+    # the dependencies of a version losing to a nearer one are not added, even when the nearer one is claimed later
+    ctx = ResolverContext()
+    for file in [ 'tests/pom20-lib-a.xml', 'tests/pom20-lib-c-1.0.xml', 'tests/pom20-lib-c-2.0.xml' ]:
+        register_pom_locations(ctx, file)
+    pom20 = load_pom_from_file(ctx, 'tests/pom20.xml')
+    assert pom20
+    resolve_pom(ctx, pom20, load_mgts = True, load_deps = True)
+    assert [ dep.fullname() for dep in pom20.computed_dependencies.values() ] == [ 'mygroup:mylib-a:1.0', 'mygroup:mylib-c:1.0' ]
+    assert ctx.stats['entries dropped'] == 1
+    # parent and import cycles are detected
+    from pom_budget import Budget, BudgetExceeded, CycleDetected
+    ctx = ResolverContext()
+    for file, bom_files in [ ('tests/pom16.xml', []), ('tests/pom17.xml', [ 'tests/pom17-bom-a.xml', 'tests/pom17-bom-b.xml' ]) ]:
+        for bom_file in bom_files:
+            register_pom_locations(ctx, bom_file)
+        pom = load_pom_from_file(ctx, file)
+        assert pom
+        try:
+            resolve_pom(ctx, pom, load_mgts = True, load_deps = True)
+            assert False, f"no cycle detected in {file}"
+        except CycleDetected as e:
+            assert ('parent cycle' if file == 'tests/pom16.xml' else 'import cycle') in e.reason
+    # the budget stops the resolution, keeping the dependencies added so far
+    ctx = ResolverContext()
+    ctx.jdk = '1.8'
+    ctx.budget = Budget(max_poms = 3)
+    pom14 = load_pom_from_file(ctx, 'tests/pom14.xml')
+    assert pom14
+    try:
+        resolve_pom(ctx, pom14, load_mgts = True, load_deps = True)
+        assert False, "budget not exceeded"
+    except BudgetExceeded as e:
+        assert e.reason == 'more than 3 poms resolved' and e.where.startswith('mygroup:myartifact')
+    assert 0 < len(pom14.added_dependencies) < 13 and ctx.budget.top()
+    # requested versions are indexed while resolving, one request per version and scope
+    ctx = ResolverContext()
+    ctx.jdk = '1.8'
+    pom14 = load_pom_from_file(ctx, 'tests/pom14.xml')
+    assert pom14
+    resolve_pom(ctx, pom14, load_mgts = True, load_deps = True)
+    assert list(pom14.computed_conflicts['commons-pool:commons-pool']) == [ '1.5:compile', '1.6:compile' ]
+    assert sum(request.count for requests in pom14.computed_conflicts.values() for request in requests.values()) == len(pom14.added_dependencies)
     # passed
     print("PASSED")
@@ -0,0 +1,150 @@
+import mmap, os, pickle, struct
+from pom_context import file_mtime, replace_file
+from pom_struct import PomModel
+
+# Store file layout: magic, pickled models, pickled index, index offset
+MAGIC = b'POMSTORE2\n'
+FOOTER = struct.Struct('<Q')
+
+
+class PomStore:
+    """
+    Represents a file of parsed poms, shared by processes resolving the same poms.
+
+    The file is mapped read-only and a pom is only unpickled when it is loaded, so a process
+    only pays for the poms it uses. Poms read from xml meanwhile are kept pickled until saved.
+    A corrupt file is handled as an empty store, its poms being read from xml again.
+
+    Saving merges the poms of the current file, so processes sharing a store keep each other's poms.
+    A store saved by another process between this merge and the replace is still overwritten,
+    its poms are then only parsed again.
+    """
+    file: str
+    index: dict[str, tuple[int, int, float]]   # pom file -> offset, length, mtime
+    added: dict[str, tuple[bytes, float]]      # pom file -> pickled pom, mtime
+
+    def __init__(self, file: str):
+        self.file = file
+        self.index = {}
+        self.added = {}
+        self.mm = None
+        try:
+            with open(file, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return
+        try:
+            if mm[:len(MAGIC)] != MAGIC or len(mm) < len(MAGIC) + FOOTER.size:
+                raise ValueError(f"Invalid store file: {file}")
+            offset, = FOOTER.unpack_from(mm, len(mm) - FOOTER.size)
+            index = pickle.loads(mm[offset:len(mm) - FOOTER.size])
+            if not isinstance(index, dict):
+                raise ValueError(f"Invalid store index: {file}")
+        except (pickle.UnpicklingError, EOFError, ValueError, struct.error):
+            mm.close()
+            return
+        self.index = index
+        self.mm = mm
+
+    def get(self, file: str) -> PomModel | None:
+        """
+        Return the parsed pom of a file, or None if it is missing or the file was modified since stored.
+        """
+        entry = self.index.get(file)
+        if entry is None or self.mm is None:
+            return None
+        offset, length, mtime = entry
+        if file_mtime(file) != mtime:
+            return None
+        try:
+            return pickle.loads(self.mm[offset:offset + length])
+        except (pickle.UnpicklingError, EOFError, ValueError):
+            return None
+
+    def add(self, file: str, pom: PomModel):
+        """
+        Add a pom just read from xml, before it is replaced by a resolved model in the loader cache.
+        """
+        self.added[file] = (pickle.dumps(pom, pickle.HIGHEST_PROTOCOL), file_mtime(file))
+
+    def save(self):
+        """
+        Write added poms, the poms of the current store file and the stored ones to a new file,
+        replacing the store file once complete.
+        """
+        if not self.added:
+            return
+        current = PomStore(self.file)
+        index = {}
+        with replace_file(self.file, 'wb') as f:
+            f.write(MAGIC)
+            for file, (data, mtime) in self.added.items():
+                index[file] = (f.tell(), len(data), mtime)
+                f.write(data)
+            # the current file was saved after this one was read, so its poms are the most recent
+            for store in [ current, self ]:
+                if store.mm is None: continue
+                for file, (offset, length, mtime) in store.index.items():
+                    if file in index: continue
+                    index[file] = (f.tell(), length, mtime)
+                    f.write(store.mm[offset:offset + length])
+            offset = f.tell()
+            f.write(pickle.dumps(index, pickle.HIGHEST_PROTOCOL))
+            f.write(FOOTER.pack(offset))
+        current.close()
+        self.added = {}
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    def __len__(self) -> int:
+        return len(self.index.keys() | self.added.keys())
+
+    def __repr__(self) -> str:
+        return f"PomStore({self.file}, {len(self.index)} stored, {len(self.added)} added)"
+
+
+if __name__ == "__main__":
+    import shutil, tempfile
+    from pom_context import ResolverContext
+    from pom_loader import load_pom_from_file
+    from pom_solver import resolve_pom
+    with tempfile.TemporaryDirectory() as tmp:
+        file = os.path.join(tmp, 'poms.store')
+        pom_file = shutil.copy('tests/pom14.xml', tmp)
+        # verify that poms read by a first process are stored
+        ctx1 = ResolverContext()
+        ctx1.store = PomStore(file)
+        pom1 = load_pom_from_file(ctx1, pom_file)
+        assert pom1
+        resolve_pom(ctx1, pom1, load_mgts = True, load_deps = True)
+        ctx1.store.save()
+        assert len(PomStore(file)) == len(ctx1.cache_poms) == ctx1.stats['poms parsed']
+        # verify that a second process loads them from the store, with the same result
+        ctx2 = ResolverContext()
+        ctx2.store = PomStore(file)
+        pom2 = load_pom_from_file(ctx2, pom_file)
+        assert pom2
+        resolve_pom(ctx2, pom2, load_mgts = True, load_deps = True)
+        assert 'poms parsed' not in ctx2.stats and ctx2.stats['poms stored'] == len(ctx2.cache_poms)
+        assert [ dep.fullname() for dep in pom2.computed_dependencies.values() ] == [ dep.fullname() for dep in pom1.computed_dependencies.values() ]
+        # verify that modified files are read again
+        os.utime(pom_file, (0, 0))
+        assert PomStore(file).get(pom1.file) is None
+        # verify that processes sharing a store keep each other's poms
+        os.remove(file)
+        store1, store2 = PomStore(file), PomStore(file)
+        store1.add(pom_file, pom1.model)
+        store2.add(ctx1.abspath('tests/pom1.xml'), pom1.model)
+        store1.save()
+        store2.save()
+        assert len(PomStore(file)) == 2
+        # verify that a corrupt store is handled as an empty one
+        for data in [ MAGIC + b'x' * 20, MAGIC + pickle.dumps([]) + FOOTER.pack(len(MAGIC)), b'x' ]:
+            with open(file, 'wb') as f:
+                f.write(data)
+            assert len(PomStore(file)) == 0 and PomStore(file).get(pom_file) is None
+    # passed
+    print("PASSED")
@@ -1,8 +1,12 @@
-from copy import copy, deepcopy
+# Maximal number of layers before flattening a PomLayeredMgts
+MAX_LAYERS = 16
 
-class PomProject:
+
+class PomModel:
     """
-    Represents a Maven project.
+    Represents a Maven project as parsed from its file.
+
+    A model is never modified once cached, so it is shared by all visits without copying it.
     """
     file: str
     groupId: str
@@ -17,35 +21,86 @@ class PomProject:
     dependencies: 'PomDeps'
     modules: list[str]
     profiles: 'PomProfiles'
+
+    def gav(self):
+        return f"{self.groupId}:{self.artifactId}:{self.version}"
+
+    def __repr__(self):
+        return f"PomModel({self.gav()})"
+
+
+class PomProject:
+    """
+    Represents a visit of a Maven project: its model and the state computed by the loader and the solver.
+
+    Coordinates, parent, properties, managements and dependencies start as the ones of the model,
+    and are replaced, never modified, when resolved or merged with profiles during the visit.
+    """
+    model: PomModel
+    groupId: str
+    artifactId: str
+    version: str
+    parent: 'PomParent | None'
+    properties: 'PomProperties'
+    managements: 'PomDeps'
+    dependencies: 'PomDeps'
     # computed
-    computed_properties: 'PomProperties'
-    initial_managements: 'PomMgts'
+    computed_properties: 'PomLayeredProps'
+    initial_managements: 'PomLayeredMgts'
     computed_managements: 'PomMgts'
     added_dependencies: 'PomDeps'
     computed_dependencies: 'PomMgts'
+    computed_subtrees: dict[tuple, list]
+    computed_conflicts: 'PomConflicts'
     computed_scope: str
     computed_exclusions: 'PomExclusions'
     computed_type: str
 
+    def __init__(self, model: PomModel):
+        self.model = model
+        self.groupId = model.groupId
+        self.artifactId = model.artifactId
+        self.version = model.version
+        self.parent = model.parent.copy() if model.parent else None
+        self.properties = model.properties
+        self.managements = model.managements
+        self.dependencies = model.dependencies
+        self.computed_scope = 'all'
+        self.computed_type = 'pom'
+
+    # not modified by a visit
+    file = property(lambda self: self.model.file)
+    name = property(lambda self: self.model.name)
+    packaging = property(lambda self: self.model.packaging)
+    builtins = property(lambda self: self.model.builtins)
+    modules = property(lambda self: self.model.modules)
+    profiles = property(lambda self: self.model.profiles)
+
     def copy(self) -> 'PomProject':
-        pom = PomProject()
-        pom.file = self.file
+        """
+        Return a new visit of the model, keeping the coordinates and properties resolved by this one.
+        """
+        pom = PomProject(self.model)
         pom.groupId = self.groupId
         pom.artifactId = self.artifactId
         pom.version = self.version
-        pom.name = self.name
-        pom.packaging = self.packaging
         pom.parent = self.parent.copy() if self.parent else None
-        pom.properties = deepcopy(self.properties)
-        pom.builtins = self.builtins            # not modified in loader and solver
-        pom.managements = self.managements      # not modified in loader and solver, as load_managements is always copying it
-        pom.dependencies = self.dependencies    # not modified in loader and solver, as load_dependencies is always copying it
-        pom.modules = self.modules              # not modified in loader and solver
-        pom.computed_scope = 'all'
-        pom.computed_type = 'pom'
-        pom.profiles = self.profiles            # not modified in loader and solver
+        pom.properties = self.properties
         return pom
 
+    def to_model(self) -> PomModel:
+        """
+        Return a model with the coordinates, parent and properties resolved by this visit.
+        """
+        model = PomModel()
+        model.__dict__.update(self.model.__dict__)
+        model.groupId = self.groupId
+        model.artifactId = self.artifactId
+        model.version = self.version
+        model.parent = self.parent.copy() if self.parent else None
+        model.properties = self.properties
+        return model
+
     def gav(self):
         return f"{self.groupId}:{self.artifactId}:{self.version}"
 
@@ -126,12 +181,108 @@ class PomProperties(dict[str, PomProperty]):
         self[name] = prop
     
     def copy(self) -> 'PomProperties':
-        return copy(self)
-    
+        return PomProperties(self)
+
     def __repr__(self) -> str:
         return f"PomProperties({len(self)})"
 
 
+class PomLayeredProps:
+    """
+    Represents a properties scope, where set properties hide the layers, and each layer hides the next ones.
+
+    Layers are the properties of the poms, never modified, so they are shared instead of copied.
+    A layer property is only materialized when it is looked up, as it may then be resolved in place.
+    Initial properties are copied for the same reason, as they are shared between resolutions.
+    """
+    own: PomProperties
+    levels: dict[str, int]              # name -> number of layers when first set, to keep maven order
+    materialized: PomProperties
+    layers: list[tuple[PomProperties, 'PomPaths']]
+
+    def __init__(self, own: PomProperties | None = None):
+        self.own = PomProperties()
+        for prop in (own or {}).values():
+            self.own.set(prop.name, prop.value, prop.paths)
+        self.levels = dict.fromkeys(self.own, 0)
+        self.materialized = PomProperties()
+        self.layers = []
+
+    def add_layer(self, props: PomProperties, paths: 'PomPaths'):
+        """
+        Add properties hidden by all existing ones, as addIfMissing would do for each property.
+        """
+        if len(props) > 0:
+            self.layers.append((props, paths))
+
+    def set(self, name: str, value: str, paths: 'PomPaths | None' = None):
+        """
+        Set a property value even if it already exists.
+        """
+        self.levels.setdefault(name, len(self.layers))
+        self.own.set(name, value, paths)
+
+    def addIfMissing(self, name: str, value: str, paths: 'PomPaths | None' = None):
+        """
+        Set a property value only if it does not already exists.
+        """
+        if name in self:
+            return
+        self.set(name, value, paths)
+
+    def get(self, name: str, default: PomProperty | None = None) -> PomProperty | None:
+        prop = self.own.get(name) or self.materialized.get(name)
+        if prop is not None:
+            return prop
+        for props, paths in self.layers:
+            prop = props.get(name)
+            if prop is not None:
+                self.materialized.set(name, prop.value, paths)
+                return self.materialized[name]
+        return default
+
+    def names(self) -> list[str]:
+        """
+        Return the names of all properties, in the order they would have been added to a single PomProperties.
+        """
+        names = { name: None for name, level in self.levels.items() if level == 0 }
+        for props, _ in self.layers:
+            names.update(dict.fromkeys(props))
+        names.update(dict.fromkeys(self.levels))
+        return list(names)
+
+    def values(self) -> list[PomProperty]:
+        return [ prop for prop in map(self.get, self.names()) if prop is not None ]
+
+    def unresolved(self) -> list[PomProperty]:
+        """
+        Return the properties whose value contains a placeholder, materializing only them.
+        """
+        unresolved = []
+        for name in self.names():
+            prop = self.own.get(name) or self.materialized.get(name)
+            if prop is None:
+                prop = next(props[name] for props, _ in self.layers if name in props)
+            if '$' in prop.value:
+                unresolved.append(self.get(name))
+        return unresolved
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.own or name in self.materialized or any(name in props for props, _ in self.layers)
+
+    def __getitem__(self, name: str) -> PomProperty:
+        prop = self.get(name)
+        if prop is None:
+            raise KeyError(name)
+        return prop
+
+    def __len__(self) -> int:
+        return len(self.names())
+
+    def __repr__(self) -> str:
+        return f"PomLayeredProps({len(self.own)}, layers={len(self.layers)})"
+
+
 class PomExclusion:
     """
     Represents a Maven dependency exclusion.
@@ -188,12 +339,33 @@ class PomDependency:
         return f"{self.groupId}:{self.artifactId}"
     
     def copy(self) -> 'PomDependency':
-        return copy(self)
+        dep = PomDependency.__new__(PomDependency)
+        dep.__dict__.update(self.__dict__)
+        return dep
     
     def __repr__(self) -> str:
         return f"PomDependency({self.groupId}:{self.artifactId}:{self.type}:{self.version})[{self.paths.length}]"
 
 
+class PomRequest:
+    """
+    Represents the requests of a dependency with the same version and scope, keeping the first path as the nearest one.
+    """
+    version: str
+    scope: str
+    paths: 'PomPaths'
+    count: int
+
+    def __init__(self, version: str, scope: str, paths: 'PomPaths'):
+        self.version = version
+        self.scope = scope
+        self.paths = paths
+        self.count = 1
+
+    def __repr__(self) -> str:
+        return f"PomRequest({self.version}:{self.scope})[{self.count}]"
+
+
 class PomPaths:
     """
     Represents a Maven dependency path.
@@ -212,6 +384,64 @@ class PomPaths:
         return paths
 
 
+class PomLayeredMgts:
+    """
+    Represents a layered dependencyManagement, where own managements hide the ones of the parent layer.
+
+    Layers are never modified once created, so a child shares its parent layer instead of copying it.
+    """
+    own: 'PomMgts'
+    parent: 'PomLayeredMgts | None'
+    depth: int
+
+    def __init__(self, own: 'PomMgts | None' = None, parent: 'PomLayeredMgts | None' = None):
+        self.own = own if own is not None else {}
+        # flatten deep layers to keep lookups bounded
+        if parent is not None and parent.depth >= MAX_LAYERS:
+            self.own = dict(parent.items()) | self.own
+            parent = None
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+
+    def get(self, key: str, default: 'PomDependency | None' = None) -> 'PomDependency | None':
+        layer = self
+        while layer is not None:
+            mgt = layer.own.get(key)
+            if mgt is not None:
+                return mgt
+            layer = layer.parent
+        return default
+
+    def items(self):
+        layers = []
+        layer = self
+        while layer is not None:
+            layers.append(layer.own)
+            layer = layer.parent
+        merged = {}
+        for own in reversed(layers):
+            merged.update(own)
+        return merged.items()
+
+    def values(self):
+        return [ mgt for _, mgt in self.items() ]
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __getitem__(self, key: str) -> 'PomDependency':
+        mgt = self.get(key)
+        if mgt is None:
+            raise KeyError(key)
+        return mgt
+
+    def __len__(self) -> int:
+        return len(self.items())
+
+    def __repr__(self) -> str:
+        return f"PomLayeredMgts({len(self.own)}, depth={self.depth})"
+
+
 class PomProfile:
     """
     Represents a Maven profile.
@@ -236,22 +466,124 @@ class PomProfile:
 PomInfos = PomProject | PomParent | PomDependency
 PomMgts = dict[str, PomDependency]
 PomDeps = list[PomDependency]
-PomExclusions = dict[str, PomExclusion]
+PomExclusions = frozenset[str]
 PomProfiles = list[PomProfile]
+PomConflicts = dict[str, dict[str, PomRequest]]  # groupId:artifactId -> version:scope -> requests
+
+
+def compute_tree(pom: PomProject) -> dict[str, tuple[PomDependency, list[PomDependency]]]:
+    """
+    Compute the dependency tree of a pom: groupId:artifactId -> (dependency, children).
+    The root node is the pom itself.
+    """
+    dep_elems: list[PomDependency] = list(pom.computed_dependencies.values())
+    dep_pom = PomDependency()
+    dep_pom.groupId = pom.groupId
+    dep_pom.artifactId = pom.artifactId
+    dep_pom.version = pom.version
+    dep_root = (dep_pom, [])
+    dep_nodes = { pom.key_excl(): dep_root }
+    dep_parents = {}
+    for dep in sorted(dep_elems, key=lambda d: (d.groupId, d.artifactId)):
+        parent = [ p for p in dep.paths.paths if p.computed_type != 'parent' ][-1]
+        if dep.key_excl() not in dep_parents:
+            dep_parents[dep.key_excl()] = [ parent.key_excl() ]
+        else:
+            dep_parents[dep.key_excl()].append(parent.key_excl())
+
+    # create graph
+    for dep in dep_elems:
+        parents = dep_parents[dep.key_excl()]
+        found = False
+        for parent in parents:
+            if parent in dep_nodes:
+                dep_nodes[parent][1].append(dep)
+                dep_nodes[dep.key_excl()] = (dep, [])
+                found = True
+                break
+        if not found:
+            dep_elems.append(dep)
+
+    # # remove 'parent' types
+    # def remove_parents(node, parent):
+    #     dep = node[0]
+    #     childs = node[1]
+    #     if parent is not None and dep.type == 'parent':
+    #         parent[1].extend(childs)
+    #         childs = []
+    #         del dep_nodes[dep.key_excl()]
+    #     else:
+    #         parent = node
+    #     for child in childs:
+    #         node = dep_nodes[child.key_excl()]
+    #         remove_parents(node, parent)
+    # remove_parents(dep_root, None)
+
+    return dep_nodes
+
 
 if __name__ == "__main__":
-    # verify that the object is deep cloned
-    project1 = PomProject()
-    project1.groupId = "com.example1"
-    project1.parent = PomParent()
-    project1.parent.groupId = "com.example1.parent"
+    # verify that layers hide their parent without modifying it
+    mgt1 = PomDependency()
+    mgt2 = PomDependency()
+    layer1 = PomLayeredMgts({ 'a:b:jar': mgt1, 'a:c:jar': mgt1 })
+    layer2 = PomLayeredMgts({ 'a:b:jar': mgt2 }, layer1)
+    assert layer2['a:b:jar'] is mgt2 and layer2['a:c:jar'] is mgt1 and 'a:d:jar' not in layer2
+    assert layer1['a:b:jar'] is mgt1 and len(layer2) == 2
+    # verify that deep layers are flattened
+    layer = layer2
+    for i in range(MAX_LAYERS * 2):
+        layer = PomLayeredMgts({ f"a:{i}:jar": mgt1 }, layer)
+    assert layer.depth <= MAX_LAYERS and layer['a:b:jar'] is mgt2 and len(layer) == 2 + MAX_LAYERS * 2
+    # verify that layered properties keep the order and priority of a single PomProperties
+    paths1 = PomPaths()
+    paths2 = PomPaths()
+    paths2.length = 1
+    props1 = PomProperties()
+    props1.set('a', '1')
+    props1.set('b', '${a}')
+    props2 = PomProperties()
+    props2.set('c', '3')
+    props2.set('a', '2')
+    scope = PomLayeredProps()
+    scope.set('d', '4')
+    scope.add_layer(props1, paths1)
+    scope.add_layer(props2, paths2)
+    scope.set('e', '5')
+    assert scope.names() == [ 'd', 'a', 'b', 'c', 'e' ] and len(scope) == 5 and 'c' in scope and 'f' not in scope
+    assert scope['a'].value == '1' and scope['a'].paths is paths1 and scope['c'].paths is paths2
+    # verify that only unresolved properties are materialized, without modifying layers
+    scope = PomLayeredProps()
+    scope.add_layer(props1, paths1)
+    scope.add_layer(props2, paths2)
+    [ prop ] = scope.unresolved()
+    prop.value = '1'
+    assert list(scope.materialized) == [ 'b' ] and props1['b'].value == '${a}'
+    scope.set('a', '0')
+    assert scope['a'].value == '0' and props1['a'].value == '1'
+    # verify that visits share the model, and only replace their own state
+    model = PomModel()
+    model.file = "pom.xml"
+    model.groupId = "com.example1"
+    model.artifactId = model.version = model.name = model.packaging = ""
+    model.parent = PomParent()
+    model.parent.groupId = "com.example1.parent"
+    model.parent.artifactId = model.parent.version = model.parent.relativePath = ""
+    model.properties = model.builtins = PomProperties()
+    model.managements = model.dependencies = model.modules = model.profiles = []
+    project1 = PomProject(model)
     project2 = project1.copy()
+    assert project2.model is project1.model and project2.properties is project1.properties
     project2.groupId = "com.example2"
     assert project2.parent
     project2.parent.groupId = "com.example2.parent"
-    assert project1.groupId == "com.example1"
+    assert project1.groupId == model.groupId == "com.example1"
     assert project2.groupId == "com.example2"
-    assert project1.parent.groupId == "com.example1.parent"
+    assert project1.parent.groupId == model.parent.groupId == "com.example1.parent"
     assert project2.parent.groupId == "com.example2.parent"
+    # verify that a visit is turned into a resolved model, without changing the parsed one
+    model2 = project2.to_model()
+    assert model2.groupId == "com.example2" and model2.parent and model2.parent.groupId == "com.example2.parent" and model2.file == "pom.xml"
+    assert model.groupId == "com.example1"
     # passed
     print("PASSED")
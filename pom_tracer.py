@@ -1,8 +1,4 @@
-import os, sys
-
-TRACER: 'Tracer | None' = None
-
-WARN = lambda s: sys.stderr.write(f"Warning: {s}\n")
+import os
 
 class Tracer:
     def __init__(self):
@@ -0,0 +1,263 @@
+import re
+from functools import lru_cache
+
+# Qualifiers order, unknown qualifiers being after all known ones, in lexical order
+QUALIFIERS = [ 'alpha', 'beta', 'milestone', 'rc', 'snapshot', '', 'sp' ]
+ALIASES = { 'ga': '', 'final': '', 'release': '', 'cr': 'rc' }
+SHORT_QUALIFIERS = { 'a': 'alpha', 'b': 'beta', 'm': 'milestone' }
+RELEASE_QUALIFIER = str(QUALIFIERS.index(''))
+
+# Item kinds, ordered as in maven: string < list < int
+STRING = 0
+LIST = 1
+INT = 2
+
+# Plain numeric versions, parsed without the generic parser
+NUMERIC_VERSION = re.compile(r'[0-9]+(\.[0-9]+)*')
+
+# An item is (kind, value): value is a comparable qualifier for strings, an int for ints and a tuple of items for lists
+Item = tuple
+
+
+class MavenVersion:
+    """
+    Represents a Maven version, ordered like org.apache.maven.artifact.versioning.ComparableVersion.
+
+    The key is computed once by parse_version(), which interns versions,
+    so comparing two versions never parses them again.
+    """
+    version: str
+    key: Item
+
+    def __init__(self, version: str):
+        self.version = version
+        self.key = parse_items(version)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, MavenVersion) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __lt__(self, other: 'MavenVersion') -> bool:
+        return compare_items(self.key, other.key) < 0
+
+    def __le__(self, other: 'MavenVersion') -> bool:
+        return compare_items(self.key, other.key) <= 0
+
+    def __gt__(self, other: 'MavenVersion') -> bool:
+        return compare_items(self.key, other.key) > 0
+
+    def __ge__(self, other: 'MavenVersion') -> bool:
+        return compare_items(self.key, other.key) >= 0
+
+    def __str__(self) -> str:
+        return self.version
+
+    def __repr__(self) -> str:
+        return f"MavenVersion({self.version!r})"
+
+
+@lru_cache(maxsize = None)
+def parse_version(version: str) -> MavenVersion:
+    """
+    Parse a version, returning the same instance for the same string.
+    """
+    return MavenVersion(version)
+
+
+@lru_cache(maxsize = None)
+def parse_range(version: str) -> tuple[str, MavenVersion | None, MavenVersion | None, str]:
+    """
+    Parse a version range, a single version being the minimal version, and [version] the exact version.
+    """
+    first = version[:1]
+    last = version[-1:]
+    if first not in '[(':
+        version = f"[{version}"
+        first = version[:1]
+    if last not in '])':
+        version = f"{version},)"
+        last = version[-1:]
+    # get minimal version and maximal version
+    min_version, comma, max_version = version[1:-1].partition(',')
+    if not comma: max_version = min_version
+    min_version = min_version.strip()
+    max_version = max_version.strip()
+    return first, parse_version(min_version) if min_version != '' else None, parse_version(max_version) if max_version != '' else None, last
+
+
+def in_range(version: MavenVersion, range: tuple[str, MavenVersion | None, MavenVersion | None, str]) -> bool:
+    """
+    Check if a version is in a range returned by parse_range().
+    """
+    first, min_version, max_version, last = range
+    if min_version is not None:
+        c = compare_items(version.key, min_version.key)
+        if c < 0 or (c == 0 and first == '('):
+            return False
+    if max_version is not None:
+        c = compare_items(version.key, max_version.key)
+        if c > 0 or (c == 0 and last == ')'):
+            return False
+    return True
+
+
+def parse_items(version: str) -> Item:
+    """
+    Parse a version into a list item, following maven 3.9 parsing and normalization.
+    """
+    if NUMERIC_VERSION.fullmatch(version):
+        numbers = [ int(n) for n in version.split('.') ]
+        while numbers and numbers[-1] == 0:
+            numbers.pop()
+        return (LIST, tuple((INT, n) for n in numbers))
+    version = version.lower()
+    items = []
+    stack = [ items ]
+    lists = items
+    is_digit = False
+    start = 0
+    for i, c in enumerate(version):
+        if c == '.' or c == '-':
+            lists.append((INT, 0) if i == start else parse_item(is_digit, version[start:i]))
+            start = i + 1
+            if c == '-':
+                lists.append(lists := [])
+                stack.append(lists)
+        elif '0' <= c <= '9':
+            if not is_digit and i > start:
+                # a .X followed by a digit is handled as -X too
+                if lists:
+                    lists.append(lists := [])
+                    stack.append(lists)
+                lists.append(string_item(version[start:i], True))
+                start = i
+                lists.append(lists := [])
+                stack.append(lists)
+            is_digit = True
+        else:
+            if is_digit and i > start:
+                lists.append(parse_item(True, version[start:i]))
+                start = i
+                lists.append(lists := [])
+                stack.append(lists)
+            is_digit = False
+    if len(version) > start:
+        # a trailing .X is handled as -X for any string qualifier X
+        if not is_digit and lists:
+            lists.append(lists := [])
+            stack.append(lists)
+        lists.append(parse_item(is_digit, version[start:]))
+    # normalize nested lists first, as their removal may expose null items in their parent
+    while stack:
+        normalize(stack.pop())
+    return freeze(items)
+
+
+def parse_item(is_digit: bool, buf: str) -> Item:
+    return (INT, int(buf)) if is_digit else string_item(buf, False)
+
+
+def string_item(value: str, followed_by_digit: bool) -> Item:
+    if followed_by_digit and len(value) == 1:
+        value = SHORT_QUALIFIERS.get(value, value)
+    value = ALIASES.get(value, value)
+    return (STRING, comparable_qualifier(value))
+
+
+def comparable_qualifier(qualifier: str) -> str:
+    """
+    Return a string ordering qualifiers as maven does: known qualifiers by index, unknown ones after.
+    """
+    if qualifier in QUALIFIERS:
+        return str(QUALIFIERS.index(qualifier))
+    return f"{len(QUALIFIERS)}-{qualifier}"
+
+
+def is_null(item: 'Item | list') -> bool:
+    if isinstance(item, list):
+        return len(item) == 0
+    kind, value = item
+    return value == 0 if kind == INT else value == RELEASE_QUALIFIER if kind == STRING else len(value) == 0
+
+
+def normalize(items: list):
+    """
+    Remove trailing null items, stopping at the first non null item which is not a list.
+    """
+    for i in range(len(items) - 1, -1, -1):
+        if is_null(items[i]):
+            del items[i]
+        elif not isinstance(items[i], list):
+            break
+
+
+def freeze(items: list) -> Item:
+    return (LIST, tuple(freeze(item) if isinstance(item, list) else item for item in items))
+
+
+def compare_items(left: Item | None, right: Item | None) -> int:
+    """
+    Compare two items, None being the padding used when a list is shorter than the other.
+    """
+    if left is None:
+        return 0 if right is None else -compare_items(right, None)
+    kind, value = left
+    if right is None:
+        if kind == INT:
+            return 1 if value > 0 else 0
+        if kind == STRING:
+            return (value > RELEASE_QUALIFIER) - (value < RELEASE_QUALIFIER)
+        return compare_items(value[0], None) if value else 0
+    other_kind, other = right
+    if kind != other_kind:
+        return 1 if kind > other_kind else -1
+    if kind != LIST:
+        return (value > other) - (value < other)
+    if value == other:
+        return 0
+    for i in range(max(len(value), len(other))):
+        left = value[i] if i < len(value) else None
+        right = other[i] if i < len(other) else None
+        if left != right:
+            c = compare_items(left, right)
+            if c != 0:
+                return c
+    return 0
+
+
+if __name__ == "__main__":
+    # verify maven ordering, taken from maven ComparableVersionTest
+    ordered = [
+        "1-alpha2snapshot", "1-alpha2", "1-alpha-123", "1-beta-2", "1-beta123", "1-m2", "1-m11", "1-rc", "1-cr2", "1-rc123",
+        "1-SNAPSHOT", "1", "1-sp", "1-sp2", "1-sp123", "1-abc", "1-def", "1-pom-1", "1-1-snapshot", "1-1", "1-2", "1-123",
+        "2.0", "2.0.a", "2-1", "2.0.2", "2.0.123", "2.1.0", "2.1-a", "2.1b", "2.1-c", "2.1-1", "2.1.0.1", "2.2", "2.123",
+        "11.a2", "11.a11", "11.b2", "11.b11", "11.m2", "11.m11", "11", "11.a", "11b", "11c", "11m",
+    ]
+    for i in range(len(ordered) - 1):
+        assert parse_version(ordered[i]) < parse_version(ordered[i + 1]), f"{ordered[i]} < {ordered[i + 1]}"
+        assert parse_version(ordered[i + 1]) > parse_version(ordered[i]), f"{ordered[i + 1]} > {ordered[i]}"
+    assert sorted(map(parse_version, reversed(ordered))) == list(map(parse_version, ordered))
+    # verify that .X is handled as -X, with or without a following digit (maven 3.9)
+    for lower, higher in [ ("1.0.0.a1", "1.0.0-a2"), ("1.0.RC1", "1.0-RC2"), ("1.0.0.X1", "1.0.0-X2"), ("2.0.a", "2.0-b") ]:
+        assert parse_version(lower) < parse_version(higher), f"{lower} < {higher}"
+        assert parse_version(higher) > parse_version(lower), f"{higher} > {lower}"
+    # verify equivalent versions
+    for equals in [ [ "1", "1.0", "1.0.0", "1-0", "1.0-0", "1-ga", "1.final", "1.0-release" ], [ "1-cr1", "1-rc-1", "1rc1" ], [ "1a1", "1-alpha-1", "1alpha1" ] ]:
+        for version in equals:
+            assert parse_version(version) == parse_version(equals[0]), f"{version} == {equals[0]}"
+    # verify versions are interned and keep their original string
+    assert parse_version("2.0.0.RELEASE") is parse_version("2.0.0.RELEASE")
+    assert str(parse_version("2.0.0.RELEASE")) == "2.0.0.RELEASE"
+    # verify ranges
+    assert in_range(parse_version("1.5"), parse_range("[1.0,2.0)"))
+    assert not in_range(parse_version("2.0"), parse_range("[1.0,2.0)"))
+    assert not in_range(parse_version("1.0"), parse_range("(1.0,2.0]"))
+    assert in_range(parse_version("2.0-beta-2"), parse_range("[1.0,2.0)"))
+    assert in_range(parse_version("1.0.0"), parse_range("[1.0]"))
+    assert not in_range(parse_version("1.0.1"), parse_range("[1.0]"))
+    assert in_range(parse_version("21.0.2"), parse_range("1.8"))
+    assert not in_range(parse_version("1.8"), parse_range("[9,)"))
+    # passed
+    print("PASSED")